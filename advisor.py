@@ -0,0 +1,144 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import telemetry
+import news_store
+
+# ================= AI 顾问上下文 + 回答缓存 =================
+# 上下文只用已有数据拼装：行情取轮询器快照，指标取最近一次扫描结果，不在提问时再请求上游。
+# 情报按与持仓的相关度挑选，控制在 token 预算内；同一问题 + 同一上下文的回答直接回放缓存。
+
+NEWS_TOKEN_BUDGET = 1200
+NEWS_DAYS = 3           # 与持仓相关的新闻回看几天；不相关的只取最近一天
+NEWS_CANDIDATES = 200
+CACHE_SIZE = 64
+CACHE_TTL = 1800        # 回答缓存有效期 (秒)；盘面变化后上下文的哈希本来也会变
+REPLAY_CHUNK = 24       # 命中缓存时按多少字一段回放，保持流式显示
+
+_CJK = re.compile(r'[\u3000-\u9fff\uff00-\uffef]')
+
+def estimate_tokens(text):
+    """粗估 token 数：中文约 1 字 1 token，其余约 4 字符 1 token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def symbol_keywords(code, name):
+    """代码/裸代码/名称 (去掉 -W、-SW 等后缀) 作为相关度关键词"""
+    keys = {code, code.split(".")[0], name, re.sub(r'-[A-Z]+$', '', name)}
+    return {k for k in keys if k and len(k) >= 2}
+
+def select_news(text, holdings, stock_map, budget=NEWS_TOKEN_BUDGET):
+    """
+    情报按行切分，按提到的持仓数打分 (同分时靠前的、也就是较新的优先)，
+    在 budget 内贪心选取，输出保持原有顺序。
+    """
+    lines = [l.strip() for l in (text or "").splitlines() if l.strip()]
+    if not lines: return []
+    # 全部关键词合成一个正则，每行扫一遍，按命中的不同持仓计分
+    owner = {}
+    for i, c in enumerate(holdings):
+        for k in symbol_keywords(c, stock_map.get(c, c)): owner.setdefault(k, set()).add(i)
+    if owner:
+        pat = re.compile("|".join(map(re.escape, sorted(owner, key=len, reverse=True))))
+        scores = [len(set().union(*(owner[k] for k in pat.findall(l)))) for l in lines]
+    else: scores = [0] * len(lines)
+    picked, used = [], 0
+    for i in sorted(range(len(lines)), key=lambda i: (-scores[i], i)):
+        cost = estimate_tokens(lines[i]) + 1
+        if used + cost > budget: continue
+        picked.append(i); used += cost
+    return [lines[i] for i in sorted(picked)]
+
+def gather_news(holdings, stock_map, extra="", days=NEWS_DAYS, limit=NEWS_CANDIDATES):
+    """
+    从本地新闻库取候选情报：提到持仓的 (近 days 天) + 最近一天的，新的在前；
+    用户自己写的情报 extra 排在最前。再由 select_news 按相关度截到预算内。
+    """
+    now = time.time()
+    keys = sorted({k for c in holdings for k in symbol_keywords(c, stock_map.get(c, c))})
+    frames = [news_store.search(keys, since=now - days * 86400, limit=limit)] if keys else []
+    frames.append(news_store.search(since=now - 86400, limit=limit))
+    df = pd.concat(frames).drop_duplicates("标题").sort_values("时间", ascending=False)
+    return "\n".join(([extra] if extra else []) + news_store.format_lines(df))
+
+def build_context(holdings, quotes, stock_map, analysis=None, status=None, news="", budget=NEWS_TOKEN_BUDGET):
+    """
+    holdings: 配置里的 holding_list；quotes: {代码: (现价, 昨收, 涨跌%, 成交量)} (轮询器快照)
+    analysis: 扫描指标 DataFrame (代码为索引)，status: {代码: 持仓状态}
+    数值统一取整到显示精度，盘面没实质变化时上下文 (和缓存键) 不变。
+    """
+    rows = ["【用户持仓风控数据】"]
+    for c, info in holdings.items():
+        p, _, chg, _ = quotes.get(c, (0.0, 0.0, 0.0, 0.0))
+        cost = info.get('cost', 0)
+        line = f"- {stock_map.get(c, c)}({c}): "
+        if p > 0:
+            prof_pct = (p - cost) / cost * 100 if cost > 0 else 0
+            line += f"现价{p:.2f}, 涨跌{chg:.1f}%, 成本{cost}, 盈亏{prof_pct:.1f}%"
+        else: line += f"暂无行情, 成本{cost}"
+        # 只写配置过的阈值，未设置的不替用户编默认值
+        for k, label, unit in (("support", "支撑位", ""), ("profit_target", "止盈", "%"), ("loss_limit", "止损", "%")):
+            if info.get(k): line += f", {label}{info[k]}{unit}"
+        if analysis is not None and c in analysis.index:
+            m = analysis.loc[c]
+            line += "".join(f", {k}{m[k]:.1f}%" for k in ("MA20偏", "MA60偏") if k in m)
+            if "量比" in m: line += f", 量比{m['量比']:.1f}"
+        if status and c in status: line += f", 状态{status[c]}"
+        rows.append(line)
+    picked = select_news(news, list(holdings), stock_map, budget)
+    rows += ["", "【市场情报】"] + (picked or ["无"])
+    return "\n".join(rows)
+
+def cache_key(model, messages):
+    raw = model + "\x00" + "\x00".join(f"{m['role']}\x01{m['content']}" for m in messages)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """进程内 LRU：缓存键 -> (完整回答, 写入时间)"""
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size, self.ttl = size, ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None: return None
+            if time.time() - hit[1] > self.ttl:
+                del self._items[key]; return None
+            self._items.move_to_end(key)
+            return hit[0]
+
+    def put(self, key, text):
+        with self._lock:
+            self._items[key] = (text, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.size: self._items.popitem(last=False)
+
+def stream_answer(client, model, messages, cache=None):
+    """
+    流式回答的文本片段生成器。命中缓存时直接回放；否则转发上游流，完整结束后写入缓存 (中途断开不缓存)。
+    首段到达的耗时记入 llm_first_token_seconds。
+    """
+    t0 = time.perf_counter()
+    key = cache_key(f"{getattr(client, 'base_url', '')}|{model}", messages) if cache is not None else None
+    text = cache.get(key) if key else None
+    if text is not None:
+        telemetry.count("llm_cache", result="hit")
+        telemetry.observe("llm_first_token_seconds", time.perf_counter() - t0, source="cache")
+        for i in range(0, len(text), REPLAY_CHUNK): yield text[i:i + REPLAY_CHUNK]
+        return
+    if key: telemetry.count("llm_cache", result="miss")
+    parts, first = [], True
+    for chunk in client.chat.completions.create(model=model, messages=messages, stream=True):
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta: continue
+        if first:
+            telemetry.observe("llm_first_token_seconds", time.perf_counter() - t0, source="upstream")
+            first = False
+        parts.append(delta)
+        yield delta
+    if key: cache.put(key, "".join(parts))
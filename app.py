@@ -2,15 +2,18 @@ import streamlit as st
 import pandas as pd
 import time
 import re
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-from openai import OpenAI
+import uuid
 from utils import load_config, save_config, convert_code
 import data_service as ds
-from concurrent.futures import ThreadPoolExecutor
+import scan_engine
+import watch_table
+import telemetry
+import market_clock
+from rule_engine import RuleEngine, rule_inputs
+# 回测/选股/板块/情报/顾问模块在用到它们的分支或片段里才导入，首屏不为没打开的功能付导入开销
 
 # ================= 1. 初始化 =================
+_rerun_t0 = time.perf_counter()
 st.set_page_config(page_title="AI 量化极速版", layout="wide", page_icon="📡")
 ds.init_baostock()
 config = load_config()
@@ -20,8 +23,8 @@ TH_SHORT = config["thresholds"]["short"]
 TH_BAND = config["thresholds"]["band"]
 TH_MARKET = config["thresholds"]["market"]
 
-try: stock_map, search_list = ds.get_stock_basic_cached()
-except: stock_map, search_list = {}, []
+try: stock_map, _ = ds.get_stock_basic_cached()
+except: stock_map = {}
 
 STRATEGIES = {
     "⚡ 短线": f"监控异动，涨跌 > ±{TH_SHORT}%",
@@ -29,13 +32,12 @@ STRATEGIES = {
     "⚓ 大盘": f"监控估值，相对指数低估 > {TH_MARKET}%"
 }
 
-SECTOR_MAP = {
-    "酒类/消费": "512690.SS", "半导体/芯片": "512480.SS", "新能源": "516160.SS",
-    "光伏": "515790.SS", "医药": "512170.SS", "证券": "512880.SS",
-    "银行": "512800.SS", "红利": "510880.SS", "中概互联": "513050.SS"
-}
-
 if "messages" not in st.session_state: st.session_state.messages = []
+if "sid" not in st.session_state: st.session_state.sid = uuid.uuid4().hex
+# 每个会话一个规则引擎 (告警去重状态按会话保存)；配置没变时 compile 直接返回
+if "rule_engine" not in st.session_state: st.session_state.rule_engine = RuleEngine()
+rules = st.session_state.rule_engine
+rules.compile(config)
 
 # ================= 2. 侧边栏 =================
 with st.sidebar:
@@ -57,10 +59,26 @@ with st.sidebar:
         if st.button("💾 保存参数"):
             config["thresholds"]["short"] = new_short; config["thresholds"]["band"] = new_band; config["thresholds"]["market"] = new_market
             save_config(config); st.rerun()
+        # 用自选+持仓的本地日K回放三种策略和止盈/止损，给阈值找依据
+        if st.button("📈 回测阈值"):
+            import backtest
+            codes = [c for c in dict.fromkeys(list(config["watch_list"]) + list(config["holding_list"])) if not c.endswith(".HK")]
+            progress = st.progress(0.0, text="同步日K")
+            failed = scan_engine.sync_histories(codes, on_progress=progress.progress)
+            if failed: st.warning(f"{len(failed)} 只日K同步失败，按本地已有数据回测: " + "、".join(list(failed)[:5]))
+            st.session_state.sweep = backtest.run_backtest(codes, on_progress=lambda p: progress.progress(p, text="回测"))
+            progress.empty()
+        if "sweep" in st.session_state:
+            import backtest
+            st.caption(f"每个策略平均收益前 3 (至少 {backtest.MIN_TRADES} 笔，已扣 {backtest.FEE}% 费用)")
+            st.dataframe(backtest.best(st.session_state.sweep)[["策略", "阈值", "止盈%", "止损%", "持有天数", "交易数", "胜率%", "平均收益%", "最大回撤%"]],
+                         hide_index=True, column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ("胜率%", "平均收益%", "最大回撤%")})
 
     st.divider()
     st.subheader("➕ 添加自选/持仓")
-    s = st.selectbox("搜股票(含港股)", [""]+search_list)
+    # 边输边搜：只把前 20 条匹配发给前端，而不是整张 5000 行的列表
+    q = st.text_input("搜股票(含港股)", placeholder="代码 / 名称 / 拼音首字母")
+    s = st.selectbox("匹配结果", [""] + [f"{n} | {c}" for c, n in ds.get_symbol_index().search(q, 20)]) if q else ""
     selected_strategy = st.radio("监控策略", list(STRATEGIES.keys()), index=1)
     
     if s:
@@ -77,14 +95,11 @@ with st.sidebar:
         bulk_input = st.text_area("粘贴代码 (空格/逗号)", height=70)
         if st.button("📥 一键导入"):
             raw_codes = re.split(r'[,\s\n]+', bulk_input.strip())
-            lookup = {}
-            for item in search_list:
-                parts = item.split("|"); full=parts[1].strip(); lookup[full]=full; lookup[full.split(".")[0]]=full
+            sym_index = ds.get_symbol_index()
             count = 0
             for rc in raw_codes:
                 if not rc: continue
-                clean = re.sub(r'(sh|sz|ss|hk)', '', rc.lower())
-                target = lookup.get(rc) or lookup.get(clean)
+                target = sym_index.resolve(rc)
                 if target: config["watch_list"][target] = {"strategy": selected_strategy}; count += 1
             if count > 0: save_config(config); st.success(f"导入 {count} 只"); time.sleep(1); st.rerun()
 
@@ -108,56 +123,80 @@ with st.sidebar:
             if st.button("🗑️ 删除持仓"): del config["holding_list"][sc]; save_config(config); st.rerun()
 
 # ================= 3. 顶部指数 =================
-cols = st.columns(3)
+# 所有会话共用一个后台轮询线程，这里只登记本会话关心的代码，行情都从快照读。
+# 页面拆成若干 fragment：各自按盯盘节奏定时重跑，组件交互也只重跑所在的片段，不再整页执行。
 idxs = [("上证指数","000001.SS"), ("创业板指","399006.SZ"), ("恒生科技","03032.HK")]
-for col, (n, c) in zip(cols, idxs):
-    # data_service 更新后返回4个值，用 _ 忽略成交量
-    p, _, chg, _ = ds.get_realtime_sina(c)
-    col.metric(n, f"{p:.2f}", f"{chg:.2f}%")
+poller = ds.get_quote_poller()
+watched = [c for _, c in idxs] + list(config["watch_list"]) + list(config["holding_list"])
+clock = market_clock.get_clock()
+MARKETS = ("A", "HK")
+IDLE_TICK = 60   # 盯盘但全部市场休市/午休时，每分钟醒一次看看是否开盘
+
+def refresh_tick():
+    """片段定时重跑的间隔 (秒)：跟着交易时段走；不盯盘时为 None (只在交互时刷新)"""
+    if not monitor_mode: return None
+    return clock.poll_interval(MARKETS) or IDLE_TICK
+
+tick = st.session_state.tick = refresh_tick()
+
+def refresh_rules():
+    """规则每个 tick 只求值一次 (只重算输入有变化的代码)，扫描表信号/持仓状态/告警都读结果"""
+    rules.update(rule_inputs(poller.get(rules.codes), st.session_state.get("analysis_df"),
+                             st.session_state.get("ind_states") if monitor_mode else None))
+
+@st.fragment(run_every=tick)
+@telemetry.timed("fragment_seconds")
+def header():
+    # 时段切换 (如午休结束) 后间隔变了：整页重跑一次，让各片段按新间隔重新登记
+    if refresh_tick() != st.session_state.tick: st.rerun()
+    # 定时重跑只跑片段、不经过整页，心跳放在这里续，否则超过 SESSION_TTL 轮询器就不再替本会话拉行情
+    poller.watch(st.session_state.sid, watched)
+    cols = st.columns(3)
+    idx_quotes = poller.get([c for _, c in idxs])
+    stale = poller.stale([c for _, c in idxs])
+    for col, (n, c) in zip(cols, idxs):
+        # 没有有效行情显示 "—"，不拿 0.00 冒充价格；上游异常时沿用最后一次行情并标 ⏳
+        if not idx_quotes.get(c, ds.NO_QUOTE)[0] > 0:
+            col.metric(n, "—", help="暂无行情"); continue
+        p, _, chg, _ = idx_quotes[c]
+        col.metric(f"{n} ⏳" if c in stale else n, f"{p:.2f}", f"{chg:.2f}%",
+                   help=f"行情已 {stale[c]:.0f} 秒未更新，显示的是最后一次有效价格" if c in stale else None)
+    st.caption("🕒 A股 {} · 港股 {}".format(*clock.phases(MARKETS)))
+
+header()
 
 # ================= 4. 主功能区 =================
-tabs = st.tabs(["🎯 策略/风控扫描", "🌊 板块", "🛡️ 持仓监控", "🔥 情报", "🤖 AI 顾问"])
-if 'analysis_res' not in st.session_state: st.session_state.analysis_res = {}
+# 诊断页默认隐藏，地址栏加 ?diag=1 打开
+show_diag = st.query_params.get("diag") == "1"
+# 切换标签时整页重跑，tabs[i].open 才知道当前是哪个标签；隐藏的全市场标签不定时刷新
+tabs = st.tabs(["🎯 策略/风控扫描", "🔭 全市场选股", "🌊 板块", "🛡️ 持仓监控", "🔥 情报", "🤖 AI 顾问"] + (["🩺 诊断"] if show_diag else []),
+               key="main_tab", on_change="rerun")
+if 'watch_view' not in st.session_state: st.session_state.watch_view = watch_table.WatchTable()
 
 # Tab 1: 策略 + 风控扫描
-with tabs[0]:
+@st.fragment(run_every=tick)
+@telemetry.timed("fragment_seconds")
+def scan_panel():
+    refresh_rules()
     c1, c2 = st.columns([1, 4])
     with c1:
         st.markdown("##### 🚀 智能扫描")
         if st.button("开始全面扫描", type="primary"):
-            st.session_state.analysis_res = {}
             progress = st.progress(0)
             all_codes = list(set(list(config["watch_list"].keys()) + list(config["holding_list"].keys())))
-            alerts = [] 
             
-            for i, code in enumerate(all_codes):
-                # 获取实时价格和【成交量】
-                curr_p, _, chg, curr_vol = ds.get_realtime_sina(code)
-                name = stock_map.get(code, code)
-                
-                if curr_p > 0:
-                    metrics = ds.calculate_advanced_metrics(code, curr_p, curr_vol)
-                    if metrics: st.session_state.analysis_res[code] = metrics
-
-                    # 策略逻辑
-                    if code in config["watch_list"]:
-                        strategy = config["watch_list"][code].get("strategy", "🌊 波段")
-                        if strategy == "⚡ 短线" and abs(chg) > TH_SHORT: alerts.append(f"⚡ {name} 异动 {chg:.2f}%")
-                        elif strategy == "🌊 波段" and metrics['MA20偏'] < TH_BAND: alerts.append(f"🌊 {name} 击穿MA20 {metrics['MA20偏']:.1f}%")
-                        elif strategy == "⚓ 大盘" and metrics['大盘折溢价'] < TH_MARKET: alerts.append(f"⚓ {name} 低估 {-metrics['大盘折溢价']:.1f}%")
-
-                    # 风控逻辑
-                    if code in config["holding_list"]:
-                        info = config["holding_list"][code]
-                        cost, support = info.get("cost", 0), info.get("support", 0)
-                        p_target, l_limit = info.get("profit_target", 999), info.get("loss_limit", -999)
-                        curr_profit_pct = (curr_p - cost)/cost*100 if cost > 0 else 0
-                        
-                        if support > 0 and curr_p < support: alerts.append(f"🚨 {name} 跌破支撑位! {curr_p}<{support}")
-                        if cost > 0 and curr_profit_pct >= p_target: alerts.append(f"💰 {name} 止盈达标! {curr_profit_pct:.1f}%")
-                        if cost > 0 and curr_profit_pct <= l_limit: alerts.append(f"😭 {name} 触及止损! {curr_profit_pct:.1f}%")
-
-                progress.progress((i + 1) / len(all_codes))
+            # 批量行情 + 进程池同步历史 + 一次性批量计算指标
+            quotes, df_metrics, failed = scan_engine.run_scan(all_codes, on_progress=progress.progress)
+            if failed: st.warning(f"{len(failed)} 只日K同步失败，指标按本地已有数据计算: " + "、".join(list(failed)[:5]))
+            st.session_state.analysis_df = df_metrics
+            # 增量指标状态：盯盘时用现价算实时均线偏离，不再回看历史
+            st.session_state.ind_states = ds.update_indicator_states(df_metrics.index, st.session_state.get("ind_states"))
+            
+            # 策略 + 风控规则一次向量化求值；手动扫描列出全部成立的告警，并记为已提醒
+            rules.update(rule_inputs({c: (q["现价"], 0.0, q["涨跌%"], q["成交量"]) for c, q in quotes.items()}, df_metrics))
+            alerts = rules.active(stock_map)
+            rules.alerts()
+
             progress.empty()
             if alerts: 
                 for a in alerts: st.toast(a, icon="🔔")
@@ -168,113 +207,219 @@ with tabs[0]:
 
     def render_table():
         if not watch_codes: return pd.DataFrame()
-        base_data = ds.get_batch_realtime_sina(watch_codes)
-        if not base_data: return pd.DataFrame()
-        df = pd.DataFrame(base_data)
-        df["名称"] = df["代码"].apply(lambda x: f"{stock_map.get(x, x)} ({x})")
-        df["策略"] = df["代码"].apply(lambda x: config["watch_list"][x].get("strategy", "🌊"))
-        
-        if st.session_state.analysis_res:
-            def get_metric(code, key): return st.session_state.analysis_res.get(code, {}).get(key, 0)
-            df["MA10%"] = df["代码"].apply(lambda x: get_metric(x, "MA10偏"))
-            df["MA20%"] = df["代码"].apply(lambda x: get_metric(x, "MA20偏"))
-            df["MA30%"] = df["代码"].apply(lambda x: get_metric(x, "MA30偏"))
-            df["MA60%"] = df["代码"].apply(lambda x: get_metric(x, "MA60偏"))
-            df["量比"] = df["代码"].apply(lambda x: get_metric(x, "量比"))
-            
-            def get_signal(row):
-                strat = row['策略']
-                chg = row['涨跌%']
-                if strat == "⚡ 短线" and abs(chg) > TH_SHORT: return "⚡ 异动"
-                if strat == "🌊 波段" and row.get('MA20%', 0) < TH_BAND: return "🌊 机会"
-                return ""
-            df["信号"] = df.apply(get_signal, axis=1)
-            # 列顺序
-            cols = ["名称", "现价", "涨跌%", "量比", "MA10%", "MA20%", "MA30%", "MA60%", "信号"]
-        else: cols = ["名称", "现价", "涨跌%", "策略"]
-        return df[cols]
+        return watch_table.build_watch_frame(poller.get(watch_codes), config["watch_list"], stock_map, st.session_state.get("analysis_df"),
+                                             rules, st.session_state.get("ind_states"), monitor_mode, stale=poller.stale(watch_codes))
 
     with market_placeholder.container():
         df = render_table()
         if not df.empty:
-            fmt = {"现价":"{:.2f}", "涨跌%":"{:.2f}%"}
-            
-            # === 修复核心：安全地构建样式 ===
-            styler = df.style.format(fmt).map(lambda x: 'color:#ff4d4d' if x>0 else 'color:#2ecc71', subset=['涨跌%'])
-            
-            # 只有当列存在时，才添加对应的格式和样式，避免报错
-            if "MA10%" in df.columns:
-                styler = styler.format({
-                    "MA10%":"{:.1f}%", "MA20%":"{:.1f}%", "MA30%":"{:.1f}%", "MA60%":"{:.1f}%", "量比":"{:.2f}"
-                })
-                # 量比高亮
-                styler = styler.map(lambda x: 'color:#ff4d4d; font-weight:bold' if float(x)>1.5 else '', subset=['量比'])
-                # 均线红绿
-                styler = styler.map(lambda x: 'color:#ff4d4d' if float(x)>0 else 'color:#2ecc71', subset=['MA10%','MA20%','MA30%','MA60%'])
-
-            st.dataframe(styler, width='stretch')
-
-# Tab 2: 板块
-with tabs[1]:
-    if st.button("🚀 扫描板块"):
-        res = []
-        for n, c in SECTOR_MAP.items():
-            _, _, chg, _ = ds.get_realtime_sina(c)
-            res.append({"板块": n, "涨跌幅": chg})
-        st.plotly_chart(px.bar(pd.DataFrame(res).sort_values("涨跌幅"), x="涨跌幅", y="板块", orientation='h', color="涨跌幅", color_continuous_scale=["#00FF00", "#FF0000"]), width='stretch')
-
-# Tab 3: 持仓监控
-with tabs[2]:
+            # 只重算变动行的样式；大表分页，每个 tick 只序列化当前页
+            view = st.session_state.watch_view
+            view.update(df)
+            page = 0
+            if view.pages() > 1:
+                page = st.number_input(f"页 (共 {view.pages()} 页，{len(df)} 只)", 1, view.pages(), 1, key="watch_page") - 1
+            st.dataframe(view.page(page), column_config=watch_table.COLUMN_CONFIG, width='stretch', hide_index=True)
+        # 盯盘时只提醒新成立的告警，同一条不会每秒弹一次
+        if monitor_mode:
+            for a in rules.alerts(stock_map): st.toast(a, icon="🔔")
+
+@st.fragment
+@telemetry.timed("fragment_seconds")
+def intraday_chart():
+    # 分时图直接读盘中记录器，不再向上游请求
+    with st.expander("📈 分时 (盘中记录)"):
+        recorder = ds.get_bar_recorder()
+        watch_codes = list(config["watch_list"].keys())
+        chart_codes = watch_codes + [c for c in config["holding_list"] if c not in config["watch_list"]]
+        pick = st.selectbox("代码", chart_codes, format_func=lambda x: f"{stock_map.get(x, x)} ({x})") if chart_codes else None
+        days = recorder.recorded_days(pick) if pick else []
+        day = st.selectbox("日期", days[::-1]) if days else None
+        bars = recorder.minute_bars(pick, day) if day else None
+        if bars is None or bars.empty: st.caption("暂无记录：开着页面盯盘时会自动记录分钟线")
+        else:
+            # plotly 只在真正画图时才导入
+            import plotly.graph_objects as go
+            from plotly.subplots import make_subplots
+            fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.03)
+            fig.add_trace(go.Scatter(x=bars["时间"], y=bars["close"], name="价格", line=dict(width=1.5)), row=1, col=1)
+            fig.add_trace(go.Bar(x=bars["时间"], y=bars["volume"], name="分钟量", marker_color="#888"), row=2, col=1)
+            fig.update_layout(height=420, showlegend=False, margin=dict(l=10, r=10, t=10, b=10))
+            st.plotly_chart(fig, width='stretch')
+
+with tabs[0]:
+    scan_panel()
+    intraday_chart()
+
+# Tab 2: 全市场选股
+@st.fragment(run_every=tick if tabs[1].open else None)
+@telemetry.timed("fragment_seconds")
+def screener_panel():
+    # 全市场结果是进程级 1 秒快照 (所有会话共用一次拉取)；点过一次选股后，标签打开且盯盘时随 tick 刷新
+    import screener
+    day = time.strftime("%Y-%m-%d")
+    scr = ds.get_screener(day)
+    c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+    cond_text = c1.text_input("条件 (分号分隔，全部满足)", value="MA20偏<-5; 量比>1", key="scr_cond",
+                              help="可用列: " + " ".join(screener.FILTER_COLS) + "；运算符 < <= > >=")
+    sort_by = c2.selectbox("排序", screener.FILTER_COLS, index=screener.FILTER_COLS.index("MA20偏"), key="scr_sort")
+    ascending = c3.toggle("升序", value=True, key="scr_asc")
+    top = c4.number_input("Top N", 5, 500, screener.DEFAULT_TOP, step=5, key="scr_top")
+    b1, b2 = st.columns([1, 4])
+    if b1.button("🔭 运行选股", type="primary"): st.session_state.screener_on = True
+    if b2.button("⏬ 同步全市场日K (首次较慢)"):
+        progress = st.progress(0.0)
+        failed = scan_engine.sync_histories(scr.codes, on_progress=progress.progress)
+        progress.empty(); scr.reload()
+        if failed: st.warning(f"{len(failed)} 只日K同步失败 (如 {next(iter(failed.values()))})，稍后可再同步")
+    if not st.session_state.get("screener_on") or not tabs[1].open:
+        st.caption(f"股票池: 全部在市 A股 {len(scr.codes)} 只"); return
+    try: conds = screener.parse_conditions(cond_text)
+    except ValueError as e:
+        st.error(str(e)); return
+
+    # 勾选的行号对应的是上一次显示的结果 (盯盘刷新后排序可能变了)
+    shown = st.session_state.get("scr_shown", [])
+    rows = st.session_state.get("scr_table", {}).get("selection", {}).get("rows", [])
+    picked = [shown[i] for i in rows if i < len(shown)]
+
+    try: full = ds.screen_market(day)
+    except Exception as e:
+        st.warning(f"行情暂不可用: {e}"); return
+    res = screener.screen(full, conds, sort_by, ascending, top)
+    st.caption(f"有行情 {len(full)} 只，本地有日K {int(scr.has_history.sum())} 只 (没有日K的不参与均线/量比/折溢价条件)；命中 {len(res)} 只")
+    pct = st.column_config.NumberColumn(format="%.2f%%")
+    st.dataframe(res.drop(columns=["指数代码"]), width='stretch', on_select="rerun", selection_mode="multi-row", key="scr_table",
+                 column_config={"现价": st.column_config.NumberColumn(format="%.2f"), "涨跌%": pct, "量比": st.column_config.NumberColumn(format="%.2f"),
+                                "成交额": st.column_config.NumberColumn(format="compact"), "大盘折溢价": pct,
+                                **{f"MA{ma}偏": pct for ma in (10, 20, 30, 60)}})
+    st.session_state.scr_shown = list(res.index)
+    new = [c for c in (picked or shown or list(res.index)) if c not in config["watch_list"]]
+    if st.button(f"➕ 加入自选 ({len(new)} 只，{'勾选的行' if picked else '全部结果'}，策略 {selected_strategy})", disabled=not new):
+        for c in new: config["watch_list"][c] = {"strategy": selected_strategy}
+        save_config(config); st.rerun()
+
+with tabs[1]: screener_panel()
+
+# Tab 3: 板块
+@st.fragment(run_every=tick if tabs[2].open else None)
+@telemetry.timed("fragment_seconds")
+def sector_panel():
+    # 全市场行业板块：点过一次扫描后，标签打开且盯盘时随 tick 刷新热力图
+    from sector_engine import SectorEngine, WEIGHTINGS
+    c1, c2 = st.columns([1, 3])
+    if c1.button("🚀 扫描板块"): st.session_state.sector_on = True
+    weighting = c2.radio("板块涨跌幅", WEIGHTINGS, horizontal=True, key="sector_weighting")
+    if not st.session_state.get("sector_on") or not tabs[2].open: return
+    try: board, members = ds.get_sector_board(weighting)
+    except Exception as e:
+        st.error(f"板块数据获取失败: {e}"); return
+    board = board[board["有效数"] > 0]
+    if board.empty:
+        st.info("暂无行情"); return
+
+    import plotly.express as px
+    up, down = int(board["上涨"].sum()), int(board["下跌"].sum())
+    m1, m2, m3 = st.columns(3)
+    m1.metric("上涨家数", up); m2.metric("下跌家数", down); m3.metric("行业数", len(board))
+    # 面积：等权按家数，加权按成交额
+    size = "成交额" if weighting == "成交额加权" and board["成交额"].sum() > 0 else "有效数"
+    fig = px.treemap(board, path=[px.Constant("全市场"), "板块"], values=size, color="涨跌幅",
+                     color_continuous_scale=["#2ecc71", "#f5f5f5", "#ff4d4d"], color_continuous_midpoint=0,
+                     hover_data={"上涨": True, "下跌": True, "领涨": True, "领跌": True})
+    fig.update_layout(height=520, margin=dict(l=5, r=5, t=5, b=5))
+    st.plotly_chart(fig, width='stretch')
+
+    pct = st.column_config.NumberColumn(format="%.2f%%")
+    st.dataframe(board.sort_values("涨跌幅", ascending=False), width='stretch', hide_index=True,
+                 column_config={"涨跌幅": pct, "领涨幅": pct, "领跌幅": pct,
+                                "上涨占比%": st.column_config.ProgressColumn("上涨占比", format="%.0f%%", min_value=0, max_value=100),
+                                "成交额": st.column_config.NumberColumn(format="compact")})
+    pick = st.selectbox("成分股", board.sort_values("涨跌幅", ascending=False)["板块"], key="sector_pick")
+    if pick:
+        top, bottom = SectorEngine.movers(members, pick)
+        l, r = st.columns(2)
+        l.dataframe(top, width='stretch', hide_index=True, column_config={"涨跌%": pct})
+        r.dataframe(bottom, width='stretch', hide_index=True, column_config={"涨跌%": pct})
+
+with tabs[2]: sector_panel()
+
+# Tab 4: 持仓监控
+@st.fragment(run_every=tick)
+@telemetry.timed("fragment_seconds")
+def holding_panel():
+    refresh_rules()
     h_res = []
     st.info("🛡️ 此处仅监控价格与预设阈值的关系，不显示具体持有金额。")
+    hold_quotes = poller.get(list(config["holding_list"].keys()))
+    stale = poller.stale(list(config["holding_list"].keys()))
+    hold_status = dict(zip(config["holding_list"], rules.holding_status(list(config["holding_list"]))))
     for c, info in config["holding_list"].items():
-        p, _, chg, _ = ds.get_realtime_sina(c)
-        if p>0:
-            cost = info.get('cost', 0)
+        cost = info.get('cost', 0)
+        target, loss_lim, support = info.get("profit_target", 20), info.get("loss_limit", -10), info.get("support", 0)
+        # 没有有效行情的持仓照样列出，但价格/盈亏留空，状态不按 0 价判断
+        p = hold_quotes.get(c, ds.NO_QUOTE)[0]
+        p = p if p > 0 else None
+        if p is None: prof_pct, status = None, "⏳ 暂无行情"
+        else:
             prof_pct = (p-cost)/cost*100 if cost>0 else 0
-            target, loss_lim, support = info.get("profit_target", 20), info.get("loss_limit", -10), info.get("support", 0)
-            status = "🟢 持有"
-            if support > 0 and p < support: status = "🚨 破位卖出"
-            elif prof_pct >= target: status = "💰 止盈卖出"
-            elif prof_pct <= loss_lim: status = "😭 止损卖出"
-            h_res.append({"名称": f"{stock_map.get(c,c)}", "代码": c, "现价": p, "成本": cost, "当前盈亏%": prof_pct, "止盈目标%": target, "止损回撤%": loss_lim, "支撑位": support, "状态": status})
+            status = hold_status[c] + (f" · ⏳{stale[c]:.0f}s前" if c in stale else "")
+        h_res.append({"名称": f"{stock_map.get(c,c)}", "代码": c, "现价": p, "成本": cost, "当前盈亏%": prof_pct, "止盈目标%": target, "止损回撤%": loss_lim, "支撑位": support, "状态": status})
     if h_res:
         df_h = pd.DataFrame(h_res)
         def highlight_status(val):
             if "🚨" in val or "😭" in val: return 'color: white; background-color: #ff4d4d; font-weight: bold'
             if "💰" in val: return 'color: white; background-color: #ff9f43; font-weight: bold'
+            if val.startswith("⏳"): return 'color: #888'
             return 'color: #2ecc71; font-weight: bold'
-        st.dataframe(df_h.style.format({"现价":"{:.2f}", "成本":"{:.2f}", "支撑位":"{:.2f}", "当前盈亏%":"{:.2f}%", "止盈目标%":"{:.1f}%", "止损回撤%":"{:.1f}%"}).map(lambda x:'color:red' if x>0 else 'color:green', subset=['当前盈亏%']).map(highlight_status, subset=['状态']), width='stretch')
+        st.dataframe(df_h.style.format({"现价":"{:.2f}", "成本":"{:.2f}", "支撑位":"{:.2f}", "当前盈亏%":"{:.2f}%", "止盈目标%":"{:.1f}%", "止损回撤%":"{:.1f}%"}, na_rep="—").map(lambda x:'' if pd.isna(x) else 'color:red' if x>0 else 'color:green', subset=['当前盈亏%']).map(highlight_status, subset=['状态']), width='stretch')
     else: st.write("暂无持仓，请在侧边栏添加。")
 
-# Tab 4: 情报
-with tabs[3]:
-    c1, c2 = st.columns([1, 6])
+with tabs[3]: holding_panel()
+
+# Tab 5: 情报
+NEWS_WINDOWS = {"今天": 1, "3天": 3, "7天": 7, "30天": 30, "全部": None}
+NEWS_PAGE = 30
+
+@st.fragment
+@telemetry.timed("fragment_seconds")
+def news_panel():
+    # 新闻由后台线程增量抓取进本地库，这里只查询
+    import news_store
+    ingester = ds.get_news_ingester()
+    c1, c2, c3, c4 = st.columns([1, 3, 1, 1])
     if c1.button("🌐 抓取新闻"):
-        news = ds.get_web_news()
-        if news:
-            new_text = "\n".join(news)
-            config["system_news"] = new_text
-            save_config(config)
-            st.success("更新成功"); time.sleep(0.5); st.rerun()
-    current_news = st.text_area("编辑情报 (AI素材)", value=config.get("system_news", ""), height=400, key="news_edit_area")
-    if current_news != config.get("system_news", ""):
-        config["system_news"] = current_news
-        save_config(config)
-
-# Tab 5: AI 顾问
-with tabs[4]:
+        try: st.toast(f"新增 {ingester.poll_once()} 条", icon="✅")
+        except Exception as e: st.error(f"抓取失败: {e}")
+    keywords = c2.text_input("关键词 (空格分隔，任一命中)", key="news_kw").split()
+    days = NEWS_WINDOWS[c3.selectbox("时间", list(NEWS_WINDOWS), index=1, key="news_window")]
+    if c4.toggle("只看持仓/自选", key="news_mine"):
+        import advisor
+        codes = list(config["holding_list"]) + list(config["watch_list"])
+        keywords += sorted({k for c in codes for k in advisor.symbol_keywords(c, stock_map.get(c, c))})
+    since = time.time() - days * 86400 if days else None
+    total = news_store.count(keywords, since)
+    pages = max(1, -(-total // NEWS_PAGE))
+    page = st.number_input(f"页 (共 {total} 条)", 1, pages, 1, key="news_page") if pages > 1 else 1
+    df = news_store.search(keywords, since, limit=NEWS_PAGE, offset=(page - 1) * NEWS_PAGE)
+    st.dataframe(df[["时间", "标题", "来源", "链接"]], width='stretch', hide_index=True,
+                 column_config={"时间": st.column_config.DatetimeColumn(format="MM-DD HH:mm"),
+                                "链接": st.column_config.LinkColumn(display_text="原文")})
+    if ingester.last_error: st.caption(f"⚠️ 后台抓取失败: {ingester.last_error}")
+
+    current_news = st.text_area("自定义情报 (AI素材，与相关新闻一起提供给 AI)", value=config.get("user_news", ""), height=150, key="news_edit_area")
+    if current_news != config.get("user_news", ""):
+        config["user_news"] = current_news
+        # 逐字编辑时合并写入，停手 2 秒后才落盘
+        save_config(config, delay=2.0)
+
+with tabs[4]: news_panel()
+
+# Tab 6: AI 顾问
+@st.fragment
+@telemetry.timed("fragment_seconds")
+def advisor_panel():
     st.markdown("#### 🤖 AI 投资顾问")
-    def build_context():
-        ctx = "【用户持仓风控数据】\n"
-        for c, info in config["holding_list"].items():
-            p, _, _, _ = ds.get_realtime_sina(c)
-            name = stock_map.get(c, c)
-            cost = info.get('cost', 0)
-            prof_pct = (p - cost) / cost * 100 if cost > 0 else 0
-            ctx += f"- {name}: 现价{p}, 成本{cost}, 盈亏{prof_pct:.2f}%, 支撑位{info.get('support')}\n"
-        ctx += f"\n【市场情报】\n{config.get('system_news', '无')}" 
-        return ctx
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]): st.markdown(msg["content"])
     if prompt := st.chat_input("问问AI关于持仓的建议..."):
@@ -282,9 +427,48 @@ with tabs[4]:
         else:
             st.chat_message("user").markdown(prompt)
             st.session_state.messages.append({"role": "user", "content": prompt})
-            context_data = build_context()
+            # 上下文只读快照和最近一次扫描结果；情报按持仓相关度截到 token 预算内
+            holdings = config["holding_list"]
+            import advisor
+            news = advisor.gather_news(holdings, stock_map, config.get("user_news", ""))
+            context_data = advisor.build_context(holdings, poller.get(list(holdings)), stock_map, st.session_state.get("analysis_df"),
+                                                 dict(zip(holdings, rules.holding_status(list(holdings)))), news)
             system_prompt = f"你是一个量化风控助手。依据：\n{context_data}"
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
             with st.chat_message("assistant"):
-                stream = OpenAI(api_key=config["api_key"], base_url=config["base_url"]).chat.completions.create(model="deepseek-chat", messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}], stream=True)
-                response = st.write_stream(stream)
-            st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+                client = ds.get_llm_client(config["api_key"], config["base_url"])
+                response = st.write_stream(advisor.stream_answer(client, config.get("model", "deepseek-chat"), messages, ds.get_completion_cache()))
+            st.session_state.messages.append({"role": "assistant", "content": response})
+
+with tabs[5]: advisor_panel()
+
+# Tab 7: 诊断 (隐藏)
+@st.fragment
+def diag_panel():
+    snap = telemetry.snapshot()
+    calls = {s["labels"].get("fn"): s["count"] for s in snap if s["name"] == "cache_calls"}
+    misses = {s["labels"].get("fn"): s["count"] for s in snap if s["name"] == "cache_misses"}
+    if calls:
+        st.markdown("##### 缓存命中率")
+        st.dataframe(pd.DataFrame([{"函数": fn, "调用": n, "未命中": misses.get(fn, 0), "命中率%": (n - misses.get(fn, 0)) / n * 100}
+                                   for fn, n in calls.items()]), width='stretch', hide_index=True)
+    rows = [{"指标": s["name"], "标签": ",".join(f"{k}={v}" for k, v in s["labels"].items()), "次数": s["count"],
+             "均值ms": s["sum"] / s["count"] * 1000 if s["count"] else 0, "最大ms": s["max"] * 1000, "累计s": s["sum"]}
+            for s in snap if s["kind"] == "histogram"]
+    if rows:
+        st.markdown("##### 耗时")
+        st.dataframe(pd.DataFrame(rows).sort_values("累计s", ascending=False), width='stretch', hide_index=True)
+    rows = [{"指标": s["name"], "标签": ",".join(f"{k}={v}" for k, v in s["labels"].items()), "累计": s["sum"], "次数": s["count"]}
+            for s in snap if s["kind"] == "counter" and not s["name"].startswith("cache_")]
+    if rows:
+        st.markdown("##### 计数")
+        st.dataframe(pd.DataFrame(rows), width='stretch', hide_index=True)
+    c1, c2, c3 = st.columns(3)
+    c1.download_button("导出 Prometheus", telemetry.to_prometheus(), file_name="stoak.prom", mime="text/plain")
+    c2.download_button("导出 JSONL 事件", telemetry.to_jsonl(), file_name="stoak_events.jsonl", mime="application/json")
+    if c3.button("清零"): telemetry.reset(); st.rerun(scope="fragment")
+
+if show_diag:
+    with tabs[6]: diag_panel()
+
+telemetry.observe("rerun_seconds", time.perf_counter() - _rerun_t0)
@@ -0,0 +1,262 @@
+import sys
+import math
+import argparse
+import datetime
+import itertools
+from concurrent.futures import as_completed
+import numpy as np
+import pandas as pd
+import history_store
+import metrics_engine
+from index_align import IndexAligner, RATIO_WINDOW
+
+# ================= 策略回测 + 阈值扫描 =================
+# 在本地日K上回放三种策略信号和持仓风控，判断方式与 rule_engine 相同：
+#   短线 |涨跌%| > 阈值，波段 MA20偏 < 阈值，大盘 大盘折溢价 < 阈值；
+#   告警只在条件 "变为成立" 的那天报，所以只在这天以收盘价买入，之后按持仓规则卖出：
+#   止盈 (最高价触及) / 止损、支撑 (最低价触及，同日都触及按先止损算) / 持满 hold_days 天收盘卖出。
+# 指标按当天收盘价当作 "现价"、历史取到前一天，和盘中扫描口径一致。
+# 同一策略的阈值是嵌套的 (阈值越松命中越多)，所以每笔信号只需算出它在哪段阈值区间内成立，
+# 一次 bincount + 累加就得到全部阈值的结果，不按天、不按参数组合循环。
+# 代码分块交给扫描引擎的常驻进程池，各进程自己读仓库，只回传按平仓日汇总的数组。
+
+HISTORY_DAYS = 730
+FEE = 0.15              # 双边手续费 + 印花税 (%)，每笔从收益里扣
+MIN_TRADES = 10         # best() 里少于这么多笔的参数组合不参与排名
+STRATEGIES = (("short", "⚡ 短线"), ("band", "🌊 波段"), ("market", "⚓ 大盘"))
+DEFAULT_GRID = {
+    "short": (2.0, 2.5, 3.0, 3.5, 4.0, 5.0, 6.0, 7.0),
+    "band": (-3.0, -4.0, -5.0, -6.0, -7.0, -8.0, -10.0, -12.0),
+    "market": (-4.0, -6.0, -8.0, -10.0, -12.0, -14.0, -16.0, -20.0),
+    "profit_target": (5.0, 8.0, 10.0, 15.0, 20.0, 30.0),
+    "loss_limit": (-3.0, -5.0, -8.0, -10.0, -15.0),
+    "support": (None,),             # 支撑位 = 买入价下方 x%；None 表示不设
+    "hold_days": (5, 10, 20),
+}
+RESULT_COLS = ["策略", "阈值", "止盈%", "止损%", "支撑%", "持有天数", "交易数", "胜率%", "平均收益%", "累计收益%", "最大回撤%", "平均持有天数"]
+
+def exit_combos(grid):
+    """(止盈, 止损, 支撑, 持有天数) 的全部组合"""
+    return list(itertools.product(grid["profit_target"], grid["loss_limit"], grid["support"], grid["hold_days"]))
+
+def _prev_mean(x, n):
+    """每个位置前 n 个值 (不含当天) 的均值，n 个都有效才算，否则 NaN"""
+    S, L = x.shape
+    cs = np.zeros((S, L + 1)); cs[:, 1:] = np.cumsum(np.nan_to_num(x), axis=1)
+    cnt = np.zeros((S, L + 1)); cnt[:, 1:] = np.cumsum(~np.isnan(x), axis=1)
+    out = np.full((S, L), np.nan)
+    if L > n:
+        s, c = cs[:, n:L] - cs[:, :L - n], cnt[:, n:L] - cnt[:, :L - n]
+        out[:, n:] = np.where(c == n, s / n, np.nan)
+    return out
+
+def signal_values(close, idx_close, window=RATIO_WINDOW):
+    """
+    close: 右对齐收盘价面板；idx_close: 同形状的所属指数收盘价 (IndexAligner.align)
+    返回 {策略: 每天的判断值}：短线 |涨跌%|，波段 MA20偏，大盘 大盘折溢价
+    """
+    S, L = close.shape
+    prev = np.hstack([np.full((S, 1), np.nan), close[:, :-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chg = (close / prev - 1) * 100
+        ma20 = _prev_mean(close, 20)
+        ma20_dev = np.where(ma20 > 0, (close - ma20) / ma20 * 100, np.nan)
+        # 大盘折溢价：前 window 根的 个股/指数 比值均值 × 指数前一天收盘
+        ratio = close / idx_close
+        valid = np.isfinite(ratio)
+        cs = np.zeros((S, L + 1)); cs[:, 1:] = np.cumsum(np.where(valid, ratio, 0), axis=1)
+        cnt = np.zeros((S, L + 1)); cnt[:, 1:] = np.cumsum(valid, axis=1)
+        lo = np.maximum(np.arange(L) - window, 0)
+        n = cnt[:, :L] - cnt[:, lo]
+        mean = np.where(n > 0, (cs[:, :L] - cs[:, lo]) / n, np.nan)
+        theo = np.hstack([np.full((S, 1), np.nan), idx_close[:, :-1]]) * mean
+        prem = np.where(theo > 0, (close - theo) / theo * 100, np.nan)
+    return {"short": np.abs(chg), "band": ma20_dev, "market": prem}
+
+def entry_bounds(values, thresholds, strategy):
+    """
+    每天新触发信号的阈值区间 [lo, hi) (阈值升序排列后的下标)：当天成立、前一天不成立的阈值。
+    短线是 "大于" (阈值越小越宽)，波段/大盘是 "小于" (阈值越大越宽)。
+    """
+    thr = np.asarray(thresholds, dtype=float)
+    K = len(thr)
+    prev = np.hstack([np.full((values.shape[0], 1), np.nan), values[:, :-1]])
+    if strategy == "short":
+        # 成立的阈值为 [0, U)
+        cur, old = (np.where(np.isnan(v), 0, np.searchsorted(thr, v, side='left')) for v in (values, prev))
+        return np.minimum(old, cur), cur
+    # 成立的阈值为 [L, K)；NaN 按 K (都不成立)
+    cur, old = (np.where(np.isnan(v), K, np.searchsorted(thr, v, side='right')) for v in (values, prev))
+    return cur, np.maximum(old, cur)
+
+def _window(x, H, fill):
+    """(S, L) -> (S, L, H)：[s, t, h] 为第 t 天之后第 h+1 根K线的值，超出数据部分填 fill"""
+    pad = np.pad(np.where(np.isnan(x), fill, x), ((0, 0), (0, H + 1)), constant_values=fill)
+    return np.lib.stride_tricks.sliding_window_view(pad, H, axis=1)[:, 1:x.shape[1] + 1]
+
+def trade_outcomes(days, open_, high, low, close, combos, fee=FEE):
+    """
+    以每天收盘价买入，按 combos 顺序逐个卖出组合产出 (收益%, 平仓日号, 持有天数)，形状均为 (S, L)；
+    数据不够判定卖出的 (还没走完) 收益为 NaN、平仓日号为 -1。逐个产出，不同时占着全部组合的内存。
+    """
+    H = max(c[3] for c in combos)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        base = close[:, :, None]
+        up = np.fmax.accumulate((_window(high, H, -np.inf) / base - 1) * 100, axis=2)
+        down = np.fmin.accumulate((_window(low, H, np.inf) / base - 1) * 100, axis=2)
+        ret_open = (_window(open_, H, np.nan) / base - 1) * 100
+        ret_close = (_window(close, H, np.nan) / base - 1) * 100
+    day_w = _window(days.astype(float), H, np.nan)
+    # 每个价位第一次触及是第几根 (累计极值单调，数一下没触及的根数即可)；H 表示没触及
+    first_up = {g: (up < g).sum(axis=2) for g in {c[0] for c in combos}}
+    stops = {max(c[1], -c[2] if c[2] is not None else -np.inf) for c in combos}
+    first_down = {s: (down > s).sum(axis=2) for s in stops}
+
+    for target, loss, support, hold in combos:
+        stop = max(loss, -support if support is not None else -np.inf)
+        ft, fs = first_up[target], first_down[stop]
+        by_stop = (fs < hold) & (fs <= ft)
+        by_target = (ft < hold) & ~by_stop
+        h = np.where(by_stop, fs, np.where(by_target, ft, hold - 1))
+        o = np.take_along_axis(ret_open, h[..., None], axis=2)[..., 0]
+        c = np.take_along_axis(ret_close, h[..., None], axis=2)[..., 0]
+        # 跳空越过价位时按开盘价成交
+        r = np.where(by_stop, np.fmin(o, stop), np.where(by_target, np.fmax(o, target), c))
+        d = np.take_along_axis(day_w, h[..., None], axis=2)[..., 0]
+        ok = (close > 0) & np.isfinite(r) & np.isfinite(d)
+        yield np.where(ok, r - fee, np.nan), np.where(ok, d, -1).astype(np.int64), h + 1
+
+def _load_index(code):
+    return history_store.load_bars(code)[["date", "close"]]
+
+def sweep_chunk(codes, index_codes, start, day0, D, grid, fee=FEE):
+    """工作进程：读一块代码的日K，回放全部参数组合。返回 replay 的两项结果和本块代码数"""
+    bars = history_store.load_many(codes, start, fields=("open", "high", "low", "close"))
+    days, open_, high, low, close = metrics_engine.build_panel(bars, codes, fields=("open", "high", "low", "close"))
+    idx_close = IndexAligner(_load_index).align(index_codes, days)
+    return (*replay(days, open_, high, low, close, idx_close, grid, day0, D, fee), len(codes))
+
+def replay(days, open_, high, low, close, idx_close, grid, day0, D, fee=FEE):
+    """
+    在一块面板上回放全部参数组合 (不读仓库)。
+    返回 {策略: (收益和, 笔数)}，形状为 (卖出组合数, 阈值数, D)，按平仓日 (day0 起第几天) 汇总；
+    {策略: (盈利笔数, 持有天数和)}，形状为 (卖出组合数, 阈值数)
+    """
+    values = signal_values(close, idx_close)
+    combos = exit_combos(grid)
+    E = len(combos)
+    bounds = {name: entry_bounds(values[name], sorted(grid[name]), name) for name, _ in STRATEGIES}
+    daily = {name: (np.zeros((E, len(grid[name]), D), dtype=np.float32), np.zeros((E, len(grid[name]), D), dtype=np.int32)) for name, _ in STRATEGIES}
+    totals = {name: (np.zeros((E, len(grid[name]))), np.zeros((E, len(grid[name])))) for name, _ in STRATEGIES}
+    for e, (ret, exit_day, held) in enumerate(trade_outcomes(days, open_, high, low, close, combos, fee)):
+        for name, _ in STRATEGIES:
+            lo, hi = bounds[name]
+            K = len(grid[name])
+            m = (hi > lo) & (exit_day >= 0)
+            r, a, b = ret[m], lo[m], hi[m]
+            off = np.clip(exit_day[m] - day0, 0, D - 1)
+
+            # 每笔只在阈值区间 [a, b) 内成立：两端打 +/- 标记，再沿阈值方向累加
+            def spread(w, key, size):
+                acc = np.bincount(a * size + key, weights=w, minlength=(K + 1) * size) - np.bincount(b * size + key, weights=w, minlength=(K + 1) * size)
+                return np.cumsum(acc.reshape(K + 1, size), axis=0)[:K]
+            daily[name][0][e], daily[name][1][e] = spread(r, off, D), spread(None, off, D)
+            totals[name][0][e], totals[name][1][e] = spread(r > 0, 0, 1)[:, 0], spread(held[m], 0, 1)[:, 0]
+    return daily, totals
+
+def summarize(daily, totals, grid):
+    """汇总各块结果：每个 (策略, 阈值, 卖出组合) 一行，列为 RESULT_COLS"""
+    combos = exit_combos(grid)
+    frames = []
+    for name, label in STRATEGIES:
+        (sums, cnts), (wins, hold_sum) = daily[name], totals[name]
+        thr = sorted(grid[name])
+        n = cnts.sum(axis=2)
+        total = sums.sum(axis=2, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 净值曲线：每个平仓日按当天平仓交易的平均收益复利一次；回撤为净值从高点 (含初始 1) 的最大回落 %
+            curve = np.cumprod(1 + np.where(cnts > 0, sums / cnts, 0) / 100, axis=2)
+            peak = np.maximum.accumulate(np.maximum(curve, 1), axis=2)
+            dd = ((1 - curve / peak) * 100).max(axis=2) if curve.shape[2] else np.zeros(n.shape)
+            e, k = np.meshgrid(np.arange(len(combos)), np.arange(len(thr)), indexing="ij")
+            e, k = e.ravel(), k.ravel()
+            nn = n.ravel()
+            frames.append(pd.DataFrame({
+                "策略": label, "阈值": np.asarray(thr)[k],
+                "止盈%": [combos[i][0] for i in e], "止损%": [combos[i][1] for i in e],
+                "支撑%": [np.nan if combos[i][2] is None else combos[i][2] for i in e], "持有天数": [combos[i][3] for i in e],
+                "交易数": nn, "胜率%": np.where(nn > 0, wins.ravel() / nn * 100, np.nan),
+                "平均收益%": np.where(nn > 0, total.ravel() / nn, np.nan),
+                "累计收益%": (curve[:, :, -1].ravel() - 1) * 100 if curve.shape[2] else 0.0, "最大回撤%": dd.ravel(),
+                "平均持有天数": np.where(nn > 0, hold_sum.ravel() / nn, np.nan),
+            }))
+    return pd.concat(frames, ignore_index=True)[RESULT_COLS]
+
+def run_backtest(codes, grid=None, days=HISTORY_DAYS, fee=FEE, index_of=None, on_progress=None, chunk=None):
+    """
+    codes 的日K需已在本地仓库 (scan_engine.sync_histories)。代码分块并行回放，
+    返回全部参数组合的结果 (见 summarize)；on_progress(0~1) 按完成的块回报。
+    """
+    import scan_engine
+    if index_of is None:
+        import data_service as ds
+        index_of = ds.get_belonging_index
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    codes = list(dict.fromkeys(codes))
+    today = datetime.date.today()
+    start = (today - datetime.timedelta(days=days)).isoformat()
+    day0, D = int(np.datetime64(start, 'D').astype(np.int64)), days + 1
+    chunk = chunk or max(20, math.ceil(len(codes) / (2 * scan_engine.MAX_WORKERS)))
+    parts = [codes[i:i + chunk] for i in range(0, len(codes), chunk)]
+    futures = [scan_engine.get_pool().submit(sweep_chunk, p, [index_of(c)[0] for c in p], start, day0, D, grid, fee) for p in parts]
+    daily = totals = None
+    for i, fut in enumerate(as_completed(futures)):
+        d, t, _ = fut.result()
+        if daily is None: daily, totals = d, t
+        else:
+            for name in daily:
+                daily[name] = tuple(x + y for x, y in zip(daily[name], d[name]))
+                totals[name] = tuple(x + y for x, y in zip(totals[name], t[name]))
+        if on_progress: on_progress((i + 1) / len(futures))
+    if daily is None: return pd.DataFrame(columns=RESULT_COLS)
+    return summarize(daily, totals, grid)
+
+def best(df, n=3, by="平均收益%", min_trades=MIN_TRADES):
+    """每个策略按 by 取前 n 个参数组合 (交易数不足 min_trades 的不参与)"""
+    df = df[df["交易数"] >= min_trades]
+    return df.sort_values(by, ascending=False).groupby("策略", sort=False).head(n)
+
+def main(argv=None):
+    """无界面入口：对自选+持仓或全市场回放信号并扫描阈值，结果写 CSV/Parquet"""
+    ap = argparse.ArgumentParser(description="三种策略 + 持仓风控的阈值回测")
+    ap.add_argument("--universe", choices=("watch", "all"), default="watch", help="watch: 自选+持仓；all: 全部在市 A股")
+    ap.add_argument("--days", type=int, default=HISTORY_DAYS)
+    ap.add_argument("--fee", type=float, default=FEE)
+    ap.add_argument("--sync", action="store_true", help="先增量同步日K")
+    ap.add_argument("--top", type=int, default=5, help="每个策略打印前几名")
+    ap.add_argument("--out", default="backtest.csv", help="完整结果，.parquet 或 .csv")
+    args = ap.parse_args(argv)
+
+    import data_service as ds
+    import scan_engine
+    from utils import load_config
+    ds.init_baostock()
+    if args.universe == "all": codes = ds.get_a_share_universe(datetime.date.today().isoformat())
+    else:
+        config = load_config()
+        codes = [c for c in dict.fromkeys(list(config["watch_list"]) + list(config["holding_list"])) if not c.endswith(".HK")]
+    if args.sync:
+        failed = scan_engine.sync_histories(codes, on_progress=lambda p: print(f"\r同步 {p:.0%}", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        if failed: print(f"{len(failed)} 只日K同步失败 (如 {next(iter(failed.items()))})", file=sys.stderr)
+    res = run_backtest(codes, days=args.days, fee=args.fee, on_progress=lambda p: print(f"\r回测 {p:.0%}", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    if args.out.endswith(".parquet"): res.to_parquet(args.out)
+    else: res.to_csv(args.out, index=False, encoding="utf-8-sig")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(best(res, args.top).round(2).to_string(index=False))
+    print(f"{len(codes)} 只, {len(res)} 组参数 -> {args.out}", file=sys.stderr)
+    scan_engine.shutdown_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import json
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from market_clock import SESSIONS, CLOSE_GRACE, market_of, get_clock
+
+# ================= 盘中分钟线记录器 =================
+# 轮询器每拉一次行情就把快照并入各代码当天的分钟K线。
+# 数据放在固定大小的内存映射环形缓冲里：每块 BLOCK 只代码 × DAYS 个交易日 × SLOTS 个分钟槽，
+# 只有实际写到的页才占内存/磁盘 (稀疏文件)，重启后原样可读。
+# 成交量存当天累计量 (新浪快照本身就是累计值)，分钟量取相邻两槽之差。
+
+ROOT = "intraday"
+DAYS = 20                 # 每只代码保留最近多少个交易日
+BLOCK = 256               # 每个映射文件容纳的代码数 (文件数 = 代码数 / BLOCK，避免每只代码占一个句柄)
+SLOTS = 330               # 港股 330 分钟，A股只用前 240 个
+BAR_DTYPE = np.dtype([("open", "f4"), ("high", "f4"), ("low", "f4"), ("close", "f4"), ("volume", "f8")])
+# 交易时段取自 market_clock；收盘后 CLOSE_GRACE 分钟内的快照 (收盘集合竞价) 记入最后一槽
+
+def session_slots(market):
+    return sum(e - s for s, e in SESSIONS[market])
+
+def minute_slot(t, market="A"):
+    """datetime/time -> 分钟槽号；午休、盘前、收盘后返回 None (不判断是否交易日)"""
+    m = t.hour * 60 + t.minute
+    base = 0
+    for s, e in SESSIONS[market]:
+        if s <= m < e: return base + m - s
+        base += e - s
+    if SESSIONS[market][-1][1] <= m < SESSIONS[market][-1][1] + CLOSE_GRACE[market]: return base - 1
+    return None
+
+def last_closed_slot(t, market="A"):
+    """盘外时间 (午休/收盘后) 最近一个已走完的分钟槽；盘前返回 None"""
+    m, base, res = t.hour * 60 + t.minute, 0, None
+    for s, e in SESSIONS[market]:
+        if m >= e: res = base + e - s - 1
+        base += e - s
+    return res
+
+def slot_labels(market="A"):
+    """分钟槽 -> 'HH:MM' (该分钟的开始时刻)"""
+    return [f"{(s + i) // 60:02d}:{(s + i) % 60:02d}" for s, e in SESSIONS[market] for i in range(e - s)]
+
+def _day_number(d):
+    return int(np.datetime64(d, 'D').astype(np.int64))
+
+class BarRecorder:
+    def __init__(self, root=ROOT, days=DAYS, block=BLOCK):
+        self.root = root
+        self.days = days
+        self.block = block
+        self._lock = threading.Lock()
+        self._bars = []           # 每块一个 (BLOCK, DAYS, SLOTS) 的结构化 memmap
+        self._dates = []          # 每块一个 (BLOCK, DAYS) 的日号 memmap，空槽为 -1
+        self._slot_of = {}        # 代码 -> 全局序号
+        self._today = {}          # 代码 -> 今天所用的日槽，换日时清空
+        self._today_num = None
+        os.makedirs(root, exist_ok=True)
+        idx = os.path.join(root, "index.json")
+        if os.path.exists(idx):
+            with open(idx, "r", encoding="utf-8") as f: self._slot_of = json.load(f)
+        for b in range((len(self._slot_of) + block - 1) // block): self._open_block(b)
+
+    # ---------- 存储 ----------
+    def _open_block(self, b):
+        bars_path = os.path.join(self.root, f"bars_{b:03d}.npy")
+        dates_path = os.path.join(self.root, f"dates_{b:03d}.npy")
+        if os.path.exists(bars_path):
+            bars = np.lib.format.open_memmap(bars_path, mode="r+")
+            dates = np.lib.format.open_memmap(dates_path, mode="r+")
+        else:
+            # 新建的映射文件是稀疏的，NaN 填充只在首次写入某代码时按行进行
+            bars = np.lib.format.open_memmap(bars_path, mode="w+", dtype=BAR_DTYPE, shape=(self.block, self.days, SLOTS))
+            dates = np.lib.format.open_memmap(dates_path, mode="w+", dtype=np.int32, shape=(self.block, self.days))
+            dates[:] = -1
+        self._bars.append(bars)
+        self._dates.append(dates)
+
+    def _save_index(self):
+        path = os.path.join(self.root, "index.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f: json.dump(self._slot_of, f)
+        os.replace(path + ".tmp", path)
+
+    def _register(self, codes):
+        new = [c for c in codes if c not in self._slot_of]
+        if not new: return
+        for c in new:
+            self._slot_of[c] = len(self._slot_of)
+            if self._slot_of[c] // self.block >= len(self._bars): self._open_block(len(self._bars))
+        self._save_index()
+
+    def _locate(self, code):
+        g = self._slot_of.get(code)
+        if g is None: return None, None
+        return g // self.block, g % self.block
+
+    def _day_slot(self, b, r, today):
+        """今天在该代码环形缓冲里的日槽；没有就覆盖最旧的一天"""
+        dates = self._dates[b][r]
+        hit = np.nonzero(dates == today)[0]
+        if len(hit): return int(hit[0])
+        d = int(np.argmin(dates))
+        self._bars[b][r, d] = (np.nan, np.nan, np.nan, np.nan, np.nan)
+        dates[d] = today
+        return d
+
+    # ---------- 写入 ----------
+    def record(self, quotes, now=None):
+        """
+        并入一次快照 quotes: {代码: (现价, 昨收, 涨跌%, 累计成交量)}。
+        盘外时间、休市日 (新浪仍返回上一交易日的快照)、现价为 0 (停牌/取不到) 的代码忽略。
+        """
+        now = now or datetime.datetime.now()
+        today = _day_number(now.date())
+        cal = get_clock().calendar
+        with self._lock:
+            if today != self._today_num: self._today, self._today_num = {}, today
+            minute = {mk: minute_slot(now, mk) if cal.is_trading_day(now.date(), mk) else None for mk in SESSIONS}
+            live = [c for c, q in quotes.items() if q[0] > 0 and minute[market_of(c)] is not None]
+            if not live: return 0
+            self._register(live)
+            groups = {}
+            for c in live:
+                b, r = self._locate(c)
+                d = self._today.get(c)
+                if d is None: d = self._today[c] = self._day_slot(b, r, today)
+                g = groups.setdefault(b, ([], [], [], [], []))
+                g[0].append(r); g[1].append(d); g[2].append(minute[market_of(c)])
+                g[3].append(quotes[c][0]); g[4].append(quotes[c][3])
+            for b, (rows, ds, ms, px, vol) in groups.items():
+                # 同一块内一次花式索引写入全部代码
+                rows, ds, ms = np.array(rows), np.array(ds), np.array(ms)
+                px, vol = np.array(px, dtype=np.float32), np.array(vol, dtype=float)
+                cur = self._bars[b][rows, ds, ms]
+                first = np.isnan(cur["open"])
+                cur["open"] = np.where(first, px, cur["open"])
+                cur["high"] = np.where(first, px, np.fmax(cur["high"], px))
+                cur["low"] = np.where(first, px, np.fmin(cur["low"], px))
+                cur["close"] = px
+                cur["volume"] = vol
+                self._bars[b][rows, ds, ms] = cur
+            return len(live)
+
+    def flush(self):
+        """把映射页写回磁盘 (轮询器在时段切换时调用，进程退出时再写一次)"""
+        with self._lock:
+            for arr in self._bars + self._dates: arr.flush()
+
+    # ---------- 读取 ----------
+    def expected_volume(self, codes, now=None, days=5):
+        """
+        各代码截至当前分钟的历史同时刻平均累计量 (无历史为 NaN)，用于量比。
+        只计当天记录覆盖了该分钟前后的日子 (中途开机/关机的不拉低均值)；按 (映射块, 分钟槽) 分组一次算一批，只读到当前分钟为止的列。
+        """
+        now = now or datetime.datetime.now()
+        today = _day_number(now.date())
+        out = np.full(len(codes), np.nan)
+        groups = {}
+        for i, c in enumerate(codes):
+            b, r = self._locate(c)
+            if b is None: continue
+            mk = market_of(c)
+            if not get_clock().calendar.is_trading_day(now.date(), mk): m = session_slots(mk) - 1   # 休市日快照是全天量
+            else: m = minute_slot(now, mk)
+            if m is None: m = last_closed_slot(now, mk)
+            if m is None: continue
+            g = groups.setdefault((b, m), ([], []))
+            g[0].append(i); g[1].append(r)
+        for (b, m), (idx, rows) in groups.items():
+            rows = np.array(rows)
+            dates = np.array(self._dates[b][rows])
+            vol = self._bars[b]["volume"]          # 字段视图，不拷贝整条记录
+            v = vol[rows, :, :m + 1]
+            after = ~np.isnan(vol[rows, :, m:]).all(axis=2)
+            with np.errstate(invalid='ignore'):
+                cum = np.where(np.isnan(v).all(axis=2), np.nan, np.nanmax(np.where(np.isnan(v), -np.inf, v), axis=2))
+            # 每行取今天以前最近 days 个有记录的交易日
+            past = (dates >= 0) & (dates != today)
+            rank = np.argsort(np.argsort(np.where(past, -dates, np.iinfo(np.int32).max), axis=1), axis=1)
+            ok = past & (rank < days) & after & np.isfinite(cum)
+            n = ok.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[idx] = np.where(n > 0, np.where(ok, cum, 0).sum(axis=1) / n, np.nan)
+        return out
+
+    def minute_bars(self, code, day=None):
+        """某天的分钟K线 DataFrame[时间, open, high, low, close, volume(分钟量)]，无记录返回 None"""
+        b, r = self._locate(code)
+        if b is None: return None
+        target = _day_number(day or datetime.date.today())
+        hit = np.nonzero(np.array(self._dates[b][r]) == target)[0]
+        if not len(hit): return None
+        rec = np.array(self._bars[b][r, int(hit[0])])
+        n = session_slots(market_of(code))
+        df = pd.DataFrame({k: rec[k][:n].astype(float) for k in ("open", "high", "low", "close")})
+        cum = np.fmax.accumulate(rec["volume"][:n])
+        df["volume"] = np.diff(np.nan_to_num(cum), prepend=0.0)
+        df.insert(0, "时间", slot_labels(market_of(code)))
+        return df[~np.isnan(rec["close"][:n])].reset_index(drop=True)
+
+    def recorded_days(self, code):
+        b, r = self._locate(code)
+        if b is None: return []
+        dates = np.array(self._dates[b][r])
+        return sorted(str(np.datetime64(int(d), 'D')) for d in dates if d >= 0)
@@ -0,0 +1,31 @@
+"""
+新浪批量解析微基准：5000 只代码的整段响应。
+用法: python benchmarks/bench_sina_parser.py [--n 5000] [--repeat 50]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sina_parser
+from sina_fixture import make_codes, make_payload
+
+def bench(fn, raw, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(raw); times.append(time.perf_counter() - t)
+    return statistics.median(times) * 1000, min(times) * 1000
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    raw = make_payload(make_codes(args.n))
+    df = sina_parser.parse_batch(raw)
+    print(f"payload {len(raw) / 1024:.0f} KB, {len(df)} rows x {len(df.columns)} cols")
+    med, best = bench(sina_parser.parse_batch, raw, args.repeat)
+    print(f"parse_batch  median {med:7.2f} ms   best {best:7.2f} ms")
@@ -0,0 +1,90 @@
+"""
+离线替身 baostock：接口与真实模块一致，数据为按代码播种的可复现随机游走。
+基准测试把 benchmarks/fake_modules 放到 sys.path 最前面，主进程和 spawn 出的扫描进程都会导入它。
+环境变量 FAKE_BS_LATENCY (秒) 可模拟每次查询的网络往返。
+"""
+import os
+import time
+import zlib
+import datetime
+import numpy as np
+
+LATENCY = float(os.environ.get("FAKE_BS_LATENCY", "0"))
+UNIVERSE_SIZE = int(os.environ.get("FAKE_BS_UNIVERSE", "5000"))
+EPOCH = datetime.date(2020, 1, 1)
+INDEX_CODES = {"sh.000001": "上证指数", "sh.000688": "科创50", "sz.399001": "深证成指",
+               "sz.399006": "创业板指", "sh.000300": "沪深300", "sh.000905": "中证500"}
+INDUSTRIES = ["银行", "医药生物", "电子", "计算机", "食品饮料", "电力设备", "有色金属", "非银金融", "汽车", "机械设备"]
+
+class _Result:
+    def __init__(self, rows, fields):
+        self.error_code, self.error_msg = '0', 'success'
+        self.fields = fields
+        self._rows, self._i = rows, -1
+
+    def next(self):
+        self._i += 1
+        return self._i < len(self._rows)
+
+    def get_row_data(self):
+        return self._rows[self._i]
+
+def _wait():
+    if LATENCY: time.sleep(LATENCY)
+
+def login(*a, **k):
+    return _Result([], [])
+
+def logout(*a, **k):
+    return _Result([], [])
+
+def universe(n=None):
+    """与 benchmarks.sina_fixture.make_codes 一致的 baostock 代码"""
+    n = n or UNIVERSE_SIZE
+    n_a = n - int(n * 0.02)
+    codes = [f"sh.{600000 + i:06d}" for i in range(n_a // 2)]
+    codes += [f"sz.{i + 1:06d}" for i in range(n_a - n_a // 2)]
+    return codes
+
+_series = {}
+
+def _bars(code):
+    """从 EPOCH 起每个工作日一根K线，同一代码每次结果相同 (增量同步才能对得上)"""
+    if code not in _series:
+        days = np.arange(np.datetime64(EPOCH), np.datetime64(datetime.date.today()) + 1)
+        days = days[np.is_busday(days)]
+        rnd = np.random.default_rng(zlib.crc32(code.encode()))
+        base = 3000.0 if code in INDEX_CODES else rnd.uniform(5, 100)
+        close = base * np.exp(np.cumsum(rnd.normal(0, 0.015, len(days))))
+        vol = rnd.uniform(1e6, 5e7, len(days))
+        _series[code] = (days.astype(str), close, vol)
+    return _series[code]
+
+def query_history_k_data_plus(code, fields, start_date=None, end_date=None, frequency="d", adjustflag="3"):
+    _wait()
+    days, close, vol = _bars(code)
+    lo = np.searchsorted(days, start_date or "0000") if start_date else 0
+    hi = np.searchsorted(days, end_date, side="right") if end_date else len(days)
+    rows = []
+    for d, c, v in zip(days[lo:hi], close[lo:hi], vol[lo:hi]):
+        o, h, l = c * 0.995, c * 1.01, c * 0.99
+        rows.append([d, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.0f}"])
+    return _Result(rows, fields.split(","))
+
+def query_stock_basic(code="", code_name=""):
+    _wait()
+    rows = [[c, f"样本{c[-4:]}", "2010-01-01", "", "1", "1"] for c in universe()]
+    rows += [[c, n, "2000-01-01", "", "2", "1"] for c, n in INDEX_CODES.items()]
+    return _Result(rows, ["code", "code_name", "ipoDate", "outDate", "type", "status"])
+
+def query_trade_dates(start_date=None, end_date=None):
+    _wait()
+    start = np.datetime64(start_date or "2020-01-01")
+    end = np.datetime64(end_date or datetime.date.today().isoformat())
+    days = np.arange(start, end + 1)
+    return _Result([[str(d), "1" if np.is_busday(d) else "0"] for d in days], ["calendar_date", "is_trading_day"])
+
+def query_stock_industry(code="", date=""):
+    _wait()
+    rows = [["2026-01-05", c, f"样本{c[-4:]}", INDUSTRIES[zlib.crc32(c.encode()) % len(INDUSTRIES)], "申万一级行业"] for c in universe()]
+    return _Result(rows, ["updateDate", "code", "code_name", "industry", "industryClassification"])
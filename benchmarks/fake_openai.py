@@ -0,0 +1,61 @@
+"""
+本地 OpenAI 兼容替身：POST .../chat/completions (stream=True) 按 SSE 回放固定回答。
+first_token 模拟模型的首字延迟，token_gap 为后续每段的间隔；记录收到的请求数和最近一次的 messages。
+"""
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ANSWER = "根据持仓数据，当前没有触发止损或破位的仓位，建议继续持有并关注支撑位附近的成交量变化。"
+
+class FakeOpenAI:
+    def __init__(self, first_token=0.3, token_gap=0.01, answer=ANSWER, chunk=6):
+        self.first_token = first_token
+        self.token_gap = token_gap
+        self.answer = answer
+        self.chunk = chunk
+        self.requests = 0
+        self.last_messages = None
+
+    def _chunks(self, model):
+        for i in range(0, len(self.answer), self.chunk):
+            yield {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                   "choices": [{"index": 0, "delta": {"content": self.answer[i:i + self.chunk]}, "finish_reason": None}]}
+        yield {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+               "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+    def serve(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                stub.last_messages = body.get("messages")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(stub.first_token)
+                for i, c in enumerate(stub._chunks(body.get("model", "fake"))):
+                    if i: time.sleep(stub.token_gap)
+                    self._write(f"data: {json.dumps(c, ensure_ascii=False)}\n\n".encode())
+                self._write(b"data: [DONE]\n\n")
+                self._write(b"")
+
+            def _write(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, *a): pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def stop(self):
+        self.server.shutdown()
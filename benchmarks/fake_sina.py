@@ -0,0 +1,58 @@
+"""
+本地新浪行情回放服务：按请求的 list= 代码逐行回放 hq_str 样本。
+样本默认由 sina_fixture 生成；--record 指定真实录制的响应文件时按代码从中取行。
+"""
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from sina_fixture import make_payload
+
+_LINE = re.compile(rb'var hq_str_(\w+)="[^"]*";\n?')
+
+class SinaReplay:
+    def __init__(self, record=None, latency=0.0, seed=0):
+        self.latency = latency
+        self.seed = seed
+        self.lines = {}
+        self.requests = 0
+        if record:
+            with open(record, "rb") as f: self._index(f.read())
+
+    def _index(self, raw):
+        for m in _LINE.finditer(raw): self.lines[m.group(1).decode()] = m.group(0).rstrip(b"\n") + b"\n"
+
+    def payload(self, sina_codes):
+        missing = [c for c in sina_codes if c not in self.lines]
+        if missing:
+            # 按新浪代码反推出 600519.SS 形式再生成，保证同一代码每次回放内容一致
+            origin = [f"{c[2:]}.HK" if c.startswith("hk") else f"{c[2:]}.{'SS' if c.startswith('sh') else 'SZ'}" for c in missing]
+            self._index(make_payload(origin, seed=self.seed, suspended_share=0))
+        return b"".join(self.lines.get(c, f'var hq_str_{c}="";\n'.encode()) for c in sina_codes)
+
+    def serve(self, port=0):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive，和连接池的行为一致
+
+            def do_GET(self):
+                replay.requests += 1
+                codes = self.path.split("list=", 1)[-1].split(",")
+                if replay.latency: time.sleep(replay.latency)
+                body = replay.payload([c for c in codes if c])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/javascript; charset=GBK")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a): pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}/list="
+
+    def stop(self):
+        self.server.shutdown()
@@ -0,0 +1,235 @@
+"""
+离线回放基准：全面扫描 / render_table / get_batch_realtime_sina / calculate_advanced_metrics。
+新浪走本地回放服务，baostock 换成 fake_modules/baostock.py，全程不访问外网。
+
+用法: python benchmarks/run_benchmarks.py [--sizes 50 500 5000] [--repeat 5] [--out bench.jsonl]
+      [--sina-latency 0.02] [--bs-latency 0.01] [--cases scan render quotes metrics sectors advisor news screener backtest]
+      [--llm-first-token 0.3]
+每个 (用例, 规模) 输出一行 JSON：
+  {"case", "n", "runs", "throughput", "unit", "p50_ms", "p99_ms", "peak_mem_mb", "max_rss_mb"}
+  peak_mem_mb 为 tracemalloc 峰值 (Python 分配)，max_rss_mb 为进程至今的常驻内存峰值
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import warnings
+import tracemalloc
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+def _setup(args):
+    """替身模块放在 sys.path 最前面；spawn 出的扫描进程会继承 sys.path 和环境变量"""
+    os.environ["FAKE_BS_LATENCY"] = str(args.bs_latency)
+    os.environ["FAKE_BS_UNIVERSE"] = str(max(args.sizes))
+    sys.path[:0] = [os.path.join(HERE, "fake_modules"), HERE, ROOT]
+    warnings.filterwarnings("ignore")
+    logging.disable(logging.WARNING)
+    # 本地仓库放到临时目录，冷启动从空库开始
+    os.chdir(tempfile.mkdtemp(prefix="stoak-bench-"))
+
+def _stats(case, n, times, items, unit, peak):
+    times = np.asarray(times)
+    return {"case": case, "n": n, "runs": len(times),
+            "throughput": round(items / float(np.median(times)), 2) if len(times) else 0.0, "unit": unit,
+            "p50_ms": round(float(np.percentile(times, 50)) * 1000, 3),
+            "p99_ms": round(float(np.percentile(times, 99)) * 1000, 3),
+            "peak_mem_mb": round(peak / 2 ** 20, 2),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+def measure(case, n, fn, repeat, items, unit="symbols/s"):
+    """先不开 tracemalloc 计时 repeat 次，再单独跑一次量峰值内存 (tracemalloc 会拖慢计时)"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return _stats(case, n, times, items, unit, peak)
+
+def measure_each(case, n, fn, args_list, unit="calls/s"):
+    """逐次调用的延迟分布 (如单只 calculate_advanced_metrics)"""
+    times = []
+    tracemalloc.start()
+    for a in args_list:
+        t = time.perf_counter(); fn(*a); times.append(time.perf_counter() - t)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return _stats(case, n, times, 1, unit, peak)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--cases", nargs="+", default=["quotes", "metrics", "scan", "render", "sectors", "advisor", "news", "screener", "backtest"])
+    ap.add_argument("--metrics-sample", type=int, default=200, help="单只指标计算最多抽样多少只")
+    ap.add_argument("--sina-latency", type=float, default=0.0)
+    ap.add_argument("--bs-latency", type=float, default=0.0)
+    ap.add_argument("--llm-first-token", type=float, default=0.3, help="替身大模型的首字延迟 (秒)")
+    ap.add_argument("--record", help="真实录制的新浪响应文件，缺省用合成样本")
+    ap.add_argument("--out", help="结果另写一份到该 JSONL 文件")
+    args = ap.parse_args()
+    _setup(args)
+
+    import quote_client
+    import data_service as ds
+    import scan_engine
+    import watch_table
+    from rule_engine import RuleEngine, rule_inputs
+    from fake_sina import SinaReplay
+    from sina_fixture import make_codes
+
+    replay = SinaReplay(record=args.record, latency=args.sina_latency)
+    quote_client.SINA_URL = replay.serve()
+    out = open(args.out, "a", encoding="utf-8") if args.out else None
+
+    def emit(rec):
+        line = json.dumps(rec, ensure_ascii=False)
+        print(line, flush=True)
+        if out: out.write(line + "\n"); out.flush()
+
+    for n in args.sizes:
+        codes = make_codes(n)
+        a_codes = [c for c in codes if not c.endswith(".HK")]
+
+        if "quotes" in args.cases:
+            emit(measure("get_batch_realtime_sina", n, lambda: ds.get_batch_realtime_sina(codes), args.repeat, n))
+
+        if "scan" in args.cases:
+            t = time.perf_counter()
+            quotes, metrics, _ = scan_engine.run_scan(codes)
+            emit(_stats("full_scan_cold", n, [time.perf_counter() - t], n, "symbols/s", 0))
+            emit(measure("full_scan_warm", n, lambda: scan_engine.run_scan(codes), args.repeat, n))
+        else:
+            quotes, metrics = scan_engine.fetch_quotes(codes), None
+
+        if "metrics" in args.cases:
+            sample = a_codes[:args.metrics_sample]
+            for c in sample: ds.get_history_data(c)   # 先同步，只测计算本身
+            emit(measure_each("calculate_advanced_metrics", n, ds.calculate_advanced_metrics,
+                              [(c, quotes[c]["现价"], quotes[c]["成交量"]) for c in sample if c in quotes and quotes[c]["现价"] > 0]))
+            if metrics is not None:
+                live = list(metrics.index)
+                emit(measure("calculate_batch_metrics", n, lambda: ds.calculate_batch_metrics(
+                    live, [quotes[c]["现价"] for c in live], [quotes[c]["成交量"] for c in live]), args.repeat, len(live)))
+
+        if "render" in args.cases:
+            watch_list = {c: {"strategy": ("⚡ 短线", "🌊 波段", "⚓ 大盘")[i % 3]} for i, c in enumerate(codes)}
+            quote_map = {c: (q["现价"], 0.0, q["涨跌%"], q["成交量"]) for c, q in quotes.items()}
+            stock_map = {c: f"样本{c[:6]}" for c in codes}
+            engine = RuleEngine()
+            engine.compile({"watch_list": watch_list, "holding_list": {}, "thresholds": {"short": 3.0, "band": -5.0, "market": -10.0}})
+            analysis_df = metrics if metrics is not None else None
+            engine.update(rule_inputs(quote_map, analysis_df))
+
+            view = watch_table.WatchTable()
+
+            def render():
+                df = watch_table.build_watch_frame(quote_map, watch_list, stock_map, analysis_df, engine)
+                view.update(df)
+                # st.dataframe 序列化 Styler 时会计算当前页的全部样式，这里用 to_html 近似
+                view.page(0).to_html()
+            emit(measure("render_table", n, render, args.repeat, n))
+
+            # 告警 tick：每次约 10% 的代码价格变动，只重算这些代码并去重
+            rng = np.random.default_rng(0)
+            ticks = []
+            for _ in range(args.repeat):
+                moved = dict(quote_map)
+                for c in rng.choice(codes, max(1, n // 10), replace=False):
+                    p, last, chg, vol = moved[c]
+                    moved[c] = (p * (1 + rng.normal(0, 0.01)), last, chg + rng.normal(0, 1), vol)
+                ticks.append(moved)
+            it = iter(ticks * 2)
+            emit(measure("rules_tick", n, lambda: (engine.update(rule_inputs(next(it), analysis_df)), engine.alerts(stock_map)),
+                         args.repeat, n))
+
+    if "sectors" in args.cases:
+        # 全市场板块：替身 baostock 的行业表覆盖最大规模的全部代码，行情一次批量拉全
+        engine = ds.get_sector_engine("bench")
+        for w in ("等权", "成交额加权"):
+            emit(measure(f"sector_board[{w}]", len(engine.codes), lambda: engine.compute(ds.get_quote_frame(engine.codes), w),
+                         args.repeat, len(engine.codes)))
+
+    if "screener" in args.cases:
+        # 全市场选股：股票池 = 替身 baostock 的全部 A股；先同步历史，再测首次 (加载面板) 和常驻面板后的刷新
+        import screener
+        scr = ds.get_screener("bench")
+        t = time.perf_counter()
+        scan_engine.sync_histories(scr.codes)
+        emit(_stats("screener_sync_cold", len(scr.codes), [time.perf_counter() - t], len(scr.codes), "symbols/s", 0))
+        conds = screener.parse_conditions("MA20偏<0; 量比>0.5")
+        t = time.perf_counter()
+        screener.screen(ds.refresh_screener(scr), conds, "MA20偏", True)
+        emit(_stats("screener_first_refresh", len(scr.codes), [time.perf_counter() - t], len(scr.codes), "symbols/s", 0))
+        emit(measure("screener_refresh", len(scr.codes), lambda: screener.screen(ds.refresh_screener(scr), conds, "MA20偏", True),
+                     args.repeat, len(scr.codes)))
+
+    if "backtest" in args.cases:
+        # 阈值扫描：默认网格 (3 策略 × 8 阈值 × 90 个卖出组合) 回放 n 只 A股的本地日K；同步不计入
+        import backtest
+        scan_engine.sync_histories(a_codes)
+        combos = sum(len(backtest.DEFAULT_GRID[s]) for s, _ in backtest.STRATEGIES) * len(backtest.exit_combos(backtest.DEFAULT_GRID))
+        t = time.perf_counter()
+        backtest.run_backtest(a_codes)
+        emit(_stats(f"backtest_sweep_{combos}", len(a_codes), [time.perf_counter() - t], len(a_codes), "symbols/s", 0))
+
+    if "news" in args.cases:
+        # 新闻库：按页回放合成新闻流 (每页 50 条，新的在前) 增量入库，再按关键词 + 时间窗查询
+        import news_store
+        n_news = max(args.sizes) * 4
+        now = int(time.time())
+        feed = [{"id": f"doc{i}", "ts": now - i * 30, "title": f"样本{600000 + i % 500:06d} 公告第{i}号 {'业绩预增' if i % 5 == 0 else '股东减持'}",
+                 "intro": "摘要" * 20, "url": f"https://example.com/{i}", "source": "样本"} for i in range(n_news)]
+        ingester = news_store.NewsIngester(lambda p: feed[(p - 1) * 50:p * 50], max_pages=n_news // 50, start=False)
+        t = time.perf_counter(); ingester.poll_once()
+        emit(_stats("news_ingest_backfill", n_news, [time.perf_counter() - t], n_news, "items/s", 0))
+        emit(measure("news_ingest_incremental", n_news, ingester.poll_once, args.repeat, 1, "polls/s"))
+        emit(measure("news_search_keyword", n_news, lambda: news_store.search(["样本600123", "业绩预增"], since=now - 86400),
+                     args.repeat, 1, "queries/s"))
+        emit(measure("news_search_short", n_news, lambda: news_store.search(["减持"], since=now - 3600), args.repeat, 1, "queries/s"))
+
+    if "advisor" in args.cases:
+        # AI 顾问：上下文拼装 + 首字延迟 (未命中走替身大模型，命中走回答缓存)
+        import advisor
+        from fake_openai import FakeOpenAI
+        llm = FakeOpenAI(first_token=args.llm_first_token)
+        client = ds.get_llm_client("sk-bench", llm.serve())
+        codes = make_codes(max(args.sizes))[:50]
+        quote_map = {c: (q["现价"], 0.0, q["涨跌%"], q["成交量"]) for c, q in scan_engine.fetch_quotes(codes).items()}
+        holdings = {c: {"cost": quote_map.get(c, (10.0,))[0] * 0.95, "support": 0, "profit_target": 20, "loss_limit": -10} for c in codes}
+        names = {c: f"样本{c[:6]}" for c in codes}
+        news = "\n".join(f"【{9 + i // 60:02d}:{i % 60:02d}】{'样本' + codes[i % 50][:6] if i % 7 == 0 else '某公司'}发布公告，{'业绩' * 10}" for i in range(2000))
+        ctx = advisor.build_context(holdings, quote_map, names, news=news)
+        rec = measure("advisor_context", len(codes), lambda: advisor.build_context(holdings, quote_map, names, news=news), args.repeat, len(codes))
+        rec.update(prompt_tokens=advisor.estimate_tokens(ctx), full_news_tokens=advisor.estimate_tokens(news))
+        emit(rec)
+
+        cache = advisor.CompletionCache()
+        def first_token(prompt):
+            msgs = [{"role": "system", "content": ctx}, {"role": "user", "content": prompt}]
+            t = time.perf_counter()
+            gen = advisor.stream_answer(client, "fake", msgs, cache)
+            next(gen)
+            dt = time.perf_counter() - t
+            for _ in gen: pass
+            return dt
+        miss = [first_token(f"问题{i}") for i in range(args.repeat)]
+        hit = [first_token("问题0") for _ in range(args.repeat)]
+        emit(_stats("llm_first_token_miss", 1, miss, 1, "answers/s", 0))
+        emit(_stats("llm_first_token_hit", 1, hit, 1, "answers/s", 0))
+        llm.stop()
+
+    scan_engine.shutdown_pool()
+    replay.stop()
+    if out: out.close()
+
+if __name__ == "__main__":
+    main()
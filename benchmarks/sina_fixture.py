@@ -0,0 +1,47 @@
+import random
+
+# ================= 新浪 hq_str 样本数据 =================
+# 按新浪真实字段顺序生成可复现的响应 (GBK 字节)，供基准测试和本地回放服务使用。
+
+def make_codes(n, hk_share=0.02):
+    """生成 n 个代码 (600519.SS 形式)，沪深各半，少量港股"""
+    n_hk = int(n * hk_share)
+    n_a = n - n_hk
+    codes = [f"{600000 + i:06d}.SS" for i in range(n_a // 2)]
+    codes += [f"{i + 1:06d}.SZ" for i in range(n_a - n_a // 2)]
+    codes += [f"{700 + i:05d}.HK" for i in range(n_hk)]
+    return codes
+
+def _a_line(sina_code, rnd):
+    last = round(rnd.uniform(3, 200), 2)
+    price = round(last * rnd.uniform(0.9, 1.1), 2)
+    hi, lo = max(price, last) * 1.01, min(price, last) * 0.99
+    vol = rnd.randint(10_000, 50_000_000)
+    book = []
+    for i in range(5): book += [str(rnd.randint(100, 90000)), f"{price - 0.01 * (i + 1):.2f}"]
+    for i in range(5): book += [str(rnd.randint(100, 90000)), f"{price + 0.01 * (i + 1):.2f}"]
+    fields = ["样本股票", f"{last:.2f}", f"{last:.2f}", f"{price:.2f}", f"{hi:.2f}", f"{lo:.2f}",
+              f"{price - 0.01:.2f}", f"{price:.2f}", str(vol), f"{vol * price:.3f}"] + book + ["2026-10-16", "15:00:03", "00"]
+    return f'var hq_str_{sina_code}="{",".join(fields)}";\n'
+
+def _hk_line(sina_code, rnd):
+    last = round(rnd.uniform(1, 500), 3)
+    price = round(last * rnd.uniform(0.9, 1.1), 3)
+    vol = rnd.randint(10_000, 50_000_000)
+    fields = ["SAMPLE", "样本港股", f"{last:.3f}", f"{last:.3f}", f"{price * 1.01:.3f}", f"{price * 0.99:.3f}",
+              f"{price:.3f}", f"{price - last:.3f}", f"{(price - last) / last * 100:.3f}", f"{price:.3f}",
+              f"{price + 0.02:.3f}", f"{vol * price:.0f}", str(vol), "20.1", "0.5", f"{price * 1.3:.3f}",
+              f"{price * 0.7:.3f}", "2026/10/16", "16:08"]
+    return f'var hq_str_{sina_code}="{",".join(fields)}";\n'
+
+def make_payload(codes, seed=0, suspended_share=0.01):
+    """生成对应 codes 的完整响应字节；约 1% 为停牌空行 (="")"""
+    rnd = random.Random(seed)
+    out = []
+    for c in codes:
+        num, ex = c.split(".")
+        sina = f"hk{num}" if ex == "HK" else ("sh" if ex == "SS" else "sz") + num
+        if rnd.random() < suspended_share: out.append(f'var hq_str_{sina}="";\n')
+        elif ex == "HK": out.append(_hk_line(sina, rnd))
+        else: out.append(_a_line(sina, rnd))
+    return "".join(out).encode("gbk")
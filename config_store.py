@@ -0,0 +1,140 @@
+import os
+import json
+import atexit
+import sqlite3
+import threading
+
+# ================= 配置存储 (SQLite) =================
+# 每个自选/持仓/阈值条目单独一行，保存时只写本会话改动过的行：
+# 改一只持仓不会重写整个文档，两个会话分别改不同条目也不会互相覆盖。
+# SQLite 的事务本身提供原子写入和文件锁，不会读到写了一半的内容。
+# 进程内缓存用 PRAGMA data_version 校验，没有其他连接提交时 rerun 不再解析 JSON。
+
+CONFIG_DB = "config.db"
+LEGACY_FILE = "config.json"
+DICT_SECTIONS = ("watch_list", "holding_list", "thresholds")
+
+_lock = threading.RLock()
+_conn = None
+_version = None
+_rows = {}          # (section, key) -> JSON 文本，与数据库一致 (含尚未落盘的防抖改动)
+_values = {}        # (section, key) -> 已解析的值，rerun 时直接复用
+_pending = {}       # 防抖中的改动：(section, key) -> JSON 文本，None 表示删除
+_timer = None
+
+class ConfigDict(dict):
+    """load 返回的配置；记住加载时的快照，保存时只写相对快照改动过的条目"""
+    __slots__ = ("_base",)
+
+def _dump(v):
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+
+def _flatten(cfg):
+    rows = {}
+    for k, v in cfg.items():
+        if k in DICT_SECTIONS and isinstance(v, dict):
+            for kk, vv in v.items(): rows[(k, kk)] = _dump(vv)
+        else: rows[("", k)] = _dump(v)
+    return rows
+
+def _copy(v):
+    """条目都是一层的小 dict/标量，浅拷一层即可隔离调用方的修改"""
+    return dict(v) if isinstance(v, dict) else list(v) if isinstance(v, list) else v
+
+def _unflatten(rows):
+    cfg = ConfigDict({s: {} for s in DICT_SECTIONS})
+    for sk in rows:
+        section, key = sk
+        if sk not in _values: _values[sk] = json.loads(rows[sk])
+        if section: cfg[section][key] = _copy(_values[sk])
+        else: cfg[key] = _copy(_values[sk])
+    cfg._base = dict(rows)
+    return cfg
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CONFIG_DB, timeout=30, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("CREATE TABLE IF NOT EXISTS kv (section TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (section, key)) WITHOUT ROWID")
+        if not _conn.execute("SELECT 1 FROM kv LIMIT 1").fetchone() and os.path.exists(LEGACY_FILE):
+            # 首次启动：从旧的 config.json 迁移
+            try:
+                with open(LEGACY_FILE, "r", encoding='utf-8') as f: legacy = json.load(f)
+                _apply({k: v for k, v in _flatten(legacy).items()})
+            except (OSError, ValueError): pass
+    return _conn
+
+def _apply(changes):
+    """一个事务写入 {(section, key): JSON文本 或 None(删除)}"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (section, key), text in changes.items():
+            if text is None: conn.execute("DELETE FROM kv WHERE section=? AND key=?", (section, key))
+            else: conn.execute("INSERT OR REPLACE INTO kv VALUES (?,?,?)", (section, key, text))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK"); raise
+
+def _refresh():
+    """其他连接 (别的进程) 提交过才重读整表；本进程的写入直接更新缓存"""
+    global _version, _rows
+    conn = _connect()
+    v = conn.execute("PRAGMA data_version").fetchone()[0]
+    if v != _version:
+        rows = {(s, k): t for s, k, t in conn.execute("SELECT section, key, value FROM kv")}
+        for sk, text in _pending.items():
+            if text is None: rows.pop(sk, None)
+            else: rows[sk] = text
+        _rows, _version = rows, v
+        _values.clear()
+
+def load():
+    """返回配置 ConfigDict；库为空 (全新安装) 时返回空 dict"""
+    with _lock:
+        _refresh()
+        return _unflatten(_rows) if _rows else ConfigDict()
+
+def _diff(rows, base):
+    changes = {sk: t for sk, t in rows.items() if base.get(sk) != t}
+    changes.update({sk: None for sk in base if sk not in rows})
+    return changes
+
+def flush():
+    """立即落盘所有防抖中的改动"""
+    global _timer
+    with _lock:
+        if _timer: _timer.cancel(); _timer = None
+        if not _pending: return
+        changes = dict(_pending); _pending.clear()
+        _apply(changes)
+
+def save(data, delay=0.0):
+    """
+    保存配置，只写相对加载时快照改动过的条目。
+    delay > 0 时合并写入：delay 秒内的多次保存只落盘一次 (缓存立即生效)。
+    """
+    global _timer
+    rows = _flatten(data)
+    base = getattr(data, "_base", None)
+    with _lock:
+        _refresh()
+        changes = _diff(rows, base if base is not None else _rows)
+        if isinstance(data, ConfigDict): data._base = rows
+        if not changes: return
+        for sk, text in changes.items():
+            _values.pop(sk, None)
+            if text is None: _rows.pop(sk, None)
+            else: _rows[sk] = text
+        if delay <= 0:
+            for sk in changes: _pending.pop(sk, None)
+            _apply(changes)
+            return
+        _pending.update(changes)
+        if _timer: _timer.cancel()
+        _timer = threading.Timer(delay, flush)
+        _timer.daemon = True
+        _timer.start()
+
+atexit.register(flush)
@@ -1,3 +1,5 @@
+import atexit
+import threading
 import baostock as bs
 import pandas as pd
 import requests
@@ -5,70 +7,189 @@ import datetime
 import streamlit as st
 import numpy as np
 from utils import convert_code 
+import history_store
+import metrics_engine
+from indicator_state import IndicatorState
+import quote_client
+import sina_parser
+from index_align import IndexAligner
+from quote_poller import QuotePoller
+from bar_recorder import BarRecorder
+from resilience import Endpoint, StaleValue
+import market_clock
+import telemetry
 
 # ================= 1. Baostock 基础 =================
+def _from_baostock(raw_code):
+    """sh.600519 -> 600519.SS"""
+    if raw_code.startswith('sh.'): return raw_code[3:] + '.SS'
+    if raw_code.startswith('sz.'): return raw_code[3:] + '.SZ'
+    return raw_code
+
+# baostock 的会话是模块级全局变量，不能并发/对冲，只加熔断：连续失败后一段时间内直接失败，不再让页面卡在登录/查询上
+BS_LOGIN = Endpoint("baostock_login", hedge=False, failures=1, cooldown=60)
+BS_QUERY = Endpoint("baostock_basic", hedge=False, failures=2, cooldown=60)
+# 同一进程里 (会话线程、轮询线程、后台刷新线程) 的 baostock 调用全部串行
+_BS_LOCK = threading.RLock()
+
+def _login():
+    with _BS_LOCK:
+        bs.logout()
+        lg = bs.login()
+    if lg.error_code != '0': raise RuntimeError(lg.error_msg)
+    return lg
+
+def _bs_rows(query, *args, **kwargs):
+    """
+    在锁内执行一次 baostock 查询并读完全部行 (翻页也走网络)。
+    返回错误码时 (多半是会话过期) 重新登录再试一次，仍失败抛 RuntimeError。
+    """
+    with _BS_LOCK:
+        rs = query(*args, **kwargs)
+        if rs.error_code != '0':
+            telemetry.count("baostock_relogin")
+            try: _login()
+            except Exception: pass
+            rs = query(*args, **kwargs)
+            if rs.error_code != '0': raise RuntimeError(rs.error_msg)
+        data = []
+        while (rs.error_code == '0') & rs.next(): data.append(rs.get_row_data())
+    return data
+
 @st.cache_resource
+def _baostock_state():
+    """进程级登录状态 (所有会话共用)"""
+    return {}
+
 def init_baostock():
-    bs.logout()
-    lg = bs.login()
-    return lg
+    """登录 baostock，成功一次后复用；失败不缓存，熔断期内直接返回 None，之后的 rerun 再试"""
+    state = _baostock_state()
+    if "lg" not in state:
+        try: state["lg"] = BS_LOGIN.call(_login)
+        except Exception: return None
+    return state["lg"]
 
-@st.cache_data(ttl=3600*4)
-def get_stock_basic_cached():
-    try:
-        if pd.to_datetime(datetime.datetime.now()).minute % 15 == 0: bs.login()
-    except: pass
-    
+# 港股补充
+HK_STOCKS = [
+    ("恒生科技指数", "03032.HK"), ("腾讯控股", "00700.HK"), ("阿里巴巴", "09988.HK"),
+    ("美团-W", "03690.HK"), ("小米集团-W", "01810.HK"), ("快手-W", "01024.HK"),
+    ("京东集团-SW", "09618.HK"), ("百度集团-SW", "09888.HK"), ("网易-S", "09999.HK"),
+    ("中芯国际", "00981.HK"), ("理想汽车-W", "02015.HK"), ("小鹏汽车-W", "09868.HK"),
+    ("蔚来-SW", "09866.HK"), ("哔哩哔哩-W", "09626.HK"), ("商汤-W", "00020.HK")
+]
+
+def _query_stock_basic():
+    with telemetry.timer("upstream_seconds", endpoint="baostock_basic"):
+        return _bs_rows(bs.query_stock_basic)
+
+def _build_stock_basic(data):
     stock_map = {}
     search_list = []
-
     # 1. A股
-    try:
-        rs = bs.query_stock_basic()
-        data = []
-        while (rs.error_code == '0') & rs.next(): data.append(rs.get_row_data())
-        for r in data:
-            raw_code = r[0] 
-            name = r[1]
-            if not raw_code: continue
-            if raw_code.startswith('sh.'): clean_code = raw_code.replace('sh.', '') + '.SS'
-            elif raw_code.startswith('sz.'): clean_code = raw_code.replace('sz.', '') + '.SZ'
-            else: clean_code = raw_code
-            stock_map[clean_code] = name
-            search_list.append(f"{name} | {clean_code}")
-    except: pass
-
-    # 2. 港股补充
-    hk_stocks = [
-        ("恒生科技指数", "03032.HK"), ("腾讯控股", "00700.HK"), ("阿里巴巴", "09988.HK"),
-        ("美团-W", "03690.HK"), ("小米集团-W", "01810.HK"), ("快手-W", "01024.HK"),
-        ("京东集团-SW", "09618.HK"), ("百度集团-SW", "09888.HK"), ("网易-S", "09999.HK"),
-        ("中芯国际", "00981.HK"), ("理想汽车-W", "02015.HK"), ("小鹏汽车-W", "09868.HK"),
-        ("蔚来-SW", "09866.HK"), ("哔哩哔哩-W", "09626.HK"), ("商汤-W", "00020.HK")
-    ]
-    for name, code in hk_stocks:
+    for r in data:
+        raw_code = r[0] 
+        name = r[1]
+        if not raw_code: continue
+        clean_code = _from_baostock(raw_code)
+        stock_map[clean_code] = name
+        search_list.append(f"{name} | {clean_code}")
+    # 2. 港股
+    for name, code in HK_STOCKS:
         stock_map[code] = name
         search_list.insert(0, f"{name} | {code}")
-
     return stock_map, search_list
 
-def get_history_data(symbol, days=730):
-    if "HK" in symbol: return pd.DataFrame() 
-    try:
-        bs_code = convert_code(symbol, "baostock")
-        end = datetime.datetime.now().strftime("%Y-%m-%d")
-        start = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
-        rs = bs.query_history_k_data_plus(bs_code, "date,open,high,low,close,volume", 
-            start_date=start, end_date=end, frequency="d", adjustflag="3")
-        data = []
-        while (rs.error_code == '0') & rs.next(): data.append(rs.get_row_data())
-        if not data: return pd.DataFrame()
+def _load_stock_basic():
+    telemetry.cache_miss("get_stock_basic_cached")
+    return _build_stock_basic(BS_QUERY.call(_query_stock_basic))
+
+_stock_basic = StaleValue(_load_stock_basic, max_age=3600*4, name="stock_basic")
+
+@telemetry.cache_probe("get_stock_basic_cached")
+def get_stock_basic_cached():
+    """
+    (stock_map, search_list)。4 小时后过期：先返回旧表、后台刷新；上游失败时一直用上次成功的结果，
+    从未成功过时只有港股 (不缓存，下次调用再试)。
+    """
+    try: return _stock_basic.get()
+    except Exception: return _build_stock_basic([])
+
+def _load_trade_dates(start, end):
+    """A股交易日列表，供 market_clock 按年缓存"""
+    with telemetry.timer("upstream_seconds", endpoint="baostock_calendar"):
+        data = _bs_rows(bs.query_trade_dates, start_date=start, end_date=end)
+    return [r[0] for r in data if r[1] == '1']
+
+market_clock.configure(_load_trade_dates)
+
+@st.cache_resource(max_entries=2)
+def _symbol_index(loaded_at):
+    # pypinyin 的词典导入要几百毫秒，第一次搜索/批量导入时才加载
+    from symbol_index import SymbolIndex
+    return SymbolIndex(get_stock_basic_cached()[0])
+
+def get_symbol_index():
+    """代码检索索引 (代码/裸代码/名称/拼音首字母)，股票列表刷新 (或首次加载成功) 后重建"""
+    get_stock_basic_cached()
+    return _symbol_index(_stock_basic.loaded_at)
+
+@telemetry.cache_probe("get_industry_map")
+@st.cache_data(max_entries=2)
+def get_industry_map(day):
+    """全市场行业分类 {代码: 行业}；day 为日期串，换日自动重新拉取"""
+    telemetry.cache_miss("get_industry_map")
+    with telemetry.timer("upstream_seconds", endpoint="baostock_industry"):
+        try: data = _bs_rows(bs.query_stock_industry)
+        except RuntimeError:
+            telemetry.count("upstream_errors", endpoint="baostock_industry")
+            raise
+    return {_from_baostock(r[1]): r[3] for r in data if r[1] and r[3]}
+
+@telemetry.cache_probe("get_a_share_universe")
+@st.cache_data(max_entries=2)
+def get_a_share_universe(day):
+    """全部在市 A股 (baostock type=1 股票、status=1 上市) 的代码；day 为日期串，换日重新拉取"""
+    telemetry.cache_miss("get_a_share_universe")
+    with telemetry.timer("upstream_seconds", endpoint="baostock_basic"):
+        data = _bs_rows(bs.query_stock_basic)
+    return [_from_baostock(r[0]) for r in data if r[0] and r[4] == '1' and r[5] == '1']
+
+@st.cache_resource(max_entries=2)
+def get_screener(day):
+    """全市场选股器 (日线面板常驻内存)，所有会话共用"""
+    from screener import Screener
+    return Screener(get_a_share_universe(day), get_belonging_index, get_index_aligner())
+
+@st.cache_resource(max_entries=2)
+def get_sector_engine(day):
+    """按天构建的行业分组 (代码 -> 行业序号)，所有会话共用"""
+    from sector_engine import SectorEngine
+    return SectorEngine(get_industry_map(day))
+
+def _fetch_k_data(symbol, start, end):
+    """从 baostock 拉取 [start, end] 区间日K"""
+    bs_code = convert_code(symbol, "baostock")
+    with telemetry.timer("upstream_seconds", endpoint="baostock_k"):
+        try: data = _bs_rows(bs.query_history_k_data_plus, bs_code, "date,open,high,low,close,volume",
+                             start_date=start, end_date=end, frequency="d", adjustflag="3")
+        except RuntimeError:
+            telemetry.count("upstream_errors", endpoint="baostock_k")
+            raise
+    # baostock 不暴露原始报文，按字段文本长度估算传输量
+    telemetry.count("upstream_bytes", sum(len(x) + 1 for r in data for x in r), endpoint="baostock_k")
+    with telemetry.timer("parse_seconds", fmt="baostock_k"):
         df = pd.DataFrame(data, columns=['date','open','high','low','close','volume'])
         df[['open','high','low','close','volume']] = df[['open','high','low','close','volume']].astype(float)
-        # 计算全周期均线
-        for ma in [10, 20, 30, 60]: df[f'MA{ma}'] = df['close'].rolling(ma).mean()
-        return df
-    except: return pd.DataFrame()
+    return df
+
+@telemetry.timed()
+def get_history_data(symbol, days=730, strict=False):
+    """日K + 全周期均线，走本地仓库增量同步，只拉最后一根已存K线之后的数据；strict 时同步失败抛出异常"""
+    if "HK" in symbol: return pd.DataFrame() 
+    try: return history_store.sync_history(symbol, lambda start, end: _fetch_k_data(symbol, start, end), days=days, strict=strict)
+    except Exception:
+        if strict: raise
+        return pd.DataFrame()
 
 # ================= 2. 深度计算 (增加量比) =================
 
@@ -83,163 +204,189 @@ def get_belonging_index(stock_code):
         return "03032.HK", "恒生科技"
     return "000001.SS", "上证指数"
 
-@st.cache_data(ttl=3600)
-def get_index_history(index_code, days=730):
-    return get_history_data(index_code, days=days)
+@st.cache_resource
+def get_index_aligner():
+    """进程级基准指数对齐层：每个指数每个数据日只加载一次 (直接走本地仓库同步)，比值均值按代码缓存"""
+    return IndexAligner(lambda code: get_history_data(code, days=730))
 
+@telemetry.timed()
 def calculate_advanced_metrics(stock_code, current_price, current_vol):
     """
     计算核心指标：MA偏离度 + 量比 + 大盘折溢价
+    (单只版本，和批量扫描共用 metrics_engine 的同一套算法)
     """
     try:
-        # 1. 均线偏离
         df_stock = get_history_data(stock_code, days=730)
-        idx_code, idx_name = get_belonging_index(stock_code)
-        
-        # 港股或无数据时的默认值
-        if df_stock.empty: 
-            return {
-                "MA10偏": 0, "MA20偏": 0, "MA30偏": 0, "MA60偏": 0, "量比": 0,
-                "大盘折溢价": 0, "所属指数": idx_name, "指数代码": idx_code, "History": pd.DataFrame()
-            }
-
-        last = df_stock.iloc[-1]
-        ma_devs = {}
-        for ma in [10, 20, 30, 60]:
-            if last[f'MA{ma}'] > 0:
-                ma_devs[f'MA{ma}'] = (current_price - last[f'MA{ma}']) / last[f'MA{ma}'] * 100
-            else: ma_devs[f'MA{ma}'] = 0
-
-        # 2. 量比计算 (实时成交量 / (过去5日均量 / 240 * 当前交易分钟数))
-        vol_ratio = 0.0
-        if current_vol > 0:
-            avg_vol_5 = df_stock['volume'].tail(5).mean() # 5日均量
-            if avg_vol_5 > 0:
-                # 计算当前交易了多少分钟
-                now = datetime.datetime.now().time()
-                minutes_elapsed = 0
-                if now >= datetime.time(9, 30) and now <= datetime.time(11, 30):
-                    minutes_elapsed = (datetime.datetime.combine(datetime.date.today(), now) - 
-                                     datetime.datetime.combine(datetime.date.today(), datetime.time(9, 30))).seconds / 60
-                elif now >= datetime.time(13, 0) and now <= datetime.time(15, 0):
-                    minutes_elapsed = 120 + (datetime.datetime.combine(datetime.date.today(), now) - 
-                                           datetime.datetime.combine(datetime.date.today(), datetime.time(13, 0))).seconds / 60
-                elif now > datetime.time(15, 0):
-                    minutes_elapsed = 240
-                
-                minutes_elapsed = max(1, minutes_elapsed) # 避免除0
-                # 理论当前时刻应有的成交量 = 全天均量 * (已过时间/240)
-                theoretical_vol_now = avg_vol_5 * (minutes_elapsed / 240)
-                vol_ratio = current_vol / theoretical_vol_now
-
-        # 3. 大盘折溢价
-        idx_dev = 0.0
-        theoretical = 0.0
-        df_index = get_index_history(idx_code, days=730)
-        if not df_index.empty:
-            df_m = pd.merge(df_stock[['date','close']], df_index[['date','close']], on='date', suffixes=('_s','_i'))
-            df_1y = df_m.tail(250).copy()
-            if not df_1y.empty:
-                avg_ratio = (df_1y['close_s'] / df_1y['close_i']).mean()
-                curr_idx = df_index.iloc[-1]['close']
-                theoretical = curr_idx * avg_ratio
-                idx_dev = (current_price - theoretical) / theoretical * 100
-
-        return {
-            "MA10偏": ma_devs.get('MA10', 0),
-            "MA20偏": ma_devs.get('MA20', 0),
-            "MA30偏": ma_devs.get('MA30', 0),
-            "MA60偏": ma_devs.get('MA60', 0),
-            "量比": vol_ratio,
-            "大盘折溢价": idx_dev,
-            "所属指数": idx_name,
-            "指数代码": idx_code,
-            "History": df_stock
-        }
+        res = metrics_engine.compute_metrics([stock_code], df_stock.assign(symbol=stock_code), [current_price], [current_vol],
+                                             get_belonging_index, get_index_aligner(),
+                                             expected_vols=get_bar_recorder().expected_volume([stock_code]))
+        metrics = res.iloc[0].to_dict()
+        metrics["History"] = df_stock
+        return metrics
     except: return None
 
+@telemetry.timed()
+def calculate_batch_metrics(codes, prices, vols, days=730, benchmarks=None):
+    """
+    批量版 calculate_advanced_metrics：直接读本地仓库 (需已同步)，一次算完全部代码。
+    返回以代码为索引的 DataFrame，列同单只版本 (不含 History)；
+    benchmarks 如 index_align.EXTRA_BENCHMARKS，每个额外基准多一列折溢价。
+    """
+    start = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+    bars = history_store.load_many(codes, start)
+    return metrics_engine.compute_metrics(codes, bars, prices, vols, get_belonging_index, get_index_aligner(), benchmarks=benchmarks,
+                                          expected_vols=get_bar_recorder().expected_volume(codes))
+
+@telemetry.timed()
+def update_indicator_states(codes, states=None, days=730):
+    """
+    从本地仓库构建/推进增量指标状态 {代码: IndicatorState}。
+    已有状态只推入 last_date 之后的新K线 (每根 O(1))，新代码才整段灌入。
+    """
+    states = dict(states or {})
+    codes = list(codes)
+    if not codes: return states
+    fresh = [c for c in codes if c not in states]
+    if fresh: start = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+    else: start = min(states[c].last_date or "" for c in codes)
+    bars = history_store.load_many(codes, start)
+    idx_codes = sorted({get_belonging_index(c)[0] for c in codes})
+    idx_bars = history_store.load_many(idx_codes, start, fields=('close',))
+    idx_close = {s: dict(zip(g['date'], g['close'])) for s, g in idx_bars.groupby('symbol')}
+
+    for sym, g in bars.groupby('symbol', sort=False):
+        ic = idx_close.get(get_belonging_index(sym)[0], {})
+        state = states.get(sym)
+        if state is None:
+            states[sym] = IndicatorState.from_history(sym, g['date'], g['close'], g['volume'], [ic.get(d) for d in g['date']])
+            continue
+        new = g[g['date'] > (state.last_date or "")]
+        for d, c, v in zip(new['date'], new['close'], new['volume']): state.push_bar(d, c, v, ic.get(d))
+    return states
+
 # ================= 3. 实时行情 (返回成交量) =================
 
-def parse_sina_response(code, content):
-    """解析新浪行情，返回：现价, 昨收, 涨跌%, 成交量(股)"""
-    if '="' not in content: return 0.0, 0.0, 0.0, 0.0
-    
-    # 港股 (hk00700="EngName,Name,Open,PrevClose,High,Low,Last,Diff,Pct,Bid,Ask,Turnover,Vol...")
-    if code.startswith("hk"):
-        try:
-            val_str = content.split('="')[1].strip('";\n')
-            p = val_str.split(',')
-            if len(p) < 13: return 0.0, 0.0, 0.0, 0.0
-            
-            curr = float(p[6])
-            last = float(p[3])
-            chg_pct = float(p[8])
-            vol = float(p[12]) # 港股成交量通常在12
-            return curr, last, chg_pct, vol
-        except: return 0.0, 0.0, 0.0, 0.0
-        
-    # A股 (sh600519="Name,Open,Prev,Price,High,Low,Bid,Ask,Vol,Amt...")
-    else:
-        try:
-            val_str = content.split('="')[1].strip('";\n')
-            p = val_str.split(',')
-            if len(p) < 9: return 0.0, 0.0, 0.0, 0.0
-            
-            curr = float(p[3])
-            last = float(p[2])
-            chg_pct = (curr - last) / last * 100 if last > 0 else 0
-            vol = float(p[8]) # A股成交量在8 (股数)
-            return curr, last, chg_pct, vol
-        except: return 0.0, 0.0, 0.0, 0.0
+# 代码 <-> 新浪代码 双向缓存，只在首次见到某代码时调用 convert_code
+_sina_codes = {}
+_origin_codes = {}
+
+def _to_sina(code):
+    sc = _sina_codes.get(code)
+    if sc is None:
+        sc = _sina_codes[code] = convert_code(code, "sina")
+        _origin_codes[sc] = code
+    return sc
+
+@telemetry.timed()
+def get_quote_frame(code_list):
+    """
+    批量行情列式结果 (sina_parser.COLUMNS，代码已换回 600519.SS 形式)，
+    含最高/最低/成交额/五档盘口；走共享连接池，自动分片并发。
+    """
+    if not code_list: return sina_parser.parse_batch(b"")
+    raw = quote_client.get_client().fetch_raw([_to_sina(c) for c in code_list])
+    with telemetry.timer("parse_seconds", fmt="sina_hq"):
+        df = sina_parser.parse_batch(raw)
+    df["代码"] = [_origin_codes.get(c, c) for c in df["代码"]]
+    return df
+
+# 没有有效行情时的占位：NaN 不会被当成价格参与比较或显示成 0.00
+NO_QUOTE = (np.nan, np.nan, np.nan, np.nan)
+
+@telemetry.timed()
+def get_realtime_map(code_list):
+    """
+    批量行情，返回 {代码: (现价, 昨收, 涨跌%, 成交量)}。
+    新浪有这只代码但现价无效 (0：停牌、开盘前) 时值为 NO_QUOTE；新浪返回空行 (无效代码) 的不在结果里。
+    """
+    try: df = get_quote_frame(code_list)
+    except Exception: return {}
+    rows = zip(df["代码"], zip(df["现价"], df["昨收"], df["涨跌%"], df["成交量"]))
+    return {c: q if q[0] > 0 else NO_QUOTE for c, q in rows}
+
+@telemetry.timed()
+@st.cache_data(ttl=1, max_entries=4)
+def get_sector_board(weighting="等权"):
+    """
+    全市场行业板块快照：(行业汇总, 成分股明细)。
+    全部成分股一次批量拉行情 (连接池自动分片并发)；1 秒内的多个会话共用同一份结果。
+    """
+    engine = get_sector_engine(datetime.date.today().isoformat())
+    return engine.compute(get_quote_frame(engine.codes), weighting)
+
+def refresh_screener(screener):
+    """全市场行情批量拉一次，与缓存的日线面板一起算出全部指标 (Screener.refresh 的结果)"""
+    return screener.refresh(get_quote_frame(screener.codes), expected_vols=get_bar_recorder().expected_volume(screener.codes))
+
+@telemetry.timed()
+@st.cache_data(ttl=1, max_entries=2)
+def screen_market(day):
+    """全市场选股快照：1 秒内的多个会话共用同一份结果，上游请求量与打开的页面数无关"""
+    return refresh_screener(get_screener(day))
 
 def get_realtime_sina(symbol):
-    try:
-        sina_code = convert_code(symbol, "sina")
-        r = requests.get(f"http://hq.sinajs.cn/list={sina_code}", headers={'Referer': 'https://sina.com.cn'}, timeout=2)
-        try: content = r.content.decode('gbk')
-        except: content = r.text
-        return parse_sina_response(sina_code, content)
-    except: return 0.0, 0.0, 0.0, 0.0
+    return get_realtime_map([symbol]).get(symbol, NO_QUOTE)
 
 def get_batch_realtime_sina(code_list):
-    if not code_list: return []
-    try:
-        s_codes = [convert_code(c, "sina") for c in code_list]
-        query = ",".join(s_codes)
-        r = requests.get(f"http://hq.sinajs.cn/list={query}", headers={'Referer': 'https://sina.com.cn'}, timeout=3)
-        try: content = r.content.decode('gbk')
-        except: content = r.text
-        
-        res = []
-        code_map = {convert_code(c, "sina"): c for c in code_list}
-        
-        for line in content.split('\n'):
-            if '="' not in line: continue
-            curr_scode = line.split('hq_str_')[-1].split('="')[0]
-            
-            p_price, p_last, p_chg, p_vol = parse_sina_response(curr_scode, line)
-            
-            origin = code_map.get(curr_scode, curr_scode)
-            
-            res.append({
-                "代码": origin, 
-                "现价": p_price, 
-                "涨跌%": p_chg, 
-                "成交量": p_vol
-            })
-        return res
-    except: return []
-
-def get_web_news():
-    try:
-        url = "https://feed.mix.sina.com.cn/api/roll/get?pageid=153&lid=2509&k=&num=10&page=1"
-        r = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=3)
-        data = r.json()
-        news_list = []
-        for i in data["result"]["data"]:
-            title = i.get('title', '')
-            time_str = i.get('ctime', '')[11:16]
-            if "融资" in title or "主力" in title or "龙虎榜" in title: continue 
-            news_list.append(f"【{time_str}】{title}")
-        return news_list
-    except: return ["获取失败"]
\ No newline at end of file
+    res = []
+    for origin, (p_price, p_last, p_chg, p_vol) in get_realtime_map(code_list).items():
+        res.append({
+            "代码": origin, 
+            "现价": p_price, 
+            "涨跌%": p_chg, 
+            "成交量": p_vol
+        })
+    return res
+
+@st.cache_resource
+def get_bar_recorder():
+    """进程级盘中分钟线记录器 (内存映射文件，重启后保留；进程退出时落盘)"""
+    recorder = BarRecorder()
+    atexit.register(recorder.flush)
+    return recorder
+
+@st.cache_resource
+def get_quote_poller():
+    """进程级行情快照轮询器，所有会话共享一个后台线程；每批快照顺便记入分钟线，时段切换时落盘"""
+    recorder = get_bar_recorder()
+    # 轮询线程第一次判断时段前，先在当前线程把今年的交易日历拉好
+    market_clock.get_clock().calendar.is_trading_day(datetime.date.today())
+    return QuotePoller(get_realtime_map, on_quotes=recorder.record, clock=market_clock.get_clock(), on_phase_change=recorder.flush)
+
+@st.cache_resource(max_entries=4)
+def get_llm_client(api_key, base_url):
+    """按 (key, 地址) 复用客户端和它的连接池，提问时不用再握手；openai 包在首次提问时才导入"""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+@st.cache_resource
+def get_completion_cache():
+    """进程级回答缓存，所有会话共用"""
+    from advisor import CompletionCache
+    return CompletionCache()
+
+NEWS_URL = "https://feed.mix.sina.com.cn/api/roll/get?pageid=153&lid=2509&k=&num={num}&page={page}"
+NEWS_PAGE_SIZE = 50
+
+def _news_ts(ctime):
+    """新闻流的 ctime 可能是时间戳也可能是 'YYYY-MM-DD HH:MM:SS'"""
+    ctime = str(ctime or "")
+    if ctime.isdigit(): return int(ctime)
+    try: return int(datetime.datetime.strptime(ctime[:19], "%Y-%m-%d %H:%M:%S").timestamp())
+    except ValueError: return int(datetime.datetime.now().timestamp())
+
+@telemetry.timed()
+def fetch_news_page(page, num=NEWS_PAGE_SIZE):
+    """新浪滚动新闻第 page 页 (新的在前)，返回 news_store.add_items 的条目格式"""
+    with telemetry.timer("upstream_seconds", endpoint="sina_news"):
+        r = requests.get(NEWS_URL.format(num=num, page=page), headers={'User-Agent': 'Mozilla/5.0'}, timeout=3)
+    telemetry.count("upstream_bytes", len(r.content), endpoint="sina_news")
+    return [{"id": i.get("docid") or i.get("url", ""), "ts": _news_ts(i.get("ctime")), "title": i.get("title", "").strip(),
+             "intro": i.get("intro", ""), "url": i.get("url", ""), "source": i.get("media_name", "")}
+            for i in r.json()["result"]["data"]]
+
+@st.cache_resource
+def get_news_ingester():
+    """进程级新闻抓取线程，所有会话共用一个本地新闻库"""
+    from news_store import NewsIngester
+    return NewsIngester(fetch_news_page)
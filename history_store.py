@@ -0,0 +1,138 @@
+import sqlite3
+import datetime
+import threading
+import pandas as pd
+import market_clock
+
+# ================= 本地日线仓库 (SQLite) =================
+# 按 symbol 存储日K + 均线，每次只向 baostock 请求最后一根已存K线之后的数据。
+# 使用不复权数据 (adjustflag=3)，历史K线不会因除权而改变，增量追加是安全的。
+
+DB_FILE = "market_data.db"
+MA_LIST = [10, 20, 30, 60]
+BAR_COLS = ['date', 'open', 'high', 'low', 'close', 'volume']
+MA_COLS = [f'MA{ma}' for ma in MA_LIST]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL, date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    ma10 REAL, ma20 REAL, ma30 REAL, ma60 REAL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_meta (
+    symbol TEXT PRIMARY KEY, start_date TEXT, synced_at TEXT
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()     # 本进程已建过表的库文件
+
+def _init_db():
+    """建表 + WAL (WAL 是库文件的属性)；每个进程每个库文件只做一次"""
+    with _init_lock:
+        if DB_FILE in _initialized: return
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        _initialized.add(DB_FILE)
+
+def _connect():
+    if DB_FILE not in _initialized: _init_db()
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute("PRAGMA synchronous=NORMAL")   # 连接级设置，不落盘
+    return conn
+
+def ready_cutoff(now):
+    """最近一根日K应当已入库的时间点 (按交易日历；之后同步过就不必再问 baostock)"""
+    return market_clock.get_clock().ready_cutoff(now)
+
+def load_bars(symbol, start_date=None, conn=None):
+    """读取本地K线，列与 get_history_data 返回一致"""
+    own = conn is None
+    conn = conn or _connect()
+    try:
+        sql = "SELECT date, open, high, low, close, volume, ma10, ma20, ma30, ma60 FROM bars WHERE symbol=?"
+        args = [symbol]
+        if start_date:
+            sql += " AND date>=?"; args.append(start_date)
+        rows = conn.execute(sql + " ORDER BY date", args).fetchall()
+    finally:
+        if own: conn.close()
+    df = pd.DataFrame(rows, columns=BAR_COLS + MA_COLS)
+    if not df.empty: df[BAR_COLS[1:] + MA_COLS] = df[BAR_COLS[1:] + MA_COLS].astype(float)
+    return df
+
+def load_many(symbols, start_date=None, fields=('close', 'volume')):
+    """一次查询读取多只代码，返回长表 [symbol, date, *fields]，按 symbol, date 排序"""
+    symbols = list(symbols)
+    cols = ['symbol', 'date'] + list(fields)
+    if not symbols: return pd.DataFrame(columns=cols)
+    conn = _connect()
+    try:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS want (symbol TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM want")
+        conn.executemany("INSERT OR IGNORE INTO want VALUES (?)", [(s,) for s in symbols])
+        sql = f"SELECT b.symbol, b.date, {', '.join('b.' + f for f in fields)} FROM bars b JOIN want w ON b.symbol=w.symbol"
+        args = []
+        if start_date:
+            sql += " WHERE b.date>=?"; args.append(start_date)
+        rows = conn.execute(sql + " ORDER BY b.symbol, b.date", args).fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=cols)
+
+def _append_bars(conn, symbol, df_new):
+    """追加新K线，只为新增尾部计算均线 (向前借 max(MA)-1 根收盘价做窗口)"""
+    need = max(MA_LIST) - 1
+    prev = conn.execute("SELECT close FROM bars WHERE symbol=? ORDER BY date DESC LIMIT ?", (symbol, need)).fetchall()
+    prev_close = [r[0] for r in reversed(prev)]
+    closes = pd.Series(prev_close + df_new['close'].tolist(), dtype=float)
+    df_new = df_new.copy()
+    for ma in MA_LIST:
+        df_new[f'MA{ma}'] = closes.rolling(ma).mean().iloc[len(prev_close):].to_numpy()
+    rows = df_new[BAR_COLS + MA_COLS].astype(object).where(df_new[BAR_COLS + MA_COLS].notna(), None)
+    conn.executemany("INSERT OR REPLACE INTO bars VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                     [(symbol, *r) for r in rows.itertuples(index=False, name=None)])
+
+def sync_history(symbol, fetch_fn, days=730, strict=False):
+    """
+    增量同步并返回最近 days 天的K线。
+    fetch_fn(start_date, end_date) -> DataFrame[date,open,high,low,close,volume]
+    strict: 拉取失败时抛出异常 (批量同步要知道哪些失败了)；默认返回本地已有数据
+    """
+    now = datetime.datetime.now()
+    start = (now - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+    end = now.strftime("%Y-%m-%d")
+    conn = _connect()
+    try:
+        meta = conn.execute("SELECT start_date, synced_at FROM sync_meta WHERE symbol=?", (symbol,)).fetchone()
+        last = conn.execute("SELECT MAX(date) FROM bars WHERE symbol=?", (symbol,)).fetchone()[0]
+
+        if meta is None or meta[0] > start or last is None:
+            # 首次或请求更长的窗口：整段重拉
+            fetch_start, full = start, True
+        elif meta[1] and datetime.datetime.fromisoformat(meta[1]) >= ready_cutoff(now):
+            fetch_start, full = None, False
+        else:
+            fetch_start = (datetime.date.fromisoformat(last) + datetime.timedelta(days=1)).isoformat()
+            full = False
+
+        if fetch_start and fetch_start <= end:
+            # 拉取失败时保留本地数据，也不记同步时间，下次重试
+            try: df_new = fetch_fn(fetch_start, end)
+            except Exception:
+                if strict: raise
+                df_new = None
+            if df_new is not None:
+                with conn:
+                    if full: conn.execute("DELETE FROM bars WHERE symbol=?", (symbol,))
+                    if not df_new.empty: _append_bars(conn, symbol, df_new)
+                    conn.execute("INSERT OR REPLACE INTO sync_meta VALUES (?,?,?)",
+                                 (symbol, start if full else meta[0], now.isoformat(timespec='seconds')))
+        return load_bars(symbol, start, conn=conn)
+    finally:
+        conn.close()
@@ -0,0 +1,142 @@
+import datetime
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import history_store
+
+# ================= 基准指数对齐层 =================
+# 每个基准指数每个数据日只加载一次，按日号展开成 (基准数 × 天数) 查找表。
+# 个股与指数的日期对齐就是一次下标取值；250日比值均值按 (代码, 基准) 缓存，
+# 个股或指数出新K线前不会重算。额外基准 (沪深300/中证500/行业ETF) 只是表里多一行。
+
+RATIO_WINDOW = 250
+EXTRA_BENCHMARKS = {"000300.SS": "沪深300", "000905.SS": "中证500"}
+
+# 某一时刻的整张表；重建时换成新对象而不是原地修改，所以读快照不用持锁
+_Snapshot = namedtuple("_Snapshot", "row table day0 last_close last_day ratio_cache")
+
+def to_days(dates):
+    """'YYYY-MM-DD' 字符串 -> 整数日号 (numpy 直接解析 ISO 日期，比 pd.to_datetime 快)"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+class IndexAligner:
+    def __init__(self, loader, window=RATIO_WINDOW):
+        """
+        loader(index_code) -> DataFrame[date, close]，如 data_service.get_history_data。
+        不要套带 TTL 的缓存：数据日切换时重建拿到的必须是新数据，否则旧表会用满一整个数据日。
+        """
+        self.loader = loader
+        self.window = window
+        self._lock = threading.Lock()
+        self._generation = None
+        self._codes = []            # 表中各行对应的基准代码
+        self._row = {}              # 基准代码 -> 行号
+        self._table = np.zeros((0, 0))
+        self._day0 = 0
+        self._last_close = np.zeros(0)
+        self._last_day = np.zeros(0, dtype=np.int64)
+        self._ratio_cache = {}      # (代码, 基准) -> (个股最新日, 指数最新日, 比值均值)
+
+    def _ensure(self, index_codes):
+        """加载缺失的基准；数据日切换 (新日K入库) 时整表重建。返回锁内取的快照，之后只读快照"""
+        gen = history_store.ready_cutoff(datetime.datetime.now())
+        with self._lock:
+            if gen != self._generation:
+                self._generation, self._codes, self._row, self._ratio_cache = gen, [], {}, {}
+            missing = [c for c in dict.fromkeys(index_codes) if c not in self._row]
+            if not missing: return self._snapshot()
+        # loader 要读库甚至联网，放在锁外，不挡住只读已有基准的线程
+        loaded = {c: self._load(c) for c in missing}
+        with self._lock:
+            if gen == self._generation:
+                frames = {c: self._table_row(c) for c in self._codes}
+                # 别的线程可能已先建好同一基准，以表里的为准
+                frames.update({c: v for c, v in loaded.items() if c not in frames})
+                if len(frames) > len(self._codes): self._build(frames)
+                return self._snapshot()
+        # 加载期间数据日切换，表已被清空，按新数据日重来
+        return self._ensure(index_codes)
+
+    def _snapshot(self):
+        return _Snapshot(self._row, self._table, self._day0, self._last_close, self._last_day, self._ratio_cache)
+
+    def _load(self, code):
+        try: df = self.loader(code)
+        except Exception: df = pd.DataFrame()
+        if df.empty: return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return to_days(df['date'].to_numpy(dtype=object)), df['close'].to_numpy(dtype=float)
+
+    def _table_row(self, code):
+        r = self._table[self._row[code]]
+        ok = np.isfinite(r)
+        return np.nonzero(ok)[0] + self._day0, r[ok]
+
+    def _build(self, frames):
+        codes = list(frames)
+        all_days = [d for d, _ in frames.values() if len(d)]
+        day0 = int(min(d.min() for d in all_days)) if all_days else 0
+        width = int(max(d.max() for d in all_days)) - day0 + 1 if all_days else 1
+        table = np.full((len(codes), width), np.nan)
+        last_close = np.full(len(codes), np.nan)
+        last_day = np.full(len(codes), -1, dtype=np.int64)
+        for i, c in enumerate(codes):
+            d, v = frames[c]
+            if not len(d): continue
+            table[i, d - day0] = v
+            last_close[i], last_day[i] = v[-1], d[-1]
+        self._codes, self._row = codes, {c: i for i, c in enumerate(codes)}
+        self._table, self._day0, self._last_close, self._last_day = table, day0, last_close, last_day
+
+    @staticmethod
+    def _align(snap, index_codes, days):
+        rows = np.array([snap.row[c] for c in index_codes], dtype=np.int64)
+        off = days - snap.day0
+        inside = (days >= 0) & (off >= 0) & (off < snap.table.shape[1])
+        return np.where(inside, snap.table[rows[:, None], np.clip(off, 0, snap.table.shape[1] - 1)], np.nan)
+
+    def align(self, index_codes, days):
+        """按个股日号矩阵 days (缺位为 -1) 取对应基准收盘价，返回同形状矩阵 (无数据为 NaN)"""
+        return self._align(self._ensure(index_codes), index_codes, days)
+
+    def last_close(self, index_codes, snap=None):
+        snap = snap or self._ensure(index_codes)
+        return snap.last_close[[snap.row[c] for c in index_codes]]
+
+    def ratio_means(self, codes, index_codes, days, closes, snap=None):
+        """
+        每只股票相对其基准最近 window 个共同交易日的 个股/指数 比值均值。
+        命中缓存的行不重算；其余行一次向量化计算。
+        """
+        snap = snap or self._ensure(index_codes)
+        out = np.full(len(codes), np.nan)
+        stock_last = days.max(axis=1) if days.size else np.full(len(codes), -1)
+        idx_last = snap.last_day[[snap.row[c] for c in index_codes]] if len(codes) else np.zeros(0, dtype=np.int64)
+        stale = []
+        for i, key in enumerate(zip(codes, index_codes)):
+            hit = snap.ratio_cache.get(key)
+            if hit and hit[0] == stock_last[i] and hit[1] == idx_last[i]: out[i] = hit[2]
+            else: stale.append(i)
+        if not stale: return out
+        s = np.array(stale)
+        sub_idx = [index_codes[i] for i in stale]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = closes[s] / self._align(snap, sub_idx, days[s])
+        valid = np.isfinite(ratio)
+        # 从右往左数有效点，只取最近 window 个
+        rank = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+        sel = valid & (rank <= self.window)
+        n = sel.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(n > 0, np.where(sel, ratio, 0).sum(axis=1) / n, np.nan)
+        out[s] = means
+        for j, i in enumerate(stale): snap.ratio_cache[(codes[i], index_codes[i])] = (stock_last[i], idx_last[i], means[j])
+        return out
+
+    def premium(self, codes, index_codes, days, closes, prices):
+        """大盘折溢价 %：理论价 = 基准最新收盘 × 比值均值；无法计算时为 0"""
+        prices = np.asarray(prices, dtype=float)
+        snap = self._ensure(index_codes)
+        theoretical = self.last_close(index_codes, snap) * self.ratio_means(codes, index_codes, days, closes, snap)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(theoretical > 0, (prices - theoretical) / theoretical * 100, 0.0)
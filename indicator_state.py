@@ -0,0 +1,138 @@
+from array import array
+import numpy as np
+from market_clock import get_clock, market_of
+
+# ================= 增量指标状态 (O(1) 更新) =================
+# 每只股票一个状态对象：定长环形缓冲 + 滚动和。
+# 收盘出新K线时 push_bar 常数时间更新；盘中 live_* 把现价当作"今天这根K线"算实时均线。
+# 现价属于哪个交易日由交易日历判断：周末/节假日/盘前的行情是上一交易日的收盘，那根K线已入库时不能再滑一格。
+
+MA_LIST = (10, 20, 30, 60)
+VOL_WINDOW = 5
+RATIO_WINDOW = 250
+_CLOSE_CAP = max(MA_LIST)
+
+class _Ring:
+    """定长 float 环形缓冲，维护窗口内总和"""
+    __slots__ = ("buf", "cap", "head", "size", "total")
+
+    def __init__(self, cap):
+        self.buf = array('d', bytes(8 * cap))
+        self.cap, self.head, self.size, self.total = cap, 0, 0, 0.0
+
+    def push(self, x):
+        if self.size == self.cap: self.total -= self.buf[self.head]
+        else: self.size += 1
+        self.buf[self.head] = x
+        self.total += x
+        self.head = (self.head + 1) % self.cap
+
+    def back(self, k):
+        """倒数第 k 个值 (k=1 为最新)"""
+        return self.buf[(self.head - k) % self.cap]
+
+class IndicatorState:
+    """
+    单只股票的滚动指标：MA10/20/30/60、5日均量、250日 个股/指数 比值均值。
+    用 from_history 一次性灌入历史，之后只做 push_bar / live_* 常数时间操作。
+    """
+    __slots__ = ("symbol", "last_date", "closes", "ma_sums", "vols", "ratios")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.last_date = None
+        self.closes = _Ring(_CLOSE_CAP)
+        self.ma_sums = array('d', bytes(8 * len(MA_LIST)))
+        self.vols = _Ring(VOL_WINDOW)
+        self.ratios = _Ring(RATIO_WINDOW)
+
+    @classmethod
+    def from_history(cls, symbol, dates, closes, volumes, index_closes=None):
+        """index_closes 与 dates 对齐，缺失(当天指数无数据)传 None/NaN"""
+        st = cls(symbol)
+        index_closes = index_closes if index_closes is not None else [None] * len(dates)
+        for d, c, v, ic in zip(dates, closes, volumes, index_closes): st.push_bar(d, c, v, ic)
+        return st
+
+    def push_bar(self, date, close, volume, index_close=None):
+        """新增一根已完成的日K"""
+        n = self.closes.size
+        for i, ma in enumerate(MA_LIST):
+            # 窗口已满时先减去滑出窗口的那根
+            if n >= ma: self.ma_sums[i] -= self.closes.back(ma)
+            self.ma_sums[i] += close
+        self.closes.push(close)
+        self.vols.push(volume)
+        if index_close and index_close == index_close: self.ratios.push(close / index_close)
+        self.last_date = date
+
+    # ---------- 已完成K线口径 ----------
+    def ma(self, n):
+        i = MA_LIST.index(n)
+        return self.ma_sums[i] / n if self.closes.size >= n else 0.0
+
+    @property
+    def avg_vol5(self):
+        return self.vols.total / self.vols.size if self.vols.size else 0.0
+
+    @property
+    def avg_ratio(self):
+        return self.ratios.total / self.ratios.size if self.ratios.size else 0.0
+
+    # ---------- 盘中实时口径 ----------
+    def session_date(self):
+        """现价所属的交易日 (YYYY-MM-DD)"""
+        return get_clock().session_date(market_of(self.symbol)).isoformat()
+
+    def live_base(self, n, today=None):
+        """
+        实时均线里与现价无关的部分：live_ma = live_base + 现价 / n；历史不足返回 NaN。
+        today 是现价所属的交易日：不晚于 last_date 说明这根K线已入库，用现价替换它而不是再滑一格。
+        """
+        i = MA_LIST.index(n)
+        if today is not None and self.last_date is not None and today <= self.last_date:
+            if self.closes.size < n: return float('nan')
+            return (self.ma_sums[i] - self.closes.back(1)) / n
+        if self.closes.size < n - 1: return float('nan')
+        drop = self.closes.back(n) if self.closes.size >= n else 0.0
+        return (self.ma_sums[i] - drop) / n
+
+    def live_ma(self, n, price, today=None):
+        """把现价作为今天的收盘价参与均线"""
+        base = self.live_base(n, today)
+        return base + price / n if base == base else 0.0
+
+    def live_devs(self, price, today=None):
+        """实时均线偏离 %，键与 calculate_advanced_metrics 一致"""
+        today = today or self.session_date()
+        res = {}
+        for ma in MA_LIST:
+            m = self.live_ma(ma, price, today)
+            res[f"MA{ma}偏"] = (price - m) / m * 100 if m > 0 else 0
+        return res
+
+    def index_premium(self, price, index_price):
+        """大盘折溢价 %：index_price 传指数实时价即为盘中口径"""
+        theoretical = index_price * self.avg_ratio
+        return (price - theoretical) / theoretical * 100 if theoretical > 0 else 0
+
+def live_dev_matrix(states, codes, prices, today=None):
+    """
+    批量实时均线偏离 % (len(codes) × len(MA_LIST))，列顺序同 MA_LIST，口径与 live_devs 一致。
+    没有状态的代码整行为 NaN (调用方回退到扫描值)。today 不传时按各代码所属市场的交易日历取。
+    """
+    days = {}
+    base = np.full((len(codes), len(MA_LIST)), np.nan)
+    has = np.zeros(len(codes), dtype=bool)
+    for i, c in enumerate(codes):
+        st = states.get(c)
+        if st is None: continue
+        has[i] = True
+        day = today or days.get(market_of(c)) or days.setdefault(market_of(c), st.session_date())
+        base[i] = [st.live_base(ma, day) for ma in MA_LIST]
+    p = np.asarray(prices, dtype=float)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m = base + p / np.array(MA_LIST, dtype=float)
+        dev = np.where(np.isfinite(m) & (m > 0), (p - m) / m * 100, 0.0)
+    dev[~has] = np.nan
+    return dev
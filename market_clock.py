@@ -0,0 +1,130 @@
+import time
+import datetime
+import threading
+
+# ================= 交易日历 + 时段时钟 =================
+# 全进程共用一个时钟：今天是不是交易日、现在处于哪个交易时段、该多久拉一次行情、
+# 已交易多少分钟、最近一根日K何时入库，都从这里取，不再各处拿 datetime.combine 现算。
+# A股日历来自 baostock 的 query_trade_dates (按年缓存)；baostock 没有港股日历，港股按工作日处理。
+
+PRE_OPEN, AUCTION, CONTINUOUS, LUNCH, CLOSING, CLOSED, HOLIDAY = "盘前", "集合竞价", "连续竞价", "午休", "收盘", "已收盘", "休市"
+
+# 各时段起止 (自 0 点起的分钟数，左闭右开)，未覆盖的时间按 CLOSED 处理
+PHASES = {
+    "A": ((0, 555, PRE_OPEN), (555, 570, AUCTION), (570, 690, CONTINUOUS), (690, 780, LUNCH),
+          (780, 900, CONTINUOUS), (900, 905, CLOSING)),
+    "HK": ((0, 540, PRE_OPEN), (540, 570, AUCTION), (570, 720, CONTINUOUS), (720, 780, LUNCH),
+           (780, 960, CONTINUOUS), (960, 970, CLOSING)),
+}
+SESSIONS = {mk: tuple((s, e) for s, e, p in ph if p == CONTINUOUS) for mk, ph in PHASES.items()}
+CLOSE_GRACE = {mk: next(e - s for s, e, p in ph if p == CLOSING) for mk, ph in PHASES.items()}
+OPEN_AT = {mk: next(s for s, e, p in ph if p == AUCTION) for mk, ph in PHASES.items()}
+
+# 各时段拉行情的间隔 (秒)；None 表示不轮询，进入该时段时补拉一次后冻结快照
+POLL_INTERVALS = {CONTINUOUS: 1.0, AUCTION: 3.0, CLOSING: 2.0,
+                  LUNCH: None, PRE_OPEN: None, CLOSED: None, HOLIDAY: None}
+IDLE_WAKE = 300          # 不轮询时最长睡多久 (醒来重新判断时段)
+DAILY_READY = datetime.time(17, 30)   # baostock 日K一般在这之后才更新完
+CALENDAR_RETRY = 600     # 日历拉取失败后多久重试，期间按工作日处理
+
+def market_of(code):
+    return "HK" if code.endswith(".HK") else "A"
+
+def _minute(now):
+    return now.hour * 60 + now.minute
+
+class TradingCalendar:
+    def __init__(self, loader=None):
+        """loader(start, end) -> ['YYYY-MM-DD', ...] 该区间内的 A股交易日"""
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._years = {}      # 年 -> set(交易日) ；拉取失败为 (None, 失败时间)
+
+    def _year(self, y):
+        hit = self._years.get(y)
+        if isinstance(hit, set): return hit
+        if hit is not None and time.monotonic() - hit[1] < CALENDAR_RETRY: return None
+        if self.loader is None: return None
+        with self._lock:
+            hit = self._years.get(y)
+            if isinstance(hit, set): return hit
+            try:
+                days = {datetime.date.fromisoformat(d) for d in self.loader(f"{y}-01-01", f"{y}-12-31")}
+                if not days: raise ValueError("empty calendar")
+                self._years[y] = days
+                return days
+            except Exception:
+                self._years[y] = (None, time.monotonic())
+                return None
+
+    def is_trading_day(self, d, market="A"):
+        if d.weekday() >= 5: return False
+        if market != "A": return True
+        days = self._year(d.year)
+        return d in days if days is not None else True
+
+    def prev_trading_day(self, d, market="A", inclusive=True):
+        d = d if inclusive else d - datetime.timedelta(days=1)
+        while not self.is_trading_day(d, market): d -= datetime.timedelta(days=1)
+        return d
+
+class MarketClock:
+    def __init__(self, calendar=None):
+        self.calendar = calendar or TradingCalendar()
+
+    def phase(self, market="A", now=None):
+        now = now or datetime.datetime.now()
+        if not self.calendar.is_trading_day(now.date(), market): return HOLIDAY
+        m = _minute(now)
+        for s, e, p in PHASES[market]:
+            if s <= m < e: return p
+        return CLOSED
+
+    def is_open(self, market="A", now=None):
+        """连续竞价或收盘集合竞价中 (行情还在变)"""
+        return self.phase(market, now) in (CONTINUOUS, CLOSING)
+
+    def minutes_elapsed(self, market="A", now=None):
+        """今天连续竞价已进行的分钟数 (A股 0~240)；休市日行情是上一交易日的全天快照，按全天计"""
+        now = now or datetime.datetime.now()
+        if not self.calendar.is_trading_day(now.date(), market): return sum(e - s for s, e in SESSIONS[market])
+        m = now.hour * 60 + now.minute + now.second / 60
+        return sum(min(max(m - s, 0), e - s) for s, e in SESSIONS[market])
+
+    def poll_interval(self, markets=("A",), now=None):
+        """关注的市场里最紧的轮询间隔；全都不需要轮询时返回 None"""
+        iv = [POLL_INTERVALS[self.phase(mk, now)] for mk in markets]
+        iv = [x for x in iv if x is not None]
+        return min(iv) if iv else None
+
+    def phases(self, markets=("A",), now=None):
+        return tuple(self.phase(mk, now) for mk in markets)
+
+    def seconds_to_change(self, markets=("A",), now=None):
+        """距最近一个时段切换点的秒数 (非交易日算到次日 0 点)"""
+        now = now or datetime.datetime.now()
+        m = now.hour * 60 + now.minute + now.second / 60
+        bounds = [b for mk in markets for s, e, _ in PHASES[mk] for b in (s, e) if b > m] + [1440]
+        return (min(bounds) - m) * 60
+
+    def session_date(self, market="A", now=None):
+        """当前行情所属的交易日：交易日集合竞价开始后为当天，否则 (盘前/周末/节假日) 为上一个交易日"""
+        now = now or datetime.datetime.now()
+        d = now.date()
+        if self.calendar.is_trading_day(d, market) and _minute(now) >= OPEN_AT[market]: return d
+        return self.calendar.prev_trading_day(d, market, inclusive=False)
+
+    def ready_cutoff(self, now=None):
+        """最近一根日K应当已入库的时间点：最近一个 (收盘后过了 17:30 的) 交易日的 17:30"""
+        now = now or datetime.datetime.now()
+        d = now.date() if now.time() >= DAILY_READY else now.date() - datetime.timedelta(days=1)
+        return datetime.datetime.combine(self.calendar.prev_trading_day(d), DAILY_READY)
+
+_clock = MarketClock()
+
+def configure(loader):
+    """设置 A股交易日历的数据源 (data_service 在导入时调用)"""
+    _clock.calendar.loader = loader
+
+def get_clock():
+    return _clock
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from index_align import to_days
+from market_clock import get_clock
+
+# ================= 批量指标引擎 =================
+# 输入 (代码 × 日期) 面板，一次 NumPy 计算全部代码的 MA偏离 / 量比 / 大盘折溢价。
+# 面板按各自K线右对齐 (最后一列 = 各自最新一根K线)，与逐只计算时的 iloc[-1] 语义一致。
+# 与基准指数的日期对齐交给 index_align.IndexAligner。
+
+MA_LIST = [10, 20, 30, 60]
+METRIC_COLS = ["MA10偏", "MA20偏", "MA30偏", "MA60偏", "量比", "大盘折溢价", "所属指数", "指数代码"]
+
+def build_panel(bars, codes, fields=('close', 'volume')):
+    """
+    长表 [symbol, date, *fields] -> 右对齐面板。
+    返回 (days, *各字段)，形状均为 (len(codes), L)；days 为 datetime64[D] 的整数天，缺位为 -1 (字段缺位为 NaN)。
+    默认即 (days, closes, volumes)。
+    """
+    S = len(codes)
+    if bars.empty: return (np.full((S, 1), -1, dtype=np.int64),) + tuple(np.full((S, 1), np.nan) for _ in fields)
+    sym = pd.Categorical(bars['symbol'], categories=codes).codes
+    keep = sym >= 0
+    sym = sym[keep]
+    day = to_days(bars['date'].to_numpy(dtype=object)[keep])
+    order = np.lexsort((day, sym))
+    sym, day = sym[order], day[order]
+
+    counts = np.bincount(sym, minlength=S)
+    L = max(int(counts.max()), 1)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    col = L - counts[sym] + (np.arange(len(sym)) - starts[sym])
+
+    days = np.full((S, L), -1, dtype=np.int64); days[sym, col] = day
+    out = [days]
+    for f in fields:
+        v = np.full((S, L), np.nan); v[sym, col] = bars[f].to_numpy(dtype=float)[keep][order]
+        out.append(v)
+    return tuple(out)
+
+def _tail_means(panel, windows):
+    """一次累加和，取每行最后 n 个值的均值 (n 取 windows 中各值)，不足 n 个为 NaN"""
+    cs = np.cumsum(np.nan_to_num(panel), axis=1)
+    cnt = np.cumsum(~np.isnan(panel), axis=1)
+    res = {}
+    for n in windows:
+        if panel.shape[1] > n:
+            s, c = cs[:, -1] - cs[:, -1 - n], cnt[:, -1] - cnt[:, -1 - n]
+        else:
+            s, c = cs[:, -1], cnt[:, -1]
+        res[n] = np.where(c == n, s / n, np.nan)
+    return res
+
+def compute_metrics(codes, bars, prices, vols, index_of, aligner, now=None, benchmarks=None, expected_vols=None, panel=None):
+    """
+    批量计算核心指标。
+    codes: 代码列表; bars: 个股长表 [symbol, date, close, volume]
+    prices / vols: 与 codes 对齐的实时价格、成交量; index_of(code) -> (指数代码, 指数名)
+    aligner: index_align.IndexAligner; benchmarks: 额外基准 {代码: 名称}，每个多出一列 "<名称>折溢价"
+    expected_vols: 与 codes 对齐的历史同时刻平均累计量 (bar_recorder)，有值时量比按真实分时量能计算
+    panel: 预先 build_panel(bars, codes) 的结果 (全市场选股按数据日缓存)，给出时忽略 bars
+    返回以代码为索引、列为 METRIC_COLS (+ 额外基准列) 的 DataFrame。
+    """
+    codes = list(codes)
+    prices = np.asarray(prices, dtype=float)
+    vols = np.asarray(vols, dtype=float)
+    days, closes, volumes = panel if panel is not None else build_panel(bars, codes)
+    out = pd.DataFrame(index=pd.Index(codes, name="代码"))
+
+    # 1. 均线偏离
+    ma_vals = _tail_means(closes, MA_LIST)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for ma in MA_LIST:
+            m = ma_vals[ma]
+            out[f"MA{ma}偏"] = np.where(m > 0, (prices - m) / m * 100, 0.0)
+
+    # 2. 量比 = 实时量 / 过去几天同一时刻的累计量；没有盘中记录时退回 5日均量 × 已交易分钟/240
+    minutes = max(1, get_clock().minutes_elapsed("A", now))
+    avg5 = _tail_means(volumes, [5])[5]
+    base = avg5 * minutes / 240
+    if expected_vols is not None:
+        ev = np.asarray(expected_vols, dtype=float)
+        base = np.where(np.isfinite(ev) & (ev > 0), ev, base)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vr = vols / base
+    out["量比"] = np.where((vols > 0) & (base > 0), vr, 0.0)
+
+    # 3. 大盘折溢价：近 250 个共同交易日 个股/指数 均值 × 指数最新收盘 (对齐与比值缓存见 index_align)
+    belong = [index_of(c) for c in codes]
+    out["指数代码"] = [b[0] for b in belong]
+    out["所属指数"] = [b[1] for b in belong]
+    out["大盘折溢价"] = aligner.premium(codes, out["指数代码"].tolist(), days, closes, prices) if codes else []
+    for bench, name in (benchmarks or {}).items():
+        out[f"{name}折溢价"] = aligner.premium(codes, [bench] * len(codes), days, closes, prices)
+    return out[METRIC_COLS + [f"{n}折溢价" for n in (benchmarks or {}).values()]]
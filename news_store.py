@@ -0,0 +1,155 @@
+import re
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+import pandas as pd
+import telemetry
+
+# ================= 本地新闻库 (SQLite FTS5) + 增量抓取 =================
+# 后台线程定时翻页抓取新闻流，翻到已入库的条目就停；按 id / 标题哈希去重。
+# 标题和摘要建三元组全文索引 (trigram，中文按子串检索)，情报页和 AI 上下文按关键词 + 时间窗查询，
+# 新闻不再整段写进配置。
+
+DB_FILE = "news.db"
+INGEST_INTERVAL = 120     # 后台抓取间隔 (秒)
+MAX_PAGES = 10            # 单轮最多翻几页 (首次运行即回补这么多)
+KEEP_DAYS = 90
+NOISE_WORDS = ("融资", "主力", "龙虎榜")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id TEXT NOT NULL UNIQUE, th TEXT NOT NULL UNIQUE, ts INTEGER NOT NULL,
+    title TEXT NOT NULL, intro TEXT, url TEXT, source TEXT, fetched_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS news_ts ON news(ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(title, intro, content='news', content_rowid='rowid', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS news_ai AFTER INSERT ON news BEGIN
+    INSERT INTO news_fts(rowid, title, intro) VALUES (new.rowid, new.title, new.intro);
+END;
+CREATE TRIGGER IF NOT EXISTS news_ad AFTER DELETE ON news BEGIN
+    INSERT INTO news_fts(news_fts, rowid, title, intro) VALUES ('delete', old.rowid, old.title, old.intro);
+END;
+"""
+
+def _connect():
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def title_hash(title):
+    """去掉空白和标点后的标题哈希：同一条新闻换了 id 或标点也能去重"""
+    return hashlib.sha1(re.sub(r'\W', '', title).encode("utf-8")).hexdigest()
+
+def _epoch(t):
+    if t is None: return None
+    if isinstance(t, datetime.datetime): return int(t.timestamp())
+    if isinstance(t, datetime.date): return int(datetime.datetime.combine(t, datetime.time()).timestamp())
+    return int(t)
+
+def add_items(items):
+    """
+    items: [{id, ts, title, intro, url, source}]；已存在 (id 或标题哈希相同) 的忽略。
+    返回新入库条数。
+    """
+    now = int(time.time())
+    rows = [(it.get("id") or title_hash(it["title"]), title_hash(it["title"]), int(it["ts"]), it["title"],
+             it.get("intro", ""), it.get("url", ""), it.get("source", ""), now) for it in items if it.get("title")]
+    if not rows: return 0
+    conn = _connect()
+    try:
+        with conn:
+            # rowcount 只数主表插入的行 (触发器写全文索引不计)
+            return conn.executemany("INSERT OR IGNORE INTO news (id, th, ts, title, intro, url, source, fetched_at) VALUES (?,?,?,?,?,?,?,?)", rows).rowcount
+    finally:
+        conn.close()
+
+def prune(days=KEEP_DAYS):
+    conn = _connect()
+    try:
+        with conn: conn.execute("DELETE FROM news WHERE ts < ?", (int(time.time()) - days * 86400,))
+    finally:
+        conn.close()
+
+def _where(keywords, since, until):
+    """
+    keywords 任一命中标题或摘要即可。trigram 索引要求至少 3 个字，
+    更短的词 (如两字简称) 退回 LIKE (新闻表不大，配合时间窗足够快)。
+    """
+    conds, args, where = [], [], []
+    keywords = [k.strip() for k in keywords or () if k and k.strip()]
+    long = [k for k in keywords if len(k) >= 3]
+    if long:
+        conds.append("rowid IN (SELECT rowid FROM news_fts WHERE news_fts MATCH ?)")
+        args.append(" OR ".join('"' + k.replace('"', '""') + '"' for k in long))
+    for k in keywords:
+        if len(k) < 3:
+            conds.append("(title LIKE ? OR intro LIKE ?)"); args += [f"%{k}%"] * 2
+    if conds: where.append("(" + " OR ".join(conds) + ")")
+    if since is not None: where.append("ts >= ?"); args.append(_epoch(since))
+    if until is not None: where.append("ts < ?"); args.append(_epoch(until))
+    return (" WHERE " + " AND ".join(where)) if where else "", args
+
+def search(keywords=(), since=None, until=None, limit=50, offset=0):
+    """按关键词 + 时间窗查询，新的在前；返回 DataFrame[时间, 标题, 摘要, 链接, 来源]"""
+    where, args = _where(keywords, since, until)
+    conn = _connect()
+    try:
+        rows = conn.execute(f"SELECT ts, title, intro, url, source FROM news{where} ORDER BY ts DESC, rowid DESC LIMIT ? OFFSET ?",
+                            args + [int(limit), int(offset)]).fetchall()
+    finally:
+        conn.close()
+    df = pd.DataFrame(rows, columns=["时间", "标题", "摘要", "链接", "来源"])
+    df["时间"] = pd.to_datetime([datetime.datetime.fromtimestamp(t) for t in df["时间"]])
+    return df
+
+def count(keywords=(), since=None, until=None):
+    where, args = _where(keywords, since, until)
+    conn = _connect()
+    try: return conn.execute(f"SELECT COUNT(*) FROM news{where}", args).fetchone()[0]
+    finally: conn.close()
+
+def format_lines(df):
+    """查询结果 -> ['【MM-DD HH:MM】标题', ...] (AI 上下文用)"""
+    return [f"【{t:%m-%d %H:%M}】{title}" for t, title in zip(df["时间"], df["标题"])]
+
+class NewsIngester:
+    def __init__(self, fetch_page, interval=INGEST_INTERVAL, max_pages=MAX_PAGES, start=True):
+        """fetch_page(page) -> [{id, ts, title, intro, url, source}]，page 从 1 开始，新的在前"""
+        self.fetch_page = fetch_page
+        self.interval = interval
+        self.max_pages = max_pages
+        self.last_run = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="news-ingester", daemon=True)
+        if start: self._thread.start()
+
+    def poll_once(self):
+        """翻页抓取直到碰到已入库的条目；返回新增条数"""
+        with self._lock:
+            total = 0
+            for page in range(1, self.max_pages + 1):
+                items = self.fetch_page(page)
+                if not items: break
+                items = [it for it in items if not any(w in it.get("title", "") for w in NOISE_WORDS)]
+                added = add_items(items)
+                total += added
+                if added < len(items): break
+            if total: prune()
+            telemetry.count("news_ingested", total)
+            self.last_run, self.last_error = time.time(), None
+            return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try: self.poll_once()
+            except Exception as e: self.last_error = str(e)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import telemetry
+from resilience import Endpoint
+
+# ================= 新浪行情客户端 (连接池 + 自动分片) =================
+# 全进程共用一个 keep-alive Session；代码列表按 URL 长度切片后并发请求。
+# 返回原始字节交给 sina_parser 解析。
+# 每个分片经 resilience.Endpoint 发出：超过 p95 耗时对冲一次，总时限 DEADLINE，连续失败熔断。
+# 单个请求的超时不超过总时限：被放弃的请求很快释放对冲线程，上游持续变慢时新请求不会排在它们后面耗掉自己的时限。
+
+SINA_URL = "http://hq.sinajs.cn/list="
+HEADERS = {'Referer': 'https://sina.com.cn'}
+MAX_URL_LEN = 4000   # 新浪对过长 URL 会直接 400，留足余量
+POOL_SIZE = 8
+DEADLINE = 1.5       # 单个分片 (含对冲) 的总时限 (秒)
+
+class QuoteClient:
+    def __init__(self, pool_size=POOL_SIZE, timeout=None, max_url_len=MAX_URL_LEN, deadline=DEADLINE):
+        """timeout: 单个请求的超时，默认等于 deadline"""
+        self.timeout = min(timeout or deadline, deadline)
+        self.max_url_len = max_url_len
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # 对冲时同一分片可能有两个请求在途，连接池留双份
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size * 2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sina")
+        self.endpoint = Endpoint("sina_hq", deadline=deadline, workers=pool_size * 2)
+
+    def chunks(self, sina_codes):
+        """按 URL 长度切片，保证每片 'list=a,b,c' 不超过上限"""
+        budget = self.max_url_len - len(SINA_URL)
+        cur, size = [], 0
+        for c in sina_codes:
+            if cur and size + len(c) + 1 > budget:
+                yield cur
+                cur, size = [], 0
+            cur.append(c); size += len(c) + 1
+        if cur: yield cur
+
+    def _get(self, codes):
+        return self.endpoint.call(self._request, codes)
+
+    def _request(self, codes):
+        try:
+            with telemetry.timer("upstream_seconds", endpoint="sina_hq"):
+                r = self.session.get(SINA_URL + ",".join(codes), timeout=self.timeout)
+                r.raise_for_status()
+                content = r.content
+        except Exception:
+            telemetry.count("upstream_errors", endpoint="sina_hq")
+            raise
+        telemetry.count("upstream_bytes", len(content), endpoint="sina_hq")
+        return content
+
+    def fetch_raw(self, sina_codes):
+        """返回所有分片拼接后的原始响应字节；单片失败不影响其他分片，全部失败 (或熔断中) 时抛出异常"""
+        parts = list(self.chunks(sina_codes))
+        if not parts: return b""
+        if len(parts) == 1: return self._get(parts[0])
+        blobs, err = [], None
+        for fut in [self.executor.submit(self._get, p) for p in parts]:
+            try: blobs.append(fut.result())
+            except Exception as e: err = e
+        if not blobs and err is not None: raise err
+        return b"\n".join(blobs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """进程级单例"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None: _client = QuoteClient()
+    return _client
@@ -0,0 +1,150 @@
+import time
+import threading
+from market_clock import market_of, IDLE_WAKE
+
+# ================= 全局行情快照轮询器 =================
+# 整个进程只有一个后台线程按固定节奏拉取"所有会话关注代码的并集"，写入内存快照。
+# 各个 streamlit 会话只读快照，上游请求量只和去重后的代码数有关，和打开的页面数无关。
+# 给了 market_clock 时按交易时段调节节奏：连续竞价 1s，集合竞价放慢，午休/收盘后/休市补拉一次后冻结快照。
+# 读取时过期的代码不在读端补拉 (stale-while-revalidate)：先返回快照里最后一次有效的行情，
+# 交给后台线程立即刷新；上游持续异常时 stale() 给出这些代码已多久没更新，页面据此标注。
+
+POLL_INTERVAL = 1.0
+SESSION_TTL = 30      # 会话超过这么久没有 rerun 就不再替它拉行情
+MAX_AGE = 3.0         # 快照里超过这个秒数的代码，读取时叫后台线程立即补拉
+STALE_AFTER = 10.0    # 交易时段内超过这个秒数没拿到有效行情，标为陈旧
+
+class QuotePoller:
+    def __init__(self, fetch_fn, interval=POLL_INTERVAL, session_ttl=SESSION_TTL, max_age=MAX_AGE, on_quotes=None, clock=None,
+                 stale_after=STALE_AFTER, on_phase_change=None):
+        """
+        fetch_fn(codes) -> {代码: (现价, 昨收, 涨跌%, 成交量)}，没有有效行情的代码为 NaN 元组 (见 data_service.get_realtime_map)
+        on_quotes(quotes): 每拉到一批行情后回调 (如 bar_recorder 记分钟线)
+        clock: market_clock.MarketClock；不给时始终按 interval 轮询
+        on_phase_change(): 交易时段切换 (该时段的行情已并入) 及轮询线程退出时回调 (如 bar_recorder 落盘)
+        """
+        self.fetch_fn = fetch_fn
+        self.on_quotes = on_quotes
+        self.on_phase_change = on_phase_change
+        self.clock = clock
+        self._frozen = {}        # 市场 -> 已冻结快照的时段 (进入不轮询时段时补拉过一次)
+        self.interval = interval
+        self.session_ttl = session_ttl
+        self.max_age = max_age
+        self.stale_after = stale_after
+        self._sessions = {}      # session_id -> (frozenset(codes), last_seen)
+        self._snapshot = {}      # 代码 -> 行情元组；整体替换，读端无需加锁
+        self._stamp = {}         # 代码 -> 最后一次拿到有效行情的时间 (没拿到过的为首次尝试时间)
+        self._pending = set()    # 读取时发现过期、等后台线程补拉的代码
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="quote-poller", daemon=True)
+        self._thread.start()
+
+    def watch(self, session_id, codes):
+        """会话在每次 rerun 时登记自己关心的代码 (同时充当心跳)"""
+        with self._lock:
+            self._sessions[session_id] = (frozenset(codes), time.monotonic())
+
+    def symbols(self):
+        """当前仍活跃会话的代码并集"""
+        now = time.monotonic()
+        with self._lock:
+            for sid in [s for s, (_, seen) in self._sessions.items() if now - seen > self.session_ttl]:
+                del self._sessions[sid]
+            return set().union(*(c for c, _ in self._sessions.values())) if self._sessions else set()
+
+    def _merge(self, quotes, attempted=()):
+        """
+        attempted 里没拿到行情的代码也记上时间，免得每次读取都重复补拉无效代码。
+        无效行情 (NaN) 不覆盖快照里最后一次有效的行情，只给从没拿到过行情的代码占位。
+        """
+        now = time.monotonic()
+        valid = {c: q for c, q in quotes.items() if q[0] > 0}
+        with self._lock:
+            snap = dict(self._snapshot)
+            snap.update({c: q for c, q in quotes.items() if c not in valid and c not in snap})
+            snap.update(valid)
+            self._snapshot = snap
+            for c in valid: self._stamp[c] = now
+            for c in list(quotes) + list(attempted): self._stamp.setdefault(c, now)
+        if self.on_quotes and quotes:
+            try: self.on_quotes(quotes)
+            except Exception: pass
+
+    def _live(self, market):
+        """该市场当前是否还需要刷新 (快照冻结的时段内过期也不补拉)"""
+        return self.clock is None or self.clock.poll_interval((market,)) is not None or market not in self._frozen
+
+    def get(self, codes):
+        """
+        读取快照。从没拉过的代码就地补拉 (通常只在会话首次出现时发生，受上游总时限约束)；
+        过期的先返回旧值，叫醒后台线程补拉，不在读端等上游。
+        """
+        now = time.monotonic()
+        stamp = self._stamp
+        missing = [c for c in codes if c not in stamp]
+        if missing:
+            try: self._merge(self.fetch_fn(missing), attempted=missing)
+            except Exception: pass
+        expired = [c for c in codes if c in stamp and now - stamp[c] > self.max_age and self._live(market_of(c))]
+        if expired:
+            with self._lock: self._pending.update(expired)
+            self._wake.set()
+        snap = self._snapshot
+        return {c: snap[c] for c in codes if c in snap}
+
+    def stale(self, codes):
+        """{代码: 秒数}：交易时段内超过 stale_after 秒没更新的代码 (快照里仍是最后一次有效行情)"""
+        now = time.monotonic()
+        stamp, snap = self._stamp, self._snapshot
+        ages = {c: now - stamp[c] for c in codes if c in snap and c in stamp and snap[c][0] > 0}
+        return {c: a for c, a in ages.items() if a > self.stale_after and self._live(market_of(c))}
+
+    def _plan(self, codes):
+        """本轮要拉的代码和下次醒来的间隔"""
+        if self.clock is None: return codes, self.interval
+        by_market = {}
+        for c in codes: by_market.setdefault(market_of(c), []).append(c)
+        due, waits = [], []
+        for mk, cs in by_market.items():
+            iv = self.clock.poll_interval((mk,))
+            if iv is not None:
+                self._frozen.pop(mk, None)
+                due += cs; waits.append(max(iv, self.interval))
+                continue
+            phase = self.clock.phase(mk)
+            if self._frozen.get(mk) != phase:
+                # 刚进入午休/收盘/休市：补拉一次拿到最终价，之后冻结
+                self._frozen[mk] = phase
+                due += cs
+            waits.append(min(IDLE_WAKE, max(1.0, self.clock.seconds_to_change((mk,)))))
+        return due, min(waits) if waits else self.interval
+
+    def _phase_changed(self):
+        if self.on_phase_change:
+            try: self.on_phase_change()
+            except Exception: pass
+
+    def _run(self):
+        phases = None
+        while not self._stop.is_set():
+            started = time.monotonic()
+            prev, phases = phases, self.clock.phases(("A", "HK")) if self.clock else None
+            codes, wait = self._plan(self.symbols())
+            with self._lock: codes, self._pending = set(codes) | self._pending, set()
+            if codes:
+                try: self._merge(self.fetch_fn(sorted(codes)))
+                except Exception: pass
+            # 进入新时段的这一轮已补拉过一次，回调时上一时段的最终数据已经并入
+            if prev is not None and phases != prev: self._phase_changed()
+            self._wake.wait(max(0.0, wait - (time.monotonic() - started)))
+            self._wake.clear()
+            # 被读端叫醒时也不快于 interval，上游异常期间不会被多个会话催成忙等
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        self._phase_changed()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,175 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import telemetry
+
+# ================= 上游容错层 =================
+# Endpoint：每个上游端点一个。
+#   对冲请求：第一次请求超过近期 p95 耗时还没回来，就再发一份，谁先回来用谁；
+#   总时限：超过 deadline 直接放弃 (晚到的结果丢弃)，一次调用的耗时有上界；
+#   熔断：连续失败 failures 次后打开，cooldown 秒内直接失败不再请求，之后放一个探测请求，成功即恢复。
+# StaleValue：上次成功的结果 + 时间。过期后先返回旧值并在后台刷新 (同一时间只有一个刷新)，
+# 刷新失败保留旧值；调用方用 age() 判断是否陈旧。
+
+HISTORY = 200           # 用最近多少次成功耗时估计 p95
+MIN_SAMPLES = 20        # 样本不够时用 initial_delay
+
+class CircuitOpen(RuntimeError):
+    """熔断打开期间的调用直接失败"""
+
+class Endpoint:
+    def __init__(self, name, deadline=None, hedge=True, hedge_quantile=95, initial_delay=0.5, min_delay=0.05,
+                 failures=5, cooldown=10.0, workers=16):
+        """
+        deadline: 单次调用总时限 (秒)，None 表示不限 (且不对冲时在调用线程里直接执行)
+        hedge: 是否对冲；非线程安全的客户端 (如 baostock 的全局会话) 只能用熔断
+        """
+        self.name = name
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lat = deque(maxlen=HISTORY)
+        self._lock = threading.Lock()
+        self._fails = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"hedge-{name}") if hedge or deadline else None
+
+    # ---------- 熔断 ----------
+    def state(self):
+        """'closed' / 'open' / 'half-open'"""
+        with self._lock:
+            if self._fails < self.failures: return "closed"
+            return "open" if time.monotonic() < self._open_until else "half-open"
+
+    def _admit(self):
+        """熔断打开时抛 CircuitOpen；half-open 时只放一个探测请求"""
+        with self._lock:
+            if self._fails < self.failures: return
+            if time.monotonic() >= self._open_until and not self._probing:
+                self._probing = True
+                return
+        telemetry.count("circuit_rejected", endpoint=self.name)
+        raise CircuitOpen(f"{self.name} 熔断中")
+
+    def _record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._fails = 0
+                return
+            self._fails += 1
+            if self._fails >= self.failures:
+                if time.monotonic() >= self._open_until: telemetry.count("circuit_open", endpoint=self.name)
+                self._open_until = time.monotonic() + self.cooldown
+
+    # ---------- 对冲 ----------
+    def hedge_delay(self):
+        """近期成功请求耗时的 p95 (样本不足时用 initial_delay)，不超过总时限的一半"""
+        lat = list(self._lat)
+        d = float(np.percentile(lat, self.hedge_quantile)) if len(lat) >= MIN_SAMPLES else self.initial_delay
+        d = max(d, self.min_delay)
+        return min(d, self.deadline / 2) if self.deadline else d
+
+    def _attempt(self, fn, args):
+        t = time.monotonic()
+        res = fn(*args)
+        self._lat.append(time.monotonic() - t)
+        return res
+
+    def call(self, fn, *args):
+        """经熔断 + 对冲 + 总时限执行 fn(*args)；全部失败时抛出最后一个异常 (超时为 TimeoutError)"""
+        self._admit()
+        if self._executor is None:
+            try: res = self._attempt(fn, args)
+            except Exception:
+                self._record(False); raise
+            self._record(True)
+            return res
+
+        t0 = time.monotonic()
+        end = t0 + self.deadline if self.deadline else float("inf")
+        pending = {self._executor.submit(self._attempt, fn, args)}
+        hedged, err = not self.hedge, None
+        while True:
+            now = time.monotonic()
+            until = end if hedged else min(end, t0 + self.hedge_delay())
+            done, pending = wait(pending, timeout=max(0.0, until - now) if until != float("inf") else None, return_when=FIRST_COMPLETED)
+            for f in done:
+                try: res = f.result()
+                except Exception as e:
+                    err = e; continue
+                self._record(True)
+                return res
+            if time.monotonic() >= end:
+                err = TimeoutError(f"{self.name} 超过 {self.deadline}s"); break
+            if not hedged:
+                # 到了 p95 还没回来，或第一次已经失败：再发一份
+                hedged = True
+                telemetry.count("upstream_hedged", endpoint=self.name)
+                pending.add(self._executor.submit(self._attempt, fn, args))
+            elif not pending: break
+        for f in pending: f.cancel()
+        if isinstance(err, TimeoutError): telemetry.count("upstream_timeouts", endpoint=self.name)
+        self._record(False)
+        raise err
+
+class StaleValue:
+    def __init__(self, loader, max_age, name):
+        """loader() -> 值 (失败抛异常)；max_age 秒后视为过期，读取时后台刷新"""
+        self.loader = loader
+        self.max_age = max_age
+        self.name = name
+        self.last_error = None
+        self._value = None
+        self._at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def age(self):
+        """距上次成功加载的秒数；从未成功为 None"""
+        return None if self._at is None else time.monotonic() - self._at
+
+    @property
+    def loaded_at(self):
+        """上次成功加载的时间 (monotonic)，可作缓存键；从未成功为 None"""
+        return self._at
+
+    def stale(self):
+        return self._at is not None and self.age() > self.max_age
+
+    def _load(self):
+        try:
+            v = self.loader()
+            with self._lock: self._value, self._at, self.last_error = v, time.monotonic(), None
+        except Exception as e:
+            self.last_error = str(e)
+            telemetry.count("stale_refresh_errors", source=self.name)
+            raise
+        finally:
+            with self._lock: self._refreshing = False
+
+    def _refresh_async(self):
+        with self._lock:
+            if self._refreshing: return
+            self._refreshing = True
+        def run():
+            try: self._load()
+            except Exception: pass
+        threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True).start()
+
+    def get(self):
+        """有值就立即返回 (过期的同时触发后台刷新)；从未成功过时同步加载，失败抛异常"""
+        if self._at is None:
+            with self._lock: self._refreshing = True
+            self._load()
+        elif self.stale():
+            telemetry.count("stale_served", source=self.name)
+            self._refresh_async()
+        return self._value
@@ -0,0 +1,168 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+from utils import DEFAULT_THRESHOLDS
+from indicator_state import MA_LIST, live_dev_matrix
+
+# ================= 告警规则引擎 =================
+# 策略 (短线/波段/大盘) 和风控 (支撑/止盈/止损) 规则从配置编译成按列的向量表达式，
+# 扫描、自选表信号、持仓状态共用同一套判断。
+# 每个 tick 只重算输入 (现价/涨跌/均线偏离/折溢价) 有变化的代码；
+# 告警按 (代码, 规则) 去重：条件成立时只报一次，条件解除后再成立才会再报。
+
+INPUTS = ("现价", "涨跌%", "MA20偏", "大盘折溢价")
+P, CHG, MA20, PREM = range(len(INPUTS))
+
+# (规则名, 作用范围, 表格标签, 告警模板)；同一代码多条成立时按此顺序取第一条作标签
+RULES = (
+    ("short", "watch", "⚡ 异动", "⚡ {name} 异动 {v:.2f}%"),
+    ("band", "watch", "🌊 机会", "🌊 {name} 击穿MA20 {v:.1f}%"),
+    ("market", "watch", "⚓ 低估", "⚓ {name} 低估 {v:.1f}%"),
+    ("support", "hold", "🚨 破位卖出", "🚨 {name} 跌破支撑位! {p}<{v}"),
+    ("profit", "hold", "💰 止盈卖出", "💰 {name} 止盈达标! {v:.1f}%"),
+    ("loss", "hold", "😭 止损卖出", "😭 {name} 触及止损! {v:.1f}%"),
+)
+RULE_NAMES = [r[0] for r in RULES]
+STRATEGY_CODES = {"⚡ 短线": 0, "🌊 波段": 1, "⚓ 大盘": 2}
+HOLD_OK = "🟢 持有"
+
+def rule_inputs(quotes, analysis=None, states=None):
+    """
+    quotes: {代码: (现价, 昨收, 涨跌%, 成交量)}；analysis: 扫描指标 DataFrame (代码为索引) 或 {代码: 指标dict}
+    states: 增量指标状态 {代码: IndicatorState}，给出时 MA20偏 用现价算的实时值
+    返回以代码为索引、列为 INPUTS 的 DataFrame
+    """
+    codes = list(quotes)
+    q = np.array([quotes[c][:3] for c in codes], dtype=float).reshape(-1, 3)
+    df = pd.DataFrame({"现价": q[:, 0], "涨跌%": q[:, 2]}, index=codes)
+    if isinstance(analysis, dict): analysis = pd.DataFrame.from_dict(analysis, orient='index') if analysis else None
+    if analysis is not None and len(analysis):
+        cols = [c for c in ("MA20偏", "大盘折溢价") if c in analysis.columns]
+        df = df.join(analysis[cols])
+    df = df.reindex(columns=list(INPUTS))
+    if states:
+        live = live_dev_matrix(states, codes, q[:, 0])[:, MA_LIST.index(20)]
+        df["MA20偏"] = np.where(np.isnan(live), df["MA20偏"].to_numpy(), live)
+    return df
+
+class RuleEngine:
+    def __init__(self):
+        self._sig = None
+        self.compile({})
+
+    # ---------- 编译 ----------
+    def compile(self, config):
+        """按配置 (自选/持仓/阈值) 重建参数列；配置没变时直接返回 False"""
+        watch, hold = config.get("watch_list", {}), config.get("holding_list", {})
+        th = config.get("thresholds", {})
+        sig = json.dumps([watch, hold, th], sort_keys=True, ensure_ascii=False)
+        if sig == self._sig: return False
+        old = getattr(self, "_pos", {})
+        old_state, old_fired = getattr(self, "state", None), getattr(self, "_fired_at", None)
+
+        self._sig = sig
+        self.codes = list(dict.fromkeys(list(watch) + list(hold)))
+        self._pos = {c: i for i, c in enumerate(self.codes)}
+        n = len(self.codes)
+        th = {**DEFAULT_THRESHOLDS, **th}
+        self.th_short, self.th_band, self.th_market = (float(th[k]) for k in ("short", "band", "market"))
+        self.strategy = np.array([STRATEGY_CODES.get(watch[c].get("strategy", "🌊 波段"), 1) if c in watch else -1 for c in self.codes], dtype=np.int8)
+        h = [hold.get(c) or {} for c in self.codes]
+        self.is_hold = np.array([c in hold for c in self.codes], dtype=bool)
+        self.cost = np.array([float(x.get("cost", 0) or 0) for x in h])
+        self.support = np.array([float(x.get("support", 0) or 0) for x in h])
+        self.target = np.array([float(x.get("profit_target", 999)) for x in h])
+        self.loss = np.array([float(x.get("loss_limit", -999)) for x in h])
+
+        # 阈值或参数变了，输入缓存作废：下个 tick 全量重算；已报过的告警保留，避免改配置后重复弹出
+        self._last = np.full((n, len(INPUTS)), np.nan)
+        self._seen = np.zeros(n, dtype=bool)
+        self.state = np.zeros((n, len(RULES)), dtype=bool)
+        self.values = np.full((n, len(RULES)), np.nan)
+        self._fired_at = np.full((n, len(RULES)), np.nan)
+        if old_fired is not None:
+            keep = [(i, old[c]) for i, c in enumerate(self.codes) if c in old]
+            if keep:
+                new_i, old_i = map(list, zip(*keep))
+                self._fired_at[new_i] = old_fired[old_i]
+                self.state[new_i] = old_state[old_i]
+        return True
+
+    # ---------- 求值 ----------
+    def _evaluate(self, rows, x):
+        """对行号 rows、输入矩阵 x (len(rows) × INPUTS) 计算全部规则，写入 state/values"""
+        p, chg, ma20, prem = x[:, P], x[:, CHG], x[:, MA20], x[:, PREM]
+        strat, cost = self.strategy[rows], self.cost[rows]
+        support, hold = self.support[rows], self.is_hold[rows]
+        live = p > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profit = np.where(cost > 0, (p - cost) / cost * 100, 0.0)
+            ma20, prem = np.nan_to_num(ma20), np.nan_to_num(prem)
+            hit = np.column_stack([
+                live & (strat == 0) & (np.abs(chg) > self.th_short),
+                live & (strat == 1) & (ma20 < self.th_band),
+                live & (strat == 2) & (prem < self.th_market),
+                live & hold & (support > 0) & (p < support),
+                live & hold & (cost > 0) & (profit >= self.target[rows]),
+                live & hold & (cost > 0) & (profit <= self.loss[rows]),
+            ])
+        self.state[rows] = hit
+        self.values[rows] = np.column_stack([chg, ma20, -prem, support, profit, profit])
+
+    def update(self, inputs):
+        """
+        inputs: rule_inputs() 的结果。只重算输入有变化 (含首次出现) 的代码，返回重算的代码行号。
+        不在 inputs 里的代码保持上次结果。
+        """
+        if not self.codes: return np.zeros(0, dtype=np.int64)
+        known = inputs.index.intersection(self.codes)
+        if not len(known): return np.zeros(0, dtype=np.int64)
+        rows = np.fromiter((self._pos[c] for c in known), dtype=np.int64, count=len(known))
+        x = inputs.loc[known, list(INPUTS)].to_numpy(dtype=float)
+        last = self._last[rows]
+        same = (x == last) | (np.isnan(x) & np.isnan(last))
+        changed = ~same.all(axis=1) | ~self._seen[rows]
+        if changed.any():
+            rows, x = rows[changed], x[changed]
+            self._evaluate(rows, x)
+            self._last[rows] = x
+            self._seen[rows] = True
+        else: rows = rows[:0]
+        return rows
+
+    # ---------- 结果 ----------
+    def labels(self, codes):
+        """每个代码第一条成立规则的表格标签 (无则空串)"""
+        tags = np.array([r[2] for r in RULES] + [""], dtype=object)
+        rows = [self._pos.get(c, -1) for c in codes]
+        st = np.vstack([self.state, np.zeros((1, len(RULES)), dtype=bool)])[rows]
+        first = np.where(st.any(axis=1), st.argmax(axis=1), len(RULES))
+        return tags[first]
+
+    def holding_status(self, codes):
+        """持仓状态：破位/止盈/止损卖出，否则持有"""
+        cols = [j for j, r in enumerate(RULES) if r[1] == "hold"]
+        tags = np.array([RULES[j][2] for j in cols] + [HOLD_OK], dtype=object)
+        rows = [self._pos.get(c, -1) for c in codes]
+        st = np.vstack([self.state[:, cols], np.zeros((1, len(cols)), dtype=bool)])[rows]
+        return tags[np.where(st.any(axis=1), st.argmax(axis=1), len(cols))]
+
+    def _format(self, i, j, names):
+        code = self.codes[i]
+        name = names.get(code, code) if names else code
+        return RULES[j][3].format(name=name, v=self.values[i, j], p=self._last[i, P])
+
+    def active(self, names=None):
+        """当前全部成立的告警 (手动扫描时用，不去重)"""
+        return [self._format(i, j, names) for i, j in zip(*np.nonzero(self.state))]
+
+    def alerts(self, names=None, now=None):
+        """去重后的新告警：(代码, 规则) 变为成立时报一次，持续成立期间不再报"""
+        now = time.time() if now is None else now
+        due = self.state & np.isnan(self._fired_at)
+        # 条件解除后清掉去重标记，下次成立重新提醒
+        self._fired_at[~self.state] = np.nan
+        ii, jj = np.nonzero(due)
+        self._fired_at[ii, jj] = now
+        return [self._format(i, j, names) for i, j in zip(ii, jj)]
@@ -0,0 +1,81 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import baostock as bs
+import pandas as pd
+import data_service as ds
+import telemetry
+
+# ================= 并行扫描引擎 =================
+# 行情：批量请求一次拿齐；历史同步：进程池并行；指标：同步完后一次批量计算。
+# baostock 的会话是模块级全局变量，线程间不能共享，所以每个工作进程各自 login；
+# 会话过期时 data_service 的查询会重新登录再试一次。同步失败的代码回报给调用方，不再静默吞掉。
+
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_pool = None
+
+def _init_worker():
+    bs.login()
+
+def _sync(code):
+    """同步本地仓库，只回传K线数量和本进程的埋点增量，避免把整段历史 pickle 回主进程；失败时回传异常文本"""
+    try: return len(ds.get_history_data(code, days=730, strict=True)), telemetry.drain(), None
+    except Exception as e: return 0, telemetry.drain(), str(e) or type(e).__name__
+
+def get_pool():
+    """常驻进程池，避免每次扫描都重新拉起进程和登录"""
+    global _pool
+    if _pool is None:
+        # streamlit 主进程是多线程的，fork 不安全，用 spawn
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=mp.get_context("spawn"), initializer=_init_worker)
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+def fetch_quotes(codes):
+    """批量请求实时行情 (quote_client 负责分片并发)，返回 {代码: 行情dict}"""
+    return {q["代码"]: q for q in ds.get_batch_realtime_sina(codes)}
+
+def sync_histories(codes, on_progress=None):
+    """
+    进程池并行增量同步个股及其基准指数的日K，按完成顺序回报进度 (0~1)。
+    返回同步失败的 {代码: 原因} (本地已有数据仍可用，只是没更新)。
+    """
+    targets = list(codes) + sorted({ds.get_belonging_index(c)[0] for c in codes} - set(codes))
+    futures = {get_pool().submit(_sync, c): c for c in targets}
+    failed = {}
+    for i, fut in enumerate(as_completed(futures)):
+        try:
+            _, counters, err = fut.result()
+            telemetry.merge(counters)
+            if err: failed[futures[fut]] = err
+        except BrokenProcessPool as e:
+            shutdown_pool()
+            failed[futures[fut]] = str(e) or "BrokenProcessPool"
+        except Exception as e:
+            failed[futures[fut]] = str(e) or type(e).__name__
+        if on_progress: on_progress((i + 1) / len(targets))
+    if failed: telemetry.count("sync_failures", len(failed))
+    return failed
+
+def run_scan(codes, on_progress=None):
+    """
+    扫描所有代码，返回 (行情 {代码: dict}, 指标 DataFrame, 日K同步失败的 {代码: 原因})。
+    无行情(停牌/取不到价格)的代码不参与指标计算。
+    """
+    with telemetry.timer("scan_stage_seconds", stage="quotes"):
+        quotes = fetch_quotes(codes)
+    live = [c for c in codes if c in quotes and quotes[c]["现价"] > 0]
+    if not live: return quotes, pd.DataFrame(), {}
+    with telemetry.timer("scan_stage_seconds", stage="sync"):
+        failed = sync_histories(live, on_progress)
+    with telemetry.timer("scan_stage_seconds", stage="metrics"):
+        metrics = ds.calculate_batch_metrics(live, [quotes[c]["现价"] for c in live], [quotes[c]["成交量"] for c in live])
+    telemetry.count("scan_symbols", len(live))
+    return quotes, metrics, failed
@@ -0,0 +1,125 @@
+import re
+import sys
+import argparse
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import history_store
+import metrics_engine
+
+# ================= 全市场选股 =================
+# 股票池为全部在市 A股。日线面板按数据日从本地仓库加载一次并常驻内存，
+# 每次刷新只批量拉一遍行情，和缓存的面板一起算 MA偏离 / 量比 / 大盘折溢价，
+# 条件过滤和 Top-N 排序都是整列运算。本地仓库没有历史的代码这几列为 NaN，不会命中相关条件。
+# 也可以脱离页面运行 (cron)：python screener.py --filter "MA20偏<-5" --sort 量比 --out picks.parquet
+
+FILTER_COLS = ("涨跌%", "量比", "MA10偏", "MA20偏", "MA30偏", "MA60偏", "大盘折溢价")
+HISTORY_COLS = ("MA10偏", "MA20偏", "MA30偏", "MA60偏", "量比", "大盘折溢价")
+DEFAULT_TOP = 50
+_COND = re.compile(r'^\s*(\S+?)\s*(<=|>=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+class Screener:
+    def __init__(self, codes, index_of, aligner, days=730):
+        """codes: 股票池；index_of / aligner 同 metrics_engine.compute_metrics"""
+        self.codes = list(codes)
+        self.index_of = index_of
+        self.aligner = aligner
+        self.days = days
+        self._lock = threading.Lock()
+        self._gen = None
+        self._panel = None
+        self.has_history = np.zeros(len(self.codes), dtype=bool)
+
+    def _history(self):
+        """日线面板：数据日切换 (新日K入库) 或同步过历史后 reload() 才重新加载"""
+        gen = history_store.ready_cutoff(datetime.datetime.now())
+        with self._lock:
+            if gen != self._gen or self._panel is None:
+                start = (datetime.datetime.now() - datetime.timedelta(days=self.days)).strftime("%Y-%m-%d")
+                self._panel = metrics_engine.build_panel(history_store.load_many(self.codes, start), self.codes)
+                self.has_history = (self._panel[0] >= 0).any(axis=1)
+                self._gen = gen
+            return self._panel
+
+    def reload(self):
+        with self._lock: self._panel = None
+
+    def refresh(self, frame, expected_vols=None):
+        """
+        frame: get_quote_frame() 的全市场行情。返回以代码为索引的 DataFrame：
+        名称, 现价, 涨跌%, 成交额 + metrics_engine.METRIC_COLS；停牌/取不到行情的代码不在结果里
+        """
+        panel = self._history()
+        f = frame.drop_duplicates("代码").set_index("代码").reindex(self.codes)
+        prices, vols = f["现价"].to_numpy(dtype=float), f["成交量"].to_numpy(dtype=float)
+        m = metrics_engine.compute_metrics(self.codes, None, np.nan_to_num(prices), np.nan_to_num(vols), self.index_of, self.aligner,
+                                           expected_vols=expected_vols, panel=panel)
+        # 没有本地历史时上面这些列是占位的 0，换成 NaN 免得被条件误选
+        m.loc[~self.has_history, list(HISTORY_COLS)] = np.nan
+        m.insert(0, "成交额", f["成交额"].to_numpy())
+        m.insert(0, "涨跌%", f["涨跌%"].to_numpy())
+        m.insert(0, "现价", prices)
+        m.insert(0, "名称", f["名称"].to_numpy())
+        return m[np.nan_to_num(prices) > 0]
+
+def parse_conditions(text):
+    """'MA20偏<-5; 量比>1.5' -> [(列, 运算符, 值)]；列不在 FILTER_COLS 或格式不对时抛 ValueError"""
+    conds = []
+    for part in re.split(r'[;；,，\n]+', text or ""):
+        if not part.strip(): continue
+        m = _COND.match(part)
+        if not m or m.group(1) not in FILTER_COLS: raise ValueError(f"无法识别的条件: {part.strip()}")
+        conds.append((m.group(1), m.group(2), float(m.group(3))))
+    return conds
+
+def screen(df, conditions=(), sort_by="涨跌%", ascending=False, top=DEFAULT_TOP):
+    """按条件过滤 (全部满足)，再按 sort_by 取前 top 只；排序列为 NaN 的排除"""
+    mask = np.ones(len(df), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for col, op, v in conditions:
+            x = df[col].to_numpy(dtype=float)
+            mask &= {"<": x < v, "<=": x <= v, ">": x > v, ">=": x >= v}[op]
+        key = df[sort_by].to_numpy(dtype=float)
+    mask &= ~np.isnan(key)
+    idx = np.nonzero(mask)[0]
+    key = key[idx] if ascending else -key[idx]
+    if top and len(idx) > top:
+        part = np.argpartition(key, top - 1)[:top]
+        idx, key = idx[part], key[part]
+    return df.iloc[idx[np.argsort(key, kind="stable")]]
+
+def main(argv=None):
+    """无界面入口：同步 (可选) -> 拉全市场行情 -> 过滤排序 -> 写 Parquet/CSV"""
+    ap = argparse.ArgumentParser(description="全市场选股，结果写入 Parquet 或 CSV")
+    ap.add_argument("--filter", action="append", default=[], help='条件，如 "MA20偏<-5"，可重复')
+    ap.add_argument("--sort", default="涨跌%", choices=FILTER_COLS)
+    ap.add_argument("--asc", action="store_true", help="升序 (默认降序)")
+    ap.add_argument("--top", type=int, default=DEFAULT_TOP)
+    ap.add_argument("--sync", action="store_true", help="先增量同步全市场日K (首次较慢)")
+    ap.add_argument("--out", default="screener.csv", help="输出文件，.parquet 或 .csv")
+    args = ap.parse_args(argv)
+    conds = parse_conditions(";".join(args.filter))
+
+    import data_service as ds
+    import scan_engine
+    ds.init_baostock()
+    day = datetime.date.today().isoformat()
+    scr = ds.get_screener(day)
+    if args.sync:
+        shown = set()
+        def progress(p):
+            pct = int(p * 100)
+            if pct not in shown: shown.add(pct); print(f"\r同步 {pct}%", end="", file=sys.stderr)
+        failed = scan_engine.sync_histories(scr.codes, on_progress=progress)
+        print(file=sys.stderr)
+        if failed: print(f"{len(failed)} 只日K同步失败 (如 {next(iter(failed.items()))})", file=sys.stderr)
+        scr.reload()
+    res = screen(ds.screen_market(day), conds, args.sort, args.asc, args.top)
+    if args.out.endswith(".parquet"): res.to_parquet(args.out)
+    else: res.to_csv(args.out, encoding="utf-8-sig")
+    print(f"{len(res)} 只 -> {args.out}", file=sys.stderr)
+    scan_engine.shutdown_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# ================= 行业板块引擎 =================
+# 行业归属取自 baostock query_stock_industry (全市场成分股，按天缓存)。
+# 每次刷新把全部成分股的行情批量拉一次，按行业分组一次性归约：
+# 板块涨跌幅 (等权 / 成交额加权)、涨跌家数、领涨/领跌股，不再逐个板块请求。
+# 行情里没有股本数据，"加权" 用当日成交额作权重。
+
+WEIGHTINGS = ("等权", "成交额加权")
+FLAT_EPS = 1e-9     # |涨跌%| 不超过它算平盘
+
+class SectorEngine:
+    def __init__(self, industry_map):
+        """industry_map: {代码: 行业名}，行业为空的代码忽略"""
+        items = [(c, ind) for c, ind in industry_map.items() if ind]
+        self.codes = [c for c, _ in items]
+        group, self.sectors = pd.factorize(pd.Index([ind for _, ind in items]), sort=True)
+        self.group = group.astype(np.int64)
+        self._pos = pd.Index(self.codes)
+        self.size = np.bincount(self.group, minlength=len(self.sectors))
+
+    def constituents(self, frame):
+        """
+        frame: get_quote_frame() 的结果。对齐到全部成分股，返回 DataFrame[代码, 名称, 行业, 现价, 涨跌%, 成交额, _g(行业序号)]；
+        停牌/取不到行情 (现价 <= 0) 的代码不在结果里。
+        """
+        f = frame.drop_duplicates("代码").set_index("代码")
+        rows = self._pos.get_indexer(f.index)
+        keep = (rows >= 0) & (f["现价"].to_numpy() > 0)
+        rows = rows[keep]
+        f = f[keep]
+        return pd.DataFrame({"代码": f.index, "名称": f["名称"].to_numpy(), "行业": self.sectors[self.group[rows]],
+                             "现价": f["现价"].to_numpy(), "涨跌%": f["涨跌%"].to_numpy(),
+                             "成交额": np.nan_to_num(f["成交额"].to_numpy()), "_g": self.group[rows]})
+
+    def compute(self, frame, weighting="等权"):
+        """返回 (行业汇总, 成分股明细)"""
+        c = self.constituents(frame)
+        return self.summarize(c, weighting), c
+
+    def summarize(self, c, weighting="等权"):
+        """
+        按行业分组归约，每个行业一行：
+        板块, 成分数, 有效数, 涨跌幅, 上涨, 下跌, 平盘, 上涨占比%, 成交额, 领涨, 领涨幅, 领跌, 领跌幅
+        """
+        k = len(self.sectors)
+        g, chg, amt = c["_g"].to_numpy(), c["涨跌%"].to_numpy(dtype=float), c["成交额"].to_numpy(dtype=float)
+        valid = ~np.isnan(chg)
+        g, chg, amt, names = g[valid], chg[valid], amt[valid], c["名称"].to_numpy()[valid]
+        n = np.bincount(g, minlength=k)
+        w = amt if weighting == "成交额加权" else np.ones(len(g))
+        wsum = np.bincount(g, weights=w, minlength=k)
+        up = np.bincount(g, weights=chg > FLAT_EPS, minlength=k)
+        down = np.bincount(g, weights=chg < -FLAT_EPS, minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ret = np.bincount(g, weights=w * chg, minlength=k) / wsum
+            breadth = up / n * 100
+
+        # 组内按涨跌幅排序：每组第一条为领跌，最后一条为领涨
+        order = np.lexsort((chg, g))
+        gs = g[order]
+        first = np.searchsorted(gs, np.arange(k), side="left")
+        last = np.searchsorted(gs, np.arange(k), side="right") - 1
+        has = n > 0
+        if len(order): lead_i, lag_i = order[np.where(has, last, 0)], order[np.where(has, first, 0)]
+        else: lead_i = lag_i = None
+
+        def pick(arr, i, empty):
+            return np.where(has, arr[i], empty) if i is not None else np.full(k, empty)
+        return pd.DataFrame({
+            "板块": self.sectors, "成分数": self.size, "有效数": n, "涨跌幅": ret,
+            "上涨": up.astype(int), "下跌": down.astype(int), "平盘": (n - up - down).astype(int),
+            "上涨占比%": breadth, "成交额": np.bincount(g, weights=amt, minlength=k),
+            "领涨": pick(names, lead_i, ""), "领涨幅": pick(chg, lead_i, np.nan),
+            "领跌": pick(names, lag_i, ""), "领跌幅": pick(chg, lag_i, np.nan),
+        })
+
+    @staticmethod
+    def movers(c, sector, n=10):
+        """某行业成分股按涨跌幅排序的前 n / 后 n 只"""
+        s = c[c["行业"] == sector].drop(columns="_g").sort_values("涨跌%", ascending=False)
+        return s.head(n), s.tail(n)[::-1]
@@ -0,0 +1,76 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+
+# ================= 新浪 hq_str 批量解析器 =================
+# 直接在原始字节上用一个编译好的正则切出 (代码, 内容)，A股数值字段拼成一段交给 C 解析器，
+# 返回列式 DataFrame。只有名称需要 GBK 解码，且每行只解一个字段。
+
+HQ_PATTERN = re.compile(rb'hq_str_(\w+)="([^"]*)"')
+
+# A股 (sh600519="名称,今开,昨收,现价,最高,最低,竞买,竞卖,成交量,成交额,买1量,买1价,...,卖5量,卖5价,日期,时间,...")
+A_NUM_FIELDS = 29          # 第 1~29 个字段是数值
+A_COLS = (["今开", "昨收", "现价", "最高", "最低", "竞买", "竞卖", "成交量", "成交额"]
+          + [f"{side}{i}{k}" for side in ("买", "卖") for i in range(1, 6) for k in ("量", "价")])
+# 港股 (hk00700="英文名,名称,今开,昨收,最高,最低,现价,涨跌,涨跌%,买1价,卖1价,成交额,成交量,...")
+HK_NUM_FIELDS = (2, 13)    # 第 2~12 个字段是数值
+HK_COLS = ["今开", "昨收", "最高", "最低", "现价", "涨跌", "涨跌%", "买1价", "卖1价", "成交额", "成交量"]
+
+COLUMNS = (["代码", "名称", "现价", "昨收", "涨跌%", "成交量", "今开", "最高", "最低", "成交额"]
+           + [f"{side}{i}{k}" for side in ("买", "卖") for i in range(1, 6) for k in ("价", "量")])
+
+def _to_float(rows, width):
+    """字段矩阵 (bytes) -> float64；空串/非法值记为 NaN"""
+    out = np.full((len(rows), width), np.nan)
+    for i, r in enumerate(rows):
+        for j, x in enumerate(r[:width]):
+            try: out[i, j] = float(x)
+            except ValueError: pass
+    return out
+
+def _a_numbers(payloads):
+    """
+    A股数值块：把所有行拼成一段 CSV 交给 pandas 的 C 解析器一次性转成 float64。
+    行宽不规整 (精简格式/字段增减) 时解析器会报错，退回逐行解析。
+    """
+    try:
+        block = pd.read_csv(io.BytesIO(b"\n".join(payloads)), header=None, usecols=range(1, A_NUM_FIELDS + 1),
+                            dtype=np.float64, engine='c', encoding='latin-1', na_filter=False)
+        if len(block) == len(payloads): return block.to_numpy()
+    except (ValueError, pd.errors.ParserError): pass
+    return _to_float([p.split(b',', A_NUM_FIELDS + 1)[1:] for p in payloads], A_NUM_FIELDS)
+
+def _decode_all(items, sep=b"\n"):
+    """一批字节串拼起来只解码一次再切开，比逐个 decode 快得多"""
+    return sep.join(items).decode('gbk', errors='replace').split(sep.decode())
+
+def parse_batch(raw):
+    """
+    解析整段响应字节，返回列为 COLUMNS 的 DataFrame (代码为新浪格式，如 sh600519)。
+    空内容 (停牌/无效代码) 的行被丢弃；缺失字段 (如港股的 2~5 档) 为 NaN。
+    """
+    if isinstance(raw, str): raw = raw.encode('gbk', errors='replace')
+    matches = HQ_PATTERN.findall(raw)
+    a_rows = [m for m in matches if m[0][:2] != b'hk' and m[1].count(b',', 0, 200) >= 8]
+    h_rows = [(c, p.split(b',')) for c, p in matches if c[:2] == b'hk' and p]
+    h_rows = [(c, p) for c, p in h_rows if len(p) >= HK_NUM_FIELDS[1]]
+
+    frames = []
+    if a_rows:
+        payloads = [p for _, p in a_rows]
+        a = pd.DataFrame(_a_numbers(payloads), columns=A_COLS)
+        last, price = a["昨收"].to_numpy(), a["现价"].to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            a["涨跌%"] = np.where(last > 0, (price - last) / last * 100, 0.0)
+        a["代码"] = _decode_all([c for c, _ in a_rows])
+        a["名称"] = _decode_all([p[:p.find(b',')] for p in payloads])
+        frames.append(a)
+    if h_rows:
+        h = pd.DataFrame(_to_float([p[HK_NUM_FIELDS[0]:HK_NUM_FIELDS[1]] for _, p in h_rows], len(HK_COLS)), columns=HK_COLS)
+        h["代码"] = _decode_all([c for c, _ in h_rows])
+        h["名称"] = _decode_all([p[1] for _, p in h_rows])
+        frames.append(h)
+    if not frames: return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return df.reindex(columns=COLUMNS)
@@ -0,0 +1,71 @@
+import re
+import heapq
+from bisect import bisect_left
+from utils import convert_code
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 没装 pypinyin 时只是不支持拼音首字母搜索
+    lazy_pinyin = None
+
+# ================= 代码检索索引 =================
+# 启动时把 代码 / 不带交易所的代码 / 名称 / 拼音首字母 排成一个有序数组，
+# 边输边搜用二分查前缀，只返回前 N 条；批量导入用 resolve 做 O(1) 精确匹配。
+
+# 排序优先级：完整代码 > 裸代码 > 名称 > 拼音首字母
+RANK_CODE, RANK_BARE, RANK_NAME, RANK_PINYIN = range(4)
+_PREFIX = re.compile(r'^(sh|sz|ss|hk)\.?')
+_SUFFIX = re.compile(r'\.(sh|sz|ss|hk)$')
+
+def pinyin_initials(name):
+    if lazy_pinyin is None: return ""
+    return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+
+class SymbolIndex:
+    def __init__(self, stock_map):
+        """stock_map: {代码: 名称}，即 get_stock_basic_cached 的第一个返回值"""
+        self.stock_map = stock_map
+        self._exact = {}
+        entries = []
+        for code, name in stock_map.items():
+            bare = code.split(".")[0]
+            # 裸代码冲突 (如 sh.000001 指数与 sz.000001 平安银行) 时后者覆盖前者，与旧的批量导入一致
+            self._exact[code.lower()] = code
+            self._exact[bare] = code
+            self._exact[convert_code(code, "sina").lower()] = code
+            keys = [(code.lower(), RANK_CODE), (bare, RANK_BARE), (name.lower(), RANK_NAME)]
+            py = pinyin_initials(name)
+            if py: keys.append((py, RANK_PINYIN))
+            entries += [(k, r, code) for k, r in keys]
+        entries.sort()
+        self._keys = [e[0] for e in entries]
+        self._entries = entries
+
+    def resolve(self, raw):
+        """把用户输入的一个代码 (600519 / sh600519 / 600519.SS / 00700.hk ...) 解析成标准代码，找不到返回 None"""
+        q = raw.strip().lower()
+        if not q: return None
+        hit = self._exact.get(q)
+        if hit: return hit
+        bare = _SUFFIX.sub("", _PREFIX.sub("", q))
+        return self._exact.get(bare)
+
+    def search(self, query, limit=20):
+        """前缀检索，返回 [(代码, 名称)]，最多 limit 条；前缀结果不足时再按名称包含补齐"""
+        q = query.strip().lower()
+        if not q: return []
+        lo = bisect_left(self._keys, q)
+        hi = bisect_left(self._keys, q + "\uffff")
+        best = heapq.nsmallest(limit * 4, self._entries[lo:hi], key=lambda e: (e[1], len(e[0]), e[0]))
+        res, seen = [], set()
+        exact = self.resolve(q)
+        for code in ([exact] if exact else []) + [e[2] for e in best]:
+            if code in seen: continue
+            seen.add(code); res.append(code)
+            if len(res) >= limit: break
+        if len(res) < limit:
+            for code, name in self.stock_map.items():
+                if code not in seen and q in name.lower():
+                    seen.add(code); res.append(code)
+                    if len(res) >= limit: break
+        return [(c, self.stock_map.get(c, c)) for c in res]
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+import functools
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# ================= 进程内埋点注册表 =================
+# 热路径只做一次加锁累加 (次数/总和/最大值/直方图桶) 和一次 deque.append，不做格式化和 IO。
+# 诊断页读 snapshot()；导出为 Prometheus 文本或 JSONL 事件日志。
+# 扫描的工作进程各有一份注册表，任务结束时 drain() 回传增量，主进程 merge() 合并。
+
+PREFIX = "stoak_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EVENT_LOG_SIZE = 5000
+
+_lock = threading.Lock()
+_series = {}                                # (名称, 标签元组) -> _Series
+_events = deque(maxlen=EVENT_LOG_SIZE)      # (时间戳, 名称, 标签元组, 数值) 最近事件，供 JSONL 导出
+enabled = os.environ.get("STOAK_TELEMETRY", "1") != "0"
+
+class _Series:
+    __slots__ = ("kind", "count", "total", "max", "buckets")
+
+    def __init__(self, kind):
+        self.kind = kind                    # "counter" 或 "histogram"
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1) if kind == "histogram" else None
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+def _get(key, kind):
+    s = _series.get(key)
+    if s is None: s = _series[key] = _Series(kind)
+    return s
+
+def count(name, value=1, **labels):
+    """计数器累加 (如 请求字节数、缓存未命中次数)"""
+    if not enabled: return
+    key = _key(name, labels)
+    with _lock:
+        s = _get(key, "counter")
+        s.count += 1; s.total += value
+        if value > s.max: s.max = value
+
+def observe(name, seconds, **labels):
+    """记录一次耗时 (秒)"""
+    if not enabled: return
+    key = _key(name, labels)
+    with _lock:
+        s = _get(key, "histogram")
+        s.count += 1; s.total += seconds
+        if seconds > s.max: s.max = seconds
+        s.buckets[bisect_left(BUCKETS, seconds)] += 1
+    _events.append((time.time(), key[0], key[1], seconds))
+
+@contextmanager
+def timer(name, **labels):
+    """with telemetry.timer("upstream_seconds", endpoint="sina"): ..."""
+    t = time.perf_counter()
+    try: yield
+    finally: observe(name, time.perf_counter() - t, **labels)
+
+def timed(name="call_seconds", **labels):
+    """函数耗时装饰器，默认以函数名作 fn 标签"""
+    def deco(fn):
+        lb = dict(labels, fn=fn.__name__) if "fn" not in labels else labels
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: observe(name, time.perf_counter() - t, **lb)
+        return wrapper
+    return deco
+
+def cache_probe(fn_name):
+    """
+    套在 st.cache_data 外层统计调用次数；被缓存函数体内调用 cache_miss(fn_name) 记未命中，
+    命中次数 = 调用 - 未命中。
+    """
+    def deco(cached):
+        @functools.wraps(cached)
+        def wrapper(*args, **kwargs):
+            count("cache_calls", fn=fn_name)
+            return cached(*args, **kwargs)
+        wrapper.clear = getattr(cached, "clear", None)
+        return wrapper
+    return deco
+
+def cache_miss(fn_name):
+    count("cache_misses", fn=fn_name)
+
+# ================= 读取 / 跨进程合并 =================
+
+def snapshot():
+    """[{name, kind, labels, count, sum, max, buckets}]，按名称排序"""
+    with _lock:
+        items = [(k, s.kind, s.count, s.total, s.max, list(s.buckets) if s.buckets else None) for k, s in _series.items()]
+    return [{"name": n, "kind": kind, "labels": dict(lb), "count": c, "sum": t, "max": m, "buckets": b}
+            for (n, lb), kind, c, t, m, b in sorted(items, key=lambda x: x[0])]
+
+def drain():
+    """取出并清空本进程的累计值 (工作进程把它随任务结果回传)"""
+    global _series
+    with _lock:
+        items, _series = _series, {}
+    _events.clear()
+    return [(k, s.kind, s.count, s.total, s.max, s.buckets) for k, s in items.items()]
+
+def merge(delta):
+    """合并 drain() 的结果"""
+    if not delta: return
+    with _lock:
+        for key, kind, c, t, m, b in delta:
+            s = _get(key, kind)
+            s.count += c; s.total += t
+            if m > s.max: s.max = m
+            if b and s.buckets:
+                for i, v in enumerate(b): s.buckets[i] += v
+
+def reset():
+    with _lock: _series.clear()
+    _events.clear()
+
+# ================= 导出 =================
+
+def _labels(lb, extra=None):
+    items = list(lb.items()) + (list(extra.items()) if extra else [])
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in items) + "}"
+
+def to_prometheus():
+    """Prometheus 文本格式 (计数器 -> *_total，耗时 -> histogram)"""
+    lines, typed = [], set()
+    for s in snapshot():
+        name, lb = PREFIX + s["name"], s["labels"]
+        if s["kind"] == "counter":
+            if name not in typed: lines.append(f"# TYPE {name}_total counter"); typed.add(name)
+            lines.append(f"{name}_total{_labels(lb)} {s['sum']:g}")
+            continue
+        if name not in typed: lines.append(f"# TYPE {name} histogram"); typed.add(name)
+        acc = 0
+        for le, v in zip(BUCKETS + ("+Inf",), s["buckets"]):
+            acc += v
+            lines.append(f"{name}_bucket{_labels(lb, {'le': le})} {acc}")
+        lines.append(f"{name}_sum{_labels(lb)} {s['sum']:.6f}")
+        lines.append(f"{name}_count{_labels(lb)} {s['count']}")
+    return "\n".join(lines) + "\n"
+
+def to_jsonl(events=True):
+    """JSONL：最近的耗时事件逐条一行；events=False 时改为每个序列的汇总一行"""
+    if not events:
+        return "".join(json.dumps(s, ensure_ascii=False) + "\n" for s in snapshot())
+    return "".join(json.dumps({"ts": round(ts, 3), "name": n, "labels": dict(lb), "seconds": round(v, 6)}, ensure_ascii=False) + "\n"
+                   for ts, n, lb, v in list(_events))
+
+def dump_jsonl(path, events=True):
+    with open(path, "a", encoding="utf-8") as f: f.write(to_jsonl(events))
@@ -0,0 +1,109 @@
+import math
+import numpy as np
+import backtest
+
+GRID = {
+    "short": (2.0, 4.0), "band": (-2.0, -5.0), "market": (-3.0, -6.0),
+    "profit_target": (5.0, 10.0), "loss_limit": (-3.0, -6.0), "support": (None, 4.0), "hold_days": (3, 7),
+}
+
+def _panel(S=6, L=120, seed=1):
+    """右对齐的随机游走面板，最后一只股票只有后 70 根 (前面是 -1 / NaN)"""
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.03, (S, L)), axis=1))
+    open_ = close * np.exp(rng.normal(0, 0.015, (S, L)))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.015, (S, L))))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.015, (S, L))))
+    idx = 3000 * np.exp(np.cumsum(rng.normal(0, 0.01, L)))
+    days = np.tile(np.arange(20000, 20000 + L), (S, 1))
+    idx_close = np.tile(idx, (S, 1))
+    days[-1, :L - 70] = -1
+    for a in (open_, high, low, close, idx_close): a[-1, :L - 70] = np.nan
+    return days, open_, high, low, close, idx_close
+
+def _naive_values(close, idx_close, window):
+    """逐天逐只算短线涨跌% / MA20偏 / 大盘折溢价 (与盘中口径相同：历史取到前一天)"""
+    S, L = close.shape
+    out = {k: np.full((S, L), np.nan) for k in ("short", "band", "market")}
+    for s in range(S):
+        for t in range(1, L):
+            c, p = close[s, t], close[s, t - 1]
+            if math.isnan(c): continue
+            if not math.isnan(p): out["short"][s, t] = abs((c / p - 1) * 100)
+            prev = close[s, t - 20:t] if t >= 20 else []
+            if len(prev) == 20 and not np.isnan(prev).any():
+                ma = prev.mean()
+                out["band"][s, t] = (c - ma) / ma * 100
+            r = [close[s, j] / idx_close[s, j] for j in range(max(t - window, 0), t) if not math.isnan(close[s, j] / idx_close[s, j])]
+            if r:
+                theo = idx_close[s, t - 1] * sum(r) / len(r)
+                if theo > 0: out["market"][s, t] = (c - theo) / theo * 100
+    return out
+
+def _naive_trades(days, open_, high, low, close, values, name, th, combo, fee):
+    """逐笔模拟：信号当天收盘买入，之后逐日看止损/支撑 (优先)、止盈、持满卖出；走不完的不算"""
+    target, loss, support, hold = combo
+    stop = max(loss, -support if support is not None else -np.inf)
+    hit = (lambda v: v > th) if name == "short" else (lambda v: v < th)
+    S, L = close.shape
+    trades = []
+    for s in range(S):
+        for t in range(1, L):
+            v, pv = values[s, t], values[s, t - 1]
+            if math.isnan(v) or not hit(v) or (not math.isnan(pv) and hit(pv)): continue
+            base = close[s, t]
+            for h in range(1, hold + 1):
+                if t + h >= L: break
+                o = (open_[s, t + h] / base - 1) * 100
+                if (low[s, t + h] / base - 1) * 100 <= stop:
+                    trades.append((min(o, stop) - fee, days[s, t + h], h)); break
+                if (high[s, t + h] / base - 1) * 100 >= target:
+                    trades.append((max(o, target) - fee, days[s, t + h], h)); break
+                if h == hold:
+                    trades.append(((close[s, t + h] / base - 1) * 100 - fee, days[s, t + h], h))
+    return trades
+
+def test_vectorized_signals_match_naive():
+    days, open_, high, low, close, idx_close = _panel()
+    fast = backtest.signal_values(close, idx_close, window=30)
+    slow = _naive_values(close, idx_close, window=30)
+    for k in fast:
+        np.testing.assert_allclose(fast[k], slow[k], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=k)
+
+def test_replay_matches_naive_loop():
+    days, open_, high, low, close, idx_close = _panel()
+    day0 = int(days[days >= 0].min())
+    D = int(days.max()) - day0 + 1
+    daily, totals = backtest.replay(days, open_, high, low, close, idx_close, GRID, day0, D, fee=backtest.FEE)
+    values = backtest.signal_values(close, idx_close)
+    combos = backtest.exit_combos(GRID)
+    checked = 0
+    for name, _ in backtest.STRATEGIES:
+        (sums, cnts), (wins, held) = daily[name], totals[name]
+        for k, th in enumerate(sorted(GRID[name])):
+            for e, combo in enumerate(combos):
+                trades = _naive_trades(days, open_, high, low, close, values[name], name, th, combo, backtest.FEE)
+                assert cnts[e, k].sum() == len(trades), (name, th, combo)
+                assert wins[e, k] == sum(r > 0 for r, _, _ in trades)
+                assert held[e, k] == sum(h for _, _, h in trades)
+                by_day = np.zeros(D)
+                for r, d, _ in trades: by_day[d - day0] += r
+                np.testing.assert_allclose(sums[e, k], by_day, rtol=1e-4, atol=1e-3)
+                checked += len(trades)
+    assert checked > 100
+
+def test_summary_compounds_daily_returns():
+    combos = backtest.exit_combos(GRID)
+    E, D = len(combos), 4
+    daily, totals = {}, {}
+    for name, _ in backtest.STRATEGIES:
+        K = len(GRID[name])
+        sums = np.zeros((E, K, D), dtype=np.float32); cnts = np.zeros((E, K, D), dtype=np.int32)
+        # 第 0 天两笔平均 +10%，第 2 天一笔 -20%，第 3 天一笔 +5%
+        sums[0, 0] = [20, 0, -20, 5]; cnts[0, 0] = [2, 0, 1, 1]
+        daily[name] = (sums, cnts)
+        totals[name] = (np.zeros((E, K)), np.zeros((E, K)))
+    res = backtest.summarize(daily, totals, GRID).iloc[0]
+    assert math.isclose(res["累计收益%"], (1.1 * 0.8 * 1.05 - 1) * 100, rel_tol=1e-6)
+    assert math.isclose(res["最大回撤%"], 20.0, rel_tol=1e-6)
+    assert math.isclose(res["平均收益%"], 5 / 4, rel_tol=1e-6)
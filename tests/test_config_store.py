@@ -0,0 +1,86 @@
+import json
+import time
+import sqlite3
+import pytest
+import config_store
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """每个用例一个新库，模块级缓存清空 (相当于新进程)"""
+    monkeypatch.setattr(config_store, "CONFIG_DB", str(tmp_path / "config.db"))
+    monkeypatch.setattr(config_store, "LEGACY_FILE", str(tmp_path / "config.json"))
+    def reset():
+        if config_store._timer: config_store._timer.cancel()
+        if config_store._conn: config_store._conn.close()
+        config_store._conn, config_store._version, config_store._timer = None, None, None
+        config_store._rows, config_store._values, config_store._pending = {}, {}, {}
+    reset()
+    applied = []
+    real_apply = config_store._apply
+    monkeypatch.setattr(config_store, "_apply", lambda changes: (applied.append(dict(changes)), real_apply(changes)))
+    yield applied
+    reset()
+
+def _db_rows(path):
+    with sqlite3.connect(path) as conn:
+        return {(s, k): json.loads(v) for s, k, v in conn.execute("SELECT section, key, value FROM kv")}
+
+def test_save_writes_only_changed_entries(store):
+    config_store.save({"watch_list": {"600519.SS": {"strategy": "🌊 波段"}, "000001.SZ": {"strategy": "⚡ 短线"}},
+                       "thresholds": {"short": 3.0}, "api_key": ""})
+    store.clear()
+    cfg = config_store.load()
+    cfg["watch_list"]["000001.SZ"]["strategy"] = "⚓ 大盘"
+    config_store.save(cfg)
+    assert store == [{("watch_list", "000001.SZ"): json.dumps({"strategy": "⚓ 大盘"}, ensure_ascii=False, sort_keys=True)}]
+    config_store.save(cfg)                  # 没有新改动不落盘
+    assert len(store) == 1
+
+def test_sessions_editing_different_entries_do_not_overwrite(store):
+    config_store.save({"watch_list": {"000001.SZ": {"strategy": "⚡ 短线"}}, "holding_list": {"600036.SS": {"cost": 30.0}}})
+    a, b = config_store.load(), config_store.load()
+    a["watch_list"]["600519.SS"] = {"strategy": "🌊 波段"}
+    b["holding_list"]["000001.SZ"] = {"cost": 10.0}
+    config_store.save(a); config_store.save(b)
+    cfg = config_store.load()
+    assert "600519.SS" in cfg["watch_list"] and "000001.SZ" in cfg["holding_list"]
+    del b["holding_list"]["000001.SZ"]
+    config_store.save(b)
+    assert ("holding_list", "000001.SZ") not in _db_rows(config_store.CONFIG_DB)
+    assert "600519.SS" in config_store.load()["watch_list"]
+
+def test_debounced_saves_are_merged_into_one_write(store):
+    config_store.save({"user_news": ""})
+    store.clear()
+    cfg = config_store.load()
+    for text in ("a", "ab", "abc"):
+        cfg["user_news"] = text
+        config_store.save(cfg, delay=0.2)
+    assert config_store.load()["user_news"] == "abc"      # 缓存立即生效
+    assert store == [] and _db_rows(config_store.CONFIG_DB)[("", "user_news")] == ""
+    time.sleep(0.5)
+    assert len(store) == 1 and _db_rows(config_store.CONFIG_DB)[("", "user_news")] == "abc"
+
+def test_flush_writes_pending_changes_immediately(store):
+    cfg = config_store.load()
+    cfg["user_news"] = "x"
+    config_store.save(cfg, delay=60)
+    config_store.flush()
+    assert _db_rows(config_store.CONFIG_DB)[("", "user_news")] == "x"
+
+def test_write_from_another_connection_is_picked_up(store):
+    config_store.save({"thresholds": {"short": 3.0}})
+    assert config_store.load()["thresholds"]["short"] == 3.0
+    with sqlite3.connect(config_store.CONFIG_DB) as other:
+        other.execute("UPDATE kv SET value='4.5' WHERE section='thresholds' AND key='short'")
+    assert config_store.load()["thresholds"]["short"] == 4.5
+
+def test_legacy_json_is_migrated_once(store, tmp_path):
+    legacy = {"api_key": "sk", "watch_list": {"600519.SS": {"strategy": "⚡ 短线"}}, "thresholds": {"band": -6.0}}
+    (tmp_path / "config.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+    cfg = config_store.load()
+    assert cfg["api_key"] == "sk" and cfg["watch_list"] == legacy["watch_list"] and cfg["thresholds"] == {"band": -6.0}
+    # 迁移过后旧文件再变也不会覆盖库里的配置
+    (tmp_path / "config.json").write_text(json.dumps({"api_key": "other"}), encoding="utf-8")
+    config_store._conn.close(); config_store._conn, config_store._version = None, None
+    assert config_store.load()["api_key"] == "sk"
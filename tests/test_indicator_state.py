@@ -0,0 +1,47 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import indicator_state
+from indicator_state import IndicatorState, live_dev_matrix
+from market_clock import MarketClock, TradingCalendar
+
+FRIDAY = datetime.date(2026, 10, 16)
+
+def _state(last=FRIDAY, n=60):
+    """收盘价 1..n，最后一根是 last"""
+    dates = [d.date().isoformat() for d in pd.bdate_range(end=last, periods=n)]
+    closes = np.arange(1, n + 1, dtype=float)
+    return IndicatorState.from_history("600000.SS", dates, closes, np.ones(n))
+
+def _clock_at(now):
+    clock = MarketClock(TradingCalendar())
+    class Fixed:
+        def session_date(self, market="A"): return clock.session_date(market, now)
+    return Fixed()
+
+@pytest.mark.parametrize("now", [
+    datetime.datetime(2026, 10, 17, 11, 0),     # 周六
+    datetime.datetime(2026, 10, 19, 8, 30),     # 周一盘前
+])
+def test_quote_of_stored_bar_is_not_counted_twice(monkeypatch, now):
+    monkeypatch.setattr(indicator_state, "get_clock", lambda: _clock_at(now))
+    st = _state()
+    devs = st.live_devs(60.0)
+    assert st.live_ma(10, 60.0, st.session_date()) == pytest.approx(55.5)
+    assert devs["MA10偏"] == pytest.approx((60 - 55.5) / 55.5 * 100)
+    m = live_dev_matrix({"600000.SS": st}, ["600000.SS"], [60.0])
+    assert m[0, 0] == pytest.approx(devs["MA10偏"])
+
+def test_trading_day_quote_appends_provisional_bar(monkeypatch):
+    monkeypatch.setattr(indicator_state, "get_clock", lambda: _clock_at(datetime.datetime(2026, 10, 19, 10, 0)))
+    st = _state()
+    # 周一盘中：现价作为新的一根，窗口滑出 51
+    assert st.live_ma(10, 70.0, st.session_date()) == pytest.approx((sum(range(52, 61)) + 70) / 10)
+
+def test_session_date_skips_holidays():
+    cal = TradingCalendar(loader=lambda s, e: ["2026-09-30", "2026-10-09"])
+    clock = MarketClock(cal)
+    assert clock.session_date(now=datetime.datetime(2026, 10, 5, 10, 0)) == datetime.date(2026, 9, 30)
+    assert clock.session_date(now=datetime.datetime(2026, 10, 9, 9, 15)) == datetime.date(2026, 10, 9)
+    assert clock.session_date("HK", now=datetime.datetime(2026, 10, 5, 10, 0)) == datetime.date(2026, 10, 5)
@@ -0,0 +1,89 @@
+import time
+import threading
+import itertools
+import pytest
+from resilience import Endpoint, CircuitOpen, MIN_SAMPLES
+
+def _boom():
+    raise ConnectionError("down")
+
+def _open(ep):
+    for _ in range(ep.failures):
+        with pytest.raises(ConnectionError): ep.call(_boom)
+
+def test_breaker_opens_after_consecutive_failures():
+    ep = Endpoint("t", hedge=False, failures=3, cooldown=60)
+    with pytest.raises(ConnectionError): ep.call(_boom)
+    assert ep.call(lambda: 1) == 1          # 成功清零，失败要连续才算
+    _open(ep)
+    assert ep.state() == "open"
+    calls = []
+    with pytest.raises(CircuitOpen): ep.call(calls.append, 1)
+    assert calls == []
+
+def test_half_open_probe_success_closes():
+    ep = Endpoint("t", hedge=False, failures=2, cooldown=0.1)
+    _open(ep)
+    time.sleep(0.15)
+    assert ep.state() == "half-open"
+    assert ep.call(lambda: "ok") == "ok"
+    assert ep.state() == "closed"
+
+def test_half_open_probe_failure_reopens():
+    ep = Endpoint("t", hedge=False, failures=2, cooldown=0.1)
+    _open(ep)
+    time.sleep(0.15)
+    with pytest.raises(ConnectionError): ep.call(_boom)
+    assert ep.state() == "open"
+    with pytest.raises(CircuitOpen): ep.call(lambda: "ok")
+
+def test_half_open_admits_a_single_probe():
+    ep = Endpoint("t", hedge=False, failures=1, cooldown=0.05)
+    _open(ep)
+    time.sleep(0.1)
+    release, started = threading.Event(), threading.Event()
+    def slow():
+        started.set(); release.wait(2); return "probe"
+    res = []
+    t = threading.Thread(target=lambda: res.append(ep.call(slow)))
+    t.start(); started.wait(2)
+    with pytest.raises(CircuitOpen): ep.call(lambda: "second")
+    release.set(); t.join()
+    assert res == ["probe"] and ep.state() == "closed"
+
+def test_slow_request_is_hedged_and_faster_copy_wins():
+    n = itertools.count()
+    def fn():
+        if next(n) == 0: time.sleep(1.0)
+        return "fast"
+    ep = Endpoint("t", deadline=3.0, initial_delay=0.05)
+    t0 = time.monotonic()
+    assert ep.call(fn) == "fast"
+    assert time.monotonic() - t0 < 0.5
+    assert next(n) == 2
+
+def test_failed_first_attempt_is_retried_by_hedge():
+    n = itertools.count()
+    def fn():
+        if next(n) == 0: raise ConnectionError("reset")
+        return "ok"
+    ep = Endpoint("t", deadline=3.0, initial_delay=1.0)
+    t0 = time.monotonic()
+    assert ep.call(fn) == "ok"
+    assert time.monotonic() - t0 < 0.5     # 不等到对冲时间点
+    assert ep.state() == "closed"
+
+def test_deadline_bounds_the_call_and_counts_as_failure():
+    ep = Endpoint("t", deadline=0.2, initial_delay=0.05, failures=1, cooldown=60)
+    t0 = time.monotonic()
+    with pytest.raises(TimeoutError): ep.call(time.sleep, 1.0)
+    assert time.monotonic() - t0 < 0.5
+    assert ep.state() == "open"
+
+def test_hedge_delay_tracks_recent_latency_within_deadline():
+    ep = Endpoint("t", deadline=1.0, initial_delay=0.3, min_delay=0.05)
+    assert ep.hedge_delay() == 0.3          # 样本不够用初始值
+    ep._lat.extend([0.01] * MIN_SAMPLES)
+    assert ep.hedge_delay() == 0.05         # 不低于 min_delay
+    ep._lat.extend([2.0] * MIN_SAMPLES)
+    assert ep.hedge_delay() == 0.5          # 不超过总时限的一半
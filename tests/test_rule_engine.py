@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rule_engine import RuleEngine, INPUTS
+from utils import DEFAULT_THRESHOLDS
+
+def _inputs(**rows):
+    """代码=(现价, 涨跌%, MA20偏, 大盘折溢价)"""
+    return pd.DataFrame.from_dict(rows, orient="index", columns=list(INPUTS))
+
+def _engine(strategy="⚡ 短线", thresholds=None, hold=None):
+    eng = RuleEngine()
+    cfg = {"watch_list": {"600000.SS": {"strategy": strategy}}, "holding_list": hold or {}}
+    if thresholds is not None: cfg["thresholds"] = thresholds
+    eng.compile(cfg)
+    return eng
+
+def test_alert_fires_once_per_code_and_rule():
+    eng = _engine()
+    eng.update(_inputs(**{"600000.SS": (10.0, 5.0, 0.0, 0.0)}))
+    assert len(eng.alerts(now=1)) == 1
+    # 条件持续成立：输入变了也不重复报
+    eng.update(_inputs(**{"600000.SS": (10.1, 6.0, 0.0, 0.0)}))
+    assert eng.alerts(now=2) == []
+    assert len(eng.active()) == 1
+
+def test_rules_of_one_code_are_deduplicated_separately():
+    hold = {"600000.SS": {"cost": 10.0, "support": 9.0, "loss_limit": -5.0}}
+    eng = _engine(hold=hold)
+    eng.update(_inputs(**{"600000.SS": (8.0, 5.0, 0.0, 0.0)}))       # 异动 + 破位 + 止损
+    assert len(eng.alerts(now=1)) == 3
+    eng.update(_inputs(**{"600000.SS": (9.5, 5.0, 0.0, 0.0)}))       # 仅破位解除
+    assert eng.alerts(now=2) == []
+    eng.update(_inputs(**{"600000.SS": (8.5, 5.0, 0.0, 0.0)}))       # 破位再次成立
+    assert [a[:1] for a in eng.alerts(now=3)] == ["🚨"]
+
+def test_alert_rearms_after_condition_clears():
+    eng = _engine()
+    eng.update(_inputs(**{"600000.SS": (10.0, 5.0, 0.0, 0.0)}))
+    assert len(eng.alerts(now=1)) == 1
+    eng.update(_inputs(**{"600000.SS": (10.0, 1.0, 0.0, 0.0)}))
+    assert eng.alerts(now=2) == []
+    eng.update(_inputs(**{"600000.SS": (10.0, -4.0, 0.0, 0.0)}))
+    assert len(eng.alerts(now=3)) == 1
+
+def test_recompiling_config_keeps_dedup_state():
+    eng = _engine()
+    eng.update(_inputs(**{"600000.SS": (10.0, 5.0, 0.0, 0.0)}))
+    eng.alerts(now=1)
+    eng.compile({"watch_list": {"600000.SS": {"strategy": "⚡ 短线"}, "000001.SZ": {}}, "thresholds": {"short": 4.0}})
+    eng.update(_inputs(**{"600000.SS": (10.0, 5.0, 0.0, 0.0)}))
+    assert eng.alerts(now=2) == []
+
+@pytest.mark.parametrize("strategy,row,fires", [
+    ("⚓ 大盘", (10.0, 0.0, 0.0, DEFAULT_THRESHOLDS["market"] - 0.5), True),
+    ("⚓ 大盘", (10.0, 0.0, 0.0, DEFAULT_THRESHOLDS["market"] + 0.5), False),
+    ("🌊 波段", (10.0, 0.0, DEFAULT_THRESHOLDS["band"] - 0.5, 0.0), True),
+    ("⚡ 短线", (10.0, DEFAULT_THRESHOLDS["short"] - 0.5, 0.0, 0.0), False),
+])
+def test_missing_thresholds_fall_back_to_defaults(strategy, row, fires):
+    # 旧配置只存了部分阈值，缺的按默认值
+    eng = _engine(strategy, thresholds={"short": DEFAULT_THRESHOLDS["short"]} if strategy != "⚡ 短线" else {})
+    assert (eng.th_short, eng.th_band, eng.th_market) == tuple(DEFAULT_THRESHOLDS[k] for k in ("short", "band", "market"))
+    eng.update(_inputs(**{"600000.SS": row}))
+    assert bool(eng.alerts(now=1)) is fires
+
+def test_configured_threshold_overrides_default():
+    eng = _engine("⚓ 大盘", thresholds={"market": -3.0})
+    eng.update(_inputs(**{"600000.SS": (10.0, 0.0, 0.0, -4.0)}))
+    assert len(eng.alerts(now=1)) == 1
+
+def test_no_quote_does_not_fire():
+    eng = _engine(hold={"600000.SS": {"cost": 10.0, "support": 9.0}})
+    eng.update(_inputs(**{"600000.SS": (np.nan, np.nan, np.nan, np.nan)}))
+    assert eng.alerts(now=1) == [] and list(eng.holding_status(["600000.SS"])) == ["🟢 持有"]
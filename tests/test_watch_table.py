@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from streamlit.elements.arrow import marshall
+from streamlit.proto.ArrowData_pb2 import ArrowData
+from watch_table import WatchTable, MA_COLS
+
+def _frame(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"代码": [f"{600000 + i}.SS" for i in range(n)], "名称": [f"股票{i}" for i in range(n)],
+                       "现价": rng.uniform(5, 50, n), "涨跌%": rng.normal(0, 2, n), "量比": rng.uniform(0, 3, n),
+                       **{c: rng.normal(0, 5, n) for c in MA_COLS}})
+    return df.set_index("代码", drop=False)
+
+def _wire(styler):
+    proto = ArrowData()
+    marshall(proto, styler, "default")
+    return proto.SerializeToString(deterministic=True)
+
+def test_unchanged_page_serializes_identically():
+    view = WatchTable(page_rows=20)
+    view.update(_frame())
+    first = _wire(view.page(1))
+    assert len(view.update(_frame())) == 0
+    assert _wire(view.page(1)) == first
+
+def test_changed_row_changes_only_its_page():
+    view = WatchTable(page_rows=20)
+    view.update(_frame())
+    before = [_wire(view.page(i)) for i in range(view.pages())]
+    df = _frame()
+    df.iloc[45, df.columns.get_loc("涨跌%")] = 9.9
+    assert list(view.update(df)) == [df.index[45]]
+    after = [_wire(view.page(i)) for i in range(view.pages())]
+    assert [a == b for a, b in zip(before, after)] == [True, True, False]
@@ -1,10 +1,9 @@
-import json
-import os
+import config_store
 
-CONFIG_FILE = "config.json"
+DEFAULT_THRESHOLDS = {"short": 3.0, "band": -5.0, "market": -8.0}   # 短线涨跌% / 波段MA20偏 / 大盘折溢价
 
 def load_config():
-    """加载配置，如果没有则创建默认"""
+    """加载配置，如果没有则创建默认 (存储见 config_store，rerun 时命中进程内缓存)"""
     default = {
         "api_key": "", 
         "base_url": "https://api.deepseek.com",
@@ -12,37 +11,26 @@ def load_config():
         "holding_list": {},
         # 持仓结构示例: {"600519.SS": {"cost": 100, "profit_target": 20, "loss_limit": -5, "support": 90}}
         "user_news": "", 
-        "system_news": "",
-        "thresholds": {
-            "short": 3.0,   
-            "band": -5.0,   
-            "market": -8.0  
-        }
+        "thresholds": dict(DEFAULT_THRESHOLDS)
     }
     
-    if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "w", encoding='utf-8') as f: json.dump(default, f)
-        return default
-    
-    with open(CONFIG_FILE, "r", encoding='utf-8') as f:
-        try:
-            c = json.load(f)
-        except:
-            c = default
-            
-        # 补全缺失键值
-        for k, v in default.items():
-            if k not in c: c[k] = v
-        if "thresholds" in c:
-            for k, v in default["thresholds"].items():
-                if k not in c["thresholds"]: c["thresholds"][k] = v
+    c = config_store.load()
+    if not c:
+        config_store.save(default)
+        return config_store.load()
         
-        return c
+    # 补全缺失键值
+    for k, v in default.items():
+        if k not in c: c[k] = v
+    if "thresholds" in c:
+        for k, v in default["thresholds"].items():
+            if k not in c["thresholds"]: c["thresholds"][k] = v
+    
+    return c
 
-def save_config(data):
-    """保存配置"""
-    with open(CONFIG_FILE, "w", encoding='utf-8') as f: 
-        json.dump(data, f, ensure_ascii=False, indent=4)
+def save_config(data, delay=0.0):
+    """保存配置：只写改动过的条目；delay>0 时合并短时间内的多次保存 (如编辑框逐字输入)"""
+    config_store.save(data, delay=delay)
 
 def convert_code(symbol, target="sina"):
     """
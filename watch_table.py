@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from indicator_state import MA_LIST, live_dev_matrix
+
+# ================= 自选监控表 =================
+# 从 app.py 的 render_table 拆出，方便离线基准测试直接调用。
+# 指标列按代码对齐扫描结果一次取出；数字格式交给 column_config，颜色是按列预先算好的 CSS 数组。
+# WatchTable 跨 tick 保留上一帧，只重算变动行的样式，并按页输出：
+# 页面内容没变时 st.dataframe 产生的消息与上次完全相同，Streamlit 只发哈希引用，不再重传整表；
+# 为此 Styler 用固定 uuid (默认每次随机，CSS 选择器跟着变，消息永远不同)。
+
+PAGE_ROWS = 200
+MA_COLS = [f"MA{ma}%" for ma in MA_LIST]
+UP, DOWN, HOT = "color:#ff4d4d", "color:#2ecc71", "color:#ff4d4d; font-weight:bold"
+STYLE_UUID = "watch"
+
+COLUMN_CONFIG = {
+    "现价": st.column_config.NumberColumn(format="%.2f"),
+    "涨跌%": st.column_config.NumberColumn(format="%.2f%%"),
+    "量比": st.column_config.NumberColumn(format="%.2f"),
+    **{c: st.column_config.NumberColumn(format="%.1f%%") for c in MA_COLS},
+}
+
+def build_watch_frame(quotes, watch_list, stock_map, analysis, engine, states=None, live=False, stale=None):
+    """
+    quotes: {代码: (现价, 昨收, 涨跌%, 成交量)}; analysis: 扫描指标 DataFrame (代码为索引) 或 {代码: 指标dict}
+    engine: 本 tick 已 update 过的 RuleEngine，信号列取自它
+    states: 增量指标状态，live=True (盯盘) 时用它算实时均线偏离
+    stale: {代码: 秒数}，行情已过期的代码 (QuotePoller.stale)，名称后标 ⏳
+    返回以代码为索引的 DataFrame，行序同 quotes
+    """
+    codes = list(quotes)
+    if not codes: return pd.DataFrame()
+    q = np.array([quotes[c] for c in codes], dtype=float).reshape(-1, 4)
+    idx = pd.Index(codes, name="代码")
+    stale = stale or {}
+    df = pd.DataFrame({"名称": [f"{stock_map.get(c, c)} ({c})" + (" ⏳" if c in stale else "") for c in codes], "现价": q[:, 0], "涨跌%": q[:, 2]}, index=idx)
+    if isinstance(analysis, dict): analysis = pd.DataFrame.from_dict(analysis, orient='index') if analysis else None
+    if analysis is None or not len(analysis):
+        df["策略"] = [watch_list[c].get("strategy", "🌊") for c in codes]
+        return df
+
+    # 没扫到的代码、缺失的指标按 0 显示
+    m = analysis.reindex(index=idx, columns=["量比"] + [f"MA{ma}偏" for ma in MA_LIST]).fillna(0)
+    df["量比"] = m["量比"].to_numpy()
+    devs = m.iloc[:, 1:].to_numpy(dtype=float)
+    if live and states:
+        # 盘中实时均线 = 前 N-1 根收盘 + 现价
+        live_devs = live_dev_matrix(states, codes, q[:, 0])
+        devs = np.where(np.isnan(live_devs), devs, live_devs)
+    df[MA_COLS] = devs
+    df["信号"] = engine.labels(codes)
+    return df
+
+def style_arrays(df):
+    """与 df 同形的 CSS 字符串表：涨跌/均线红涨绿跌，量比 > 1.5 加粗"""
+    css = pd.DataFrame("", index=df.index, columns=df.columns)
+    css["涨跌%"] = np.where(df["涨跌%"].to_numpy() > 0, UP, DOWN)
+    if "量比" in df.columns:
+        css["量比"] = np.where(df["量比"].to_numpy() > 1.5, HOT, "")
+        css[MA_COLS] = np.where(df[MA_COLS].to_numpy() > 0, UP, DOWN)
+    return css
+
+def style_watch_frame(df, css=None):
+    """套上预先算好的样式；数字格式不走 Styler，显示时用 COLUMN_CONFIG"""
+    css = style_arrays(df) if css is None else css
+    return df.style.set_uuid(STYLE_UUID).apply(lambda _: css, axis=None)
+
+class WatchTable:
+    def __init__(self, page_rows=PAGE_ROWS):
+        self.page_rows = page_rows
+        self.frame = None
+        self.css = None
+        self.changed = pd.Index([])
+
+    def update(self, df):
+        """并入新一帧，只对变动 (含新增) 的行重算样式；返回变动行的代码"""
+        if self.frame is None or not df.columns.equals(self.frame.columns):
+            self.frame, self.css, self.changed = df, style_arrays(df), df.index
+            return self.changed
+        prev = self.frame.reindex(df.index)
+        changed = ~((df == prev) | (df.isna() & prev.isna())).all(axis=1).to_numpy()
+        css = self.css.reindex(df.index)
+        if changed.any(): css.loc[changed] = style_arrays(df.loc[changed]).to_numpy()
+        self.frame, self.css, self.changed = df, css, df.index[changed]
+        return self.changed
+
+    def pages(self):
+        return max(1, -(-len(self.frame) // self.page_rows)) if self.frame is not None else 1
+
+    def page(self, i=0):
+        """第 i 页 (从 0 起) 的 Styler"""
+        rows = slice(i * self.page_rows, (i + 1) * self.page_rows)
+        return style_watch_frame(self.frame.iloc[rows], self.css.iloc[rows])